@@ -1,23 +1,48 @@
 import paho.mqtt.client as mqtt
+import asyncio
 import threading
+import queue
+import sys
 import time
 import json
+from async_mqtt import AsyncMqttClient
+from hand_protocol import DeltaDecoder
+from latency_stats import LatencyTracker, format_latency
 
 # 設定 MQTT 伺服器
 broker_address = "localhost"
 port = 1883
 topic_hand = "hand_tracking"  # 修改主題名稱
 
+# 延遲統計，定期發送到 hand_tracking/stats/latency/mqtt_subscriber
+latency_tracker = LatencyTracker("mqtt_subscriber")
+
+# 差量格式需要保存每隻手目前的角度，其他格式直接解碼
+payload_decoder = DeltaDecoder()
+
 # ========== MQTT 接收程式 ========== #
 def on_message(client, userdata, message):
+    """顯示收到的手部數據；userdata 為 angle_store.AngleStore 時一併記錄"""
     try:
-        payload = message.payload.decode()
-        data = json.loads(payload)
+        # 支援 JSON、二進位與差量格式
+        receive_time = time.time()
+        data = payload_decoder.decode_payload(message.payload, message.topic)
+        # 差量格式遺失訊息或尚未收到關鍵幀時要求發送端送出關鍵幀
+        for resync_topic, request in payload_decoder.resync_requests(receive_time):
+            client.publish(resync_topic, request)
+        if data is None:
+            return
         
         # 檢查是否包含 fingers 陣列
         if isinstance(data, dict) and "fingers" in data and isinstance(data["fingers"], list):
+            latencies = latency_tracker.record(data, receive_time)
+            latency_tracker.maybe_publish(client)
+            if userdata is not None:
+                userdata.append_payload(data, receive_time)
             print("\n" + "="*50)
-            print(f"📩 收到手部數據 (時間: {time.strftime('%H:%M:%S', time.localtime(data['timestamp']))})")
+            print(f"📩 收到手部數據 (手: {data.get('hand_id', 0)}, 時間: {time.strftime('%H:%M:%S', time.localtime(data['timestamp']))})")
+            if latencies:
+                print(f"⏱️ 延遲: {format_latency(latencies)}")
             print("-"*50)
             for finger in data["fingers"]:
                 if isinstance(finger, dict) and all(k in finger for k in ['name', 'pip_angle', 'dip_angle', 'total_angle']):
@@ -30,41 +55,228 @@ def on_message(client, userdata, message):
             print("="*50 + "\n")
         else:
             print(f"⚠️ 數據格式不正確: {data}")
-    except json.JSONDecodeError:
-        print(f"⚠️ JSON 格式錯誤: {message.payload}")
+    except ValueError:
+        print(f"⚠️ 數據格式錯誤: {message.payload}")
     except Exception as e:
         pass  # 忽略錯誤訊息
 
-def mqtt_subscriber():
-    client = mqtt.Client()
-    client.on_message = on_message
+async def subscribe_hand_data(store=None):
+    """以 asyncio 接收手部數據，斷線時自動重連並重新訂閱
     
-    try:
-        print("🔄 正在連接到 MQTT 伺服器...")
-        client.connect(broker_address, port, 60)
-        client.subscribe(topic_hand)
+    Args:
+        store: angle_store.AngleStore，提供時把每筆數據附加到時間序列紀錄
+    """
+    print("🔄 正在連接到 MQTT 伺服器...")
+    async with AsyncMqttClient(broker_address, port) as client:
+        messages = client.messages()
+        await client.subscribe(topic_hand)
         print(f"✅ 已訂閱主題: {topic_hand}")
         print("✅ MQTT 訂閱服務已啟動")
-        client.loop_forever()
+        async for message in messages:
+            on_message(client.client, store, message)
+
+def mqtt_subscriber(store=None):
+    try:
+        asyncio.run(subscribe_hand_data(store))
     except Exception as e:
         print(f"❌ 連接錯誤: {e}")
+    finally:
+        if store is not None:
+            store.close()
 
 # ========== MQTT 發送程式 ========== #
+class MqttPublisher:
+    """長連線的 MQTT 發送器
+
+    只建立一次連線，由背景執行緒負責網路迴圈與發送，呼叫端只需把資料放進
+    有界佇列即可立即返回，不會被連線或網路延遲卡住。
+
+    Args:
+        broker: MQTT 伺服器位址
+        port: MQTT 伺服器端口
+        topic: 預設發送主題
+        qos: 預設 QoS 等級 (0, 1, 2)
+        max_queue: 發送佇列最大長度
+        overflow: 佇列滿時的策略，"drop_oldest" 丟棄最舊的訊息，
+            "block" 阻塞呼叫端直到有空間（背壓）
+        reconnect_min_delay: 斷線重連的最短等待秒數
+        reconnect_max_delay: 斷線重連的最長等待秒數（指數退避上限）
+        client: 自訂的 MQTT 客戶端（需與 paho Client 介面相同），None 表示建立新的 paho Client
+    """
+
+    def __init__(self, broker=broker_address, port=port, topic=topic_hand, qos=0,
+                 max_queue=100, overflow="drop_oldest", client_id="",
+                 keepalive=60, reconnect_min_delay=1, reconnect_max_delay=30, client=None):
+        if overflow not in ("drop_oldest", "block"):
+            raise ValueError(f"不支援的佇列策略: {overflow}")
+        self.broker = broker
+        self.port = port
+        self.topic = topic
+        self.qos = qos
+        self.overflow = overflow
+        self.keepalive = keepalive
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._subscriptions = {}  # topic -> qos，重連後重新訂閱
+        self._connected = threading.Event()
+        self._running = threading.Event()
+        self._sender_thread = None
+
+        self.client = client if client is not None else mqtt.Client(client_id)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.reconnect_delay_set(min_delay=reconnect_min_delay, max_delay=reconnect_max_delay)
+
+        # 統計資訊
+        self.sent_count = 0
+        self.dropped_count = 0
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            for topic, qos in list(self._subscriptions.items()):
+                client.subscribe(topic, qos)
+            self._connected.set()
+            # 狀態訊息輸出到 stderr，避免混入呼叫端（例如 benchmark.py）的 JSON stdout
+            print(f"✅ MQTT 發送端已連接 ({self.broker}:{self.port})", file=sys.stderr)
+        else:
+            print(f"❌ MQTT 發送端連接失敗 (錯誤碼: {rc})", file=sys.stderr)
+
+    def _on_disconnect(self, client, userdata, rc):
+        self._connected.clear()
+        if rc != 0 and self._running.is_set():
+            # paho 的網路迴圈會依 reconnect_delay_set 的退避設定自動重連
+            print(f"⚠️ MQTT 發送端斷線 (錯誤碼: {rc})，等待自動重連...", file=sys.stderr)
+
+    def start(self):
+        """連接伺服器並啟動背景網路迴圈與發送執行緒"""
+        if self._running.is_set():
+            return self
+        self._running.set()
+        # connect_async 不會阻塞，連線失敗時由 loop_start 的執行緒持續重試
+        self.client.connect_async(self.broker, self.port, self.keepalive)
+        self.client.loop_start()
+        self._sender_thread = threading.Thread(target=self._sender_loop, daemon=True)
+        self._sender_thread.start()
+        return self
+
+    def publish(self, data, topic=None, qos=None):
+        """把資料放入發送佇列
+
+        Args:
+            data: str / bytes 直接發送，其他物件會先轉為 JSON
+            topic: 發送主題，預設使用建構時的主題
+            qos: QoS 等級，預設使用建構時的設定
+
+        Returns:
+            bool: 是否成功放入佇列
+        """
+        if not self._running.is_set():
+            self.start()
+        if not isinstance(data, (str, bytes, bytearray)):
+            data = json.dumps(data)
+        item = (topic or self.topic, data, self.qos if qos is None else qos)
+
+        if self.overflow == "block":
+            self._queue.put(item)
+            return True
+
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    self.dropped_count += 1
+                except queue.Empty:
+                    pass
+
+    def subscribe(self, topic, callback, qos=0):
+        """訂閱發送端需要的控制主題（例如接收端要求關鍵幀），重連後自動重新訂閱
+
+        Args:
+            callback: 以訊息內容 (bytes) 呼叫，在網路迴圈執行緒上執行
+        """
+        self._subscriptions[topic] = qos
+        self.client.message_callback_add(topic, lambda client, userdata, message: callback(message.payload))
+        if self._connected.is_set():
+            self.client.subscribe(topic, qos)
+
+    def _sender_loop(self):
+        while self._running.is_set() or not self._queue.empty():
+            try:
+                topic, payload, qos = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                # 斷線期間先等待重連，佇列仍由 publish 端的策略限制長度
+                while not self._connected.wait(timeout=0.5):
+                    if not self._running.is_set():
+                        return
+                info = self.client.publish(topic, payload, qos=qos)
+                if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                    self.sent_count += 1
+                else:
+                    self.dropped_count += 1
+            finally:
+                # 取出的訊息交給 client.publish 之後才算完成，flush 以此判斷
+                self._queue.task_done()
+
+    def pending(self):
+        """佇列中尚未發送的訊息數量"""
+        return self._queue.qsize()
+
+    def flush(self, timeout=5.0):
+        """等待佇列中與發送中的訊息都交給 client.publish，回傳是否在時限內完成
+
+        與 queue.join() 相同以 task_done 計數，但加上時限。
+        """
+        deadline = time.time() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stop(self, timeout=5.0):
+        """送出剩餘訊息後斷開連線"""
+        if not self._running.is_set():
+            return
+        if self._connected.is_set():
+            self.flush(timeout)
+        self._running.clear()
+        if self._sender_thread is not None:
+            self._sender_thread.join(timeout)
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+def get_publisher():
+    """取得模組共用的 MqttPublisher，第一次呼叫時建立並啟動"""
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = MqttPublisher().start()
+        return _publisher
+
+def set_publisher(publisher):
+    """替換模組共用的 MqttPublisher（例如使用不同的伺服器或 QoS）"""
+    global _publisher
+    with _publisher_lock:
+        _publisher = publisher
+
 def mqtt_publisher(data):
-    client = mqtt.Client()
-    
+    """發送手部數據，str / bytes 原樣發送，其他物件轉為 JSON"""
     try:
-        client.connect(broker_address, port, 60)
-        client.loop_start()
-        
-        json_data = json.dumps(data)
-        client.publish(topic_hand, json_data)
-        print(f"📨 發送手部數據 (時間: {time.strftime('%H:%M:%S', time.localtime(time.time()))})")
+        get_publisher().publish(data)
     except Exception as e:
-        print(f"❌ 發送錯誤: {e}")
-    
-    client.loop_stop()
-    client.disconnect()
+        print(f"❌ 發送錯誤: {e}", file=sys.stderr)
 
 # ========== 啟動多執行緒 ========== #
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+import numpy as np
+
+class AdaptiveScheduler:
+    """依手部動作調整推論頻率，並依角度變化決定是否發送
+
+    推論：手部移動越快，推論間隔越短（最短 min_interval）；手部靜止時間隔
+    逐步加倍，最長為 max_interval。沒有偵測到手時以 max_interval 持續偵測。
+
+    發送：任一關節角度與上次發送的值相差超過 deadband 才發送，另外每隔
+    heartbeat_interval 秒發送一次完整數據（keyframe），讓接收端確認連線正常。
+
+    Args:
+        min_interval: 最短推論間隔（秒），0 表示每幀都推論
+        max_interval: 最長推論間隔（秒）
+        high_motion: 視為快速移動的關鍵點最大速度（正規化座標/秒）
+        low_motion: 視為靜止的關鍵點最大速度（正規化座標/秒）
+        deadband: 發送門檻（度）
+        heartbeat_interval: 強制發送的間隔（秒）
+    """
+
+    def __init__(self, min_interval=0.0, max_interval=0.3, high_motion=0.6, low_motion=0.1,
+                 deadband=2.0, heartbeat_interval=1.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.high_motion = high_motion
+        self.low_motion = low_motion
+        self.deadband = deadband
+        self.heartbeat_interval = heartbeat_interval
+
+        self.interval = min_interval
+        self.motion = 0.0
+        self._last_infer_time = None
+        self._last_points = None
+        self._last_points_time = None
+        self._last_published = {}
+        self._last_publish_time = {}
+
+    # ========== 推論頻率 ========== #
+    def should_infer(self, now):
+        """是否該對這一幀進行推論"""
+        if self._last_infer_time is None or now - self._last_infer_time >= self.interval:
+            self._last_infer_time = now
+            return True
+        return False
+
+    def update_motion(self, points, now):
+        """以本次推論的關鍵點更新動作量與推論間隔
+
+        Args:
+            points: (hands, 21, 3) 關鍵點陣列，沒有偵測到手時為空陣列
+            now: 畫面時間（秒）
+        """
+        if len(points) == 0:
+            # 沒有手：以最長間隔偵測，手出現時再加速
+            self._last_points = None
+            self.motion = 0.0
+            self.interval = self.max_interval
+            return
+
+        if (self._last_points is not None and self._last_points.shape == points.shape
+                and now > self._last_points_time):
+            displacement = np.linalg.norm(points[..., :2] - self._last_points[..., :2], axis=-1)
+            # 取移動最多的關鍵點，避免手指彎曲被整隻手的平均值稀釋
+            self.motion = float(displacement.max()) / (now - self._last_points_time)
+        else:
+            # 手剛出現或數量改變，視為快速移動
+            self.motion = self.high_motion
+        self._last_points = points
+        self._last_points_time = now
+
+        if self.motion >= self.high_motion:
+            self.interval = self.min_interval
+        elif self.motion <= self.low_motion:
+            self.interval = min(max(self.interval * 2, self.min_interval, 0.02), self.max_interval)
+        else:
+            # 介於兩者之間時線性內插
+            ratio = (self.high_motion - self.motion) / (self.high_motion - self.low_motion)
+            self.interval = self.min_interval + ratio * (self.max_interval - self.min_interval)
+
+    # ========== 發送判斷 ========== #
+    def should_publish(self, angles, now, key=0):
+        """角度變化超過門檻或到了 heartbeat 時間時回傳 True
+
+        Args:
+            angles: 單手的 ANGLE_DTYPE 陣列 (5,)
+            now: 目前時間（秒）
+            key: 手的編號，每隻手各自判斷
+        """
+        values = np.stack([angles[field] for field in angles.dtype.names], axis=-1)
+        last_published = self._last_published.get(key)
+        last_publish_time = self._last_publish_time.get(key)
+        heartbeat = last_publish_time is None or now - last_publish_time >= self.heartbeat_interval
+        changed = (last_published is None or last_published.shape != values.shape
+                   or np.abs(values - last_published).max() > self.deadband)
+        if heartbeat or changed:
+            self._last_published[key] = values
+            self._last_publish_time[key] = now
+            return True
+        return False
@@ -0,0 +1,340 @@
+import argparse
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from hand_protocol import ANGLE_FIELDS, FINGER_NAMES
+
+# 手指角度的時間序列儲存：資料夾內每個時間區段（預設 1 小時）一個子資料夾，
+# 每個欄位一個以 np.memmap 存取的二進位檔，另有 meta.json 記錄幀數與時間範圍。
+# 只附加不修改；寫入時以區塊為單位預先配置空間，區段結束時截斷到實際幀數。
+# 查詢只讀取時間範圍內的資料，並以固定長度的區塊計算每個時間桶的最小、最大與平均值，
+# 長時間的紀錄不需要整份載入記憶體。
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+SEGMENT_DURATION = 3600.0  # 每個區段的時間長度（秒）
+QUERY_BLOCK_ROWS = 65536  # 查詢時每次讀取的幀數
+
+NUM_FINGERS = len(FINGER_NAMES)
+
+# 各欄位的 (檔名, dtype, 每幀形狀)
+COLUMNS = {
+    "time": ("time.f64", np.float64, ()),  # 接收時間，遞增，查詢以此為時間軸
+    "timestamp": ("timestamp.f64", np.float64, ()),  # 發送端的時間戳
+    "hand_id": ("hand_id.u8", np.uint8, ()),
+    "seq": ("seq.i64", np.int64, ()),  # 發送序號，沒有時為 -1
+    "angles": ("angles.f32", np.float32, (NUM_FINGERS, len(ANGLE_FIELDS))),
+}
+
+def _row_bytes(dtype, shape):
+    return int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+
+def payload_angles(data):
+    """把解碼後的手部數據轉換為 (5, 4) 陣列，欄位順序為 ANGLE_FIELDS，缺少的角度為 NaN"""
+    angles = np.full((NUM_FINGERS, len(ANGLE_FIELDS)), np.nan, dtype=np.float32)
+    for finger_id, finger in enumerate(data["fingers"][:NUM_FINGERS]):
+        for i, field in enumerate(ANGLE_FIELDS):
+            value = finger.get(f"{field}_angle")
+            if value is not None:
+                angles[finger_id, i] = value
+    return angles
+
+class _Segment:
+    """一個時間區段的欄位檔案"""
+
+    def __init__(self, path, start, chunk_frames):
+        self.path = path
+        self.start = start
+        self.chunk_frames = chunk_frames
+        self.count = 0
+        self.end = None  # 最後一幀的時間
+        self._capacity = 0
+        self._maps = {}
+        os.makedirs(path, exist_ok=True)
+        # 程式重新啟動時接續同一個區段已寫入的數據
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.isfile(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            self.count = meta["frames"]
+            self.end = meta["end"]
+        self._grow(self.count + chunk_frames)
+
+    def _grow(self, capacity):
+        self.flush()
+        self._maps = {}
+        for name, (filename, dtype, shape) in COLUMNS.items():
+            filepath = os.path.join(self.path, filename)
+            with open(filepath, "ab") as f:
+                f.truncate(capacity * _row_bytes(dtype, shape))
+            self._maps[name] = np.memmap(filepath, dtype=dtype, mode="r+", shape=(capacity,) + shape)
+        self._capacity = capacity
+
+    def append(self, t, timestamp, hand_id, seq, angles):
+        if self.count >= self._capacity:
+            self._grow(self._capacity + self.chunk_frames)
+        i = self.count
+        maps = self._maps
+        maps["time"][i] = t
+        maps["timestamp"][i] = timestamp
+        maps["hand_id"][i] = hand_id
+        maps["seq"][i] = seq
+        maps["angles"][i] = angles
+        self.count += 1
+        self.end = t
+
+    def _write_meta(self):
+        meta = {
+            "version": FORMAT_VERSION,
+            "frames": self.count,
+            "start": self.start,
+            "end": self.end,
+        }
+        # 先寫入暫存檔再改名，讀取端不會讀到寫到一半的 meta.json
+        tmp_path = os.path.join(self.path, META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.path, META_FILE))
+
+    def flush(self):
+        for column in self._maps.values():
+            column.flush()
+        if self._maps:
+            self._write_meta()
+
+    def close(self):
+        """截斷預先配置但未使用的空間"""
+        self.flush()
+        self._maps = {}
+        for filename, dtype, shape in COLUMNS.values():
+            with open(os.path.join(self.path, filename), "r+b") as f:
+                f.truncate(self.count * _row_bytes(dtype, shape))
+        self._write_meta()
+
+class AngleStore:
+    """把接收到的手指角度附加到依時間分段的 memmap 欄位檔案
+
+    時間（接收時間）超出目前區段時自動換到新的區段，區段的起點對齊 segment_duration
+    的整數倍，例如每小時一個子資料夾。meta.json 每隔 flush_interval 秒更新一次，
+    讀取端（AngleStoreReader）可在寫入的同時查詢已寫入的部分。
+
+    Args:
+        path: 儲存資料夾路徑（不存在時建立）
+        segment_duration: 每個區段的時間長度（秒）
+        chunk_frames: 每次擴充檔案時預先配置的幀數
+        flush_interval: 寫回磁碟並更新 meta.json 的間隔（秒）
+    """
+
+    def __init__(self, path, segment_duration=SEGMENT_DURATION, chunk_frames=16384, flush_interval=5.0):
+        self.path = path
+        self.segment_duration = segment_duration
+        self.chunk_frames = chunk_frames
+        self.flush_interval = flush_interval
+        self.count = 0
+        self.segments = 0
+        self._segment = None
+        self._last_time = None
+        self._last_flush = time.time()
+        os.makedirs(path, exist_ok=True)
+
+    def _open_segment(self, t):
+        if self._segment is not None:
+            self._segment.close()
+        start = math.floor(t / self.segment_duration) * self.segment_duration
+        self._segment = _Segment(os.path.join(self.path, f"{int(start):010d}"), start, self.chunk_frames)
+        self.segments += 1
+
+    def append(self, t, angles, hand_id=0, seq=-1, timestamp=math.nan):
+        """附加一幀
+
+        Args:
+            t: 接收時間（秒）；比上一幀早時（例如系統時鐘被調整）以上一幀的時間儲存，保持遞增
+            angles: (5, 4) 陣列，欄位順序為 ANGLE_FIELDS
+            hand_id: 手的編號
+            seq: 發送序號
+            timestamp: 發送端的時間戳
+        """
+        if self._last_time is not None and t < self._last_time:
+            t = self._last_time
+        self._last_time = t
+        segment = self._segment
+        if segment is None or t >= segment.start + self.segment_duration:
+            self._open_segment(t)
+            segment = self._segment
+        segment.append(t, timestamp, hand_id, seq, angles)
+        self.count += 1
+
+        now = time.time()
+        if now - self._last_flush >= self.flush_interval:
+            self._last_flush = now
+            segment.flush()
+
+    def append_payload(self, data, receive_time):
+        """附加一筆 decode_payload() 解碼後的手部數據"""
+        self.append(receive_time, payload_angles(data), data.get("hand_id", 0),
+                    data.get("seq", -1), data.get("timestamp", math.nan))
+
+    def flush(self):
+        if self._segment is not None:
+            self._segment.flush()
+
+    def close(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class AngleStoreReader:
+    """以唯讀 memmap 查詢 AngleStore 的資料，可與寫入端同時使用
+
+    Args:
+        path: 儲存資料夾路徑
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def segments(self):
+        """回傳 [(區段資料夾, meta)]，依時間排序；每次呼叫重新讀取，包含寫入中的區段"""
+        segments = []
+        for name in sorted(os.listdir(self.path)):
+            meta_path = os.path.join(self.path, name, META_FILE)
+            if not os.path.isfile(meta_path):
+                continue
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["version"] != FORMAT_VERSION:
+                raise ValueError(f"不支援的儲存格式版本: {meta['version']}")
+            if meta["frames"]:
+                segments.append((os.path.join(self.path, name), meta))
+        return segments
+
+    def time_range(self):
+        """回傳 (最早, 最晚) 的時間，沒有資料時回傳 None"""
+        segments = self.segments()
+        if not segments:
+            return None
+        first_path, first_meta = segments[0]
+        return float(self._column(first_path, first_meta, "time")[0]), segments[-1][1]["end"]
+
+    @staticmethod
+    def _column(segment_path, meta, name):
+        filename, dtype, shape = COLUMNS[name]
+        return np.memmap(os.path.join(segment_path, filename), dtype=dtype, mode="r",
+                         shape=(meta["frames"],) + shape)
+
+    def _blocks(self, start, end, hand_id, field, block_rows):
+        """依序產生時間範圍內的 (time, values) 區塊，values 形狀為 (n, 5)"""
+        column = ANGLE_FIELDS.index(field)
+        for segment_path, meta in self.segments():
+            if meta["end"] < start or meta["start"] >= end:
+                continue
+            times = self._column(segment_path, meta, "time")
+            angles = self._column(segment_path, meta, "angles")
+            hands = self._column(segment_path, meta, "hand_id") if hand_id is not None else None
+            lo = int(np.searchsorted(times, start, side="left"))
+            hi = int(np.searchsorted(times, end, side="left"))
+            for b0 in range(lo, hi, block_rows):
+                b1 = min(b0 + block_rows, hi)
+                t = np.asarray(times[b0:b1])
+                values = np.asarray(angles[b0:b1, :, column])
+                if hands is not None:
+                    mask = np.asarray(hands[b0:b1]) == hand_id
+                    t, values = t[mask], values[mask]
+                if len(t):
+                    yield t, values
+
+    def query(self, start=None, end=None, hand_id=None, field="total", block_rows=QUERY_BLOCK_ROWS):
+        """讀取時間範圍 [start, end) 內的原始數據
+
+        Args:
+            start, end: 時間範圍（秒），None 表示不限制
+            hand_id: 只取這隻手的數據，None 表示全部
+            field: 角度欄位，見 ANGLE_FIELDS
+
+        Returns:
+            tuple: (time (n,), values (n, 5))
+        """
+        start = -math.inf if start is None else start
+        end = math.inf if end is None else end
+        blocks = list(self._blocks(start, end, hand_id, field, block_rows))
+        if not blocks:
+            return np.empty(0), np.empty((0, NUM_FINGERS), dtype=np.float32)
+        return np.concatenate([t for t, _ in blocks]), np.concatenate([v for _, v in blocks])
+
+    def downsample(self, start, end, bucket, hand_id=None, field="total", block_rows=QUERY_BLOCK_ROWS):
+        """把時間範圍 [start, end) 分成長度 bucket 秒的時間桶，計算每個桶的統計值
+
+        每次只讀取 block_rows 幀，記憶體用量與時間範圍長度無關（只與時間桶數量有關）。
+
+        Returns:
+            dict: time（各桶起點）、count (buckets,)，以及 min / max / mean (buckets, 5)；
+                沒有數據的桶 count 為 0、統計值為 NaN
+        """
+        buckets = max(int(math.ceil((end - start) / bucket)), 1)
+        minimum = np.full((buckets, NUM_FINGERS), np.inf)
+        maximum = np.full((buckets, NUM_FINGERS), -np.inf)
+        total = np.zeros((buckets, NUM_FINGERS))
+        count = np.zeros(buckets, dtype=np.int64)
+
+        for t, values in self._blocks(start, end, hand_id, field, block_rows):
+            index = ((t - start) // bucket).astype(np.int64)
+            # 時間遞增，同一個桶的數據在區塊內是連續的
+            starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+            ids = index[starts]
+            minimum[ids] = np.fmin(minimum[ids], np.minimum.reduceat(values, starts, axis=0))
+            maximum[ids] = np.fmax(maximum[ids], np.maximum.reduceat(values, starts, axis=0))
+            total[ids] += np.add.reduceat(values, starts, axis=0, dtype=np.float64)
+            count[ids] += np.diff(np.r_[starts, len(index)])
+
+        empty = count == 0
+        minimum[empty] = np.nan
+        maximum[empty] = np.nan
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count[:, None]
+        return {
+            "time": start + np.arange(buckets) * bucket,
+            "count": count,
+            "min": minimum,
+            "max": maximum,
+            "mean": mean,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="查詢手指角度紀錄")
+    parser.add_argument("path", help="AngleStore 儲存資料夾")
+    parser.add_argument("--last", type=float, default=3600.0, help="查詢最近幾秒的數據")
+    parser.add_argument("--points", type=int, default=60, help="時間桶數量")
+    parser.add_argument("--hand-id", type=int, help="只查詢這隻手")
+    parser.add_argument("--field", choices=ANGLE_FIELDS, default="total", help="角度欄位")
+    args = parser.parse_args()
+
+    reader = AngleStoreReader(args.path)
+    time_range = reader.time_range()
+    if time_range is None:
+        print("⚠️ 沒有數據")
+        return
+    end = time_range[1] + 1e-6
+    start = max(end - args.last, time_range[0])
+    query_start = time.perf_counter()
+    result = reader.downsample(start, end, (end - start) / args.points, args.hand_id, args.field)
+    elapsed = time.perf_counter() - query_start
+    print(f"📊 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start))} ~ "
+          f"{time.strftime('%H:%M:%S', time.localtime(end))}，{int(result['count'].sum())} 幀，"
+          f"查詢 {elapsed * 1000:.1f} ms")
+    print("時間      幀數  " + "  ".join(f"{name}(平均)" for name in FINGER_NAMES))
+    for bucket_time, count, mean in zip(result["time"], result["count"], result["mean"]):
+        if count:
+            values = "  ".join(f"{value:8.1f}" for value in mean)
+            print(f"{time.strftime('%H:%M:%S', time.localtime(bucket_time))}  {count:5d}  {values}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import asyncio
+
+import paho.mqtt.client as mqtt
+
+# asyncio 版的 MQTT 客戶端：paho 的 socket 交給事件迴圈的 add_reader/add_writer 監聽，
+# 不需要 loop_forever / loop_start 的執行緒，同一個事件迴圈可以同時處理多個客戶端、
+# 多個訂閱、計時器與其他 I/O。
+
+class MessageStream:
+    """messages() 回傳的非同步迭代器，建立時即開始接收，佇列滿時丟棄最舊的訊息"""
+
+    def __init__(self, client, topic_filter, maxsize):
+        self.topic_filter = topic_filter
+        self._client = client
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        client._streams.append(self)
+
+    def _put(self, message):
+        if self._queue.full():
+            # 只保留最新的數據，避免處理速度跟不上時佇列無限增長
+            self._queue.get_nowait()
+            self._client.dropped_count += 1
+        self._queue.put_nowait(message)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self._queue.get()
+        if message is None:
+            self.close()
+            raise StopAsyncIteration
+        return message
+
+    def close(self):
+        if self in self._client._streams:
+            self._client._streams.remove(self)
+
+class AsyncMqttClient:
+    """以 asyncio 事件迴圈驅動的 MQTT 客戶端
+
+    用法：
+        async with AsyncMqttClient(broker, port) as client:
+            await client.subscribe("hand_tracking")
+            async for message in client.messages():
+                ...
+
+    斷線時以指數退避自動重連，重連後重新訂閱所有主題。
+
+    Args:
+        broker: MQTT 伺服器位址
+        port: MQTT 伺服器端口
+        client_id: 客戶端 ID，空字串表示由伺服器指定
+        keepalive: 心跳間隔（秒）
+        max_inflight: 同時等待完成的 publish 數量上限，超過時 publish() 會等待（流量控制）
+        max_queue: 每個 messages() 迭代器的接收佇列長度，滿時丟棄最舊的訊息
+        reconnect_min_delay: 斷線重連的最短等待秒數
+        reconnect_max_delay: 斷線重連的最長等待秒數（指數退避上限）
+    """
+
+    def __init__(self, broker, port=1883, client_id="", keepalive=60, max_inflight=20, max_queue=100,
+                 reconnect_min_delay=1, reconnect_max_delay=30):
+        self.broker = broker
+        self.port = port
+        self.keepalive = keepalive
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.reconnect_min_delay = reconnect_min_delay
+        self.reconnect_max_delay = reconnect_max_delay
+
+        self.client = mqtt.Client(client_id)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+        self.client.on_publish = self._on_publish
+        self.client.on_subscribe = self._on_subscribe
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
+        self._subscriptions = {}  # topic -> qos，重連後重新訂閱
+        self._streams = []  # messages() 建立的 MessageStream
+        self._pending_publish = {}  # mid -> (future, qos)
+        # publish() 呼叫 client.publish 期間就已完成的 mid（QoS 0 可能立即寫出），其他時間為 None；
+        # 直接以 client.publish 發送的訊息不會記錄，避免 mid 循環使用後誤判為已完成
+        self._completed_publish = None
+        self._pending_subscribe = {}  # mid -> future
+        self._loop = None
+        self._connected = None
+        self._socket_closed = None
+        self._inflight = None
+        self._tasks = []
+        self._reconnect_task = None
+        self._closing = False
+
+        # 統計資訊
+        self.received_count = 0
+        self.dropped_count = 0
+        self.published_count = 0
+
+    # ========== paho 回調（在事件迴圈中執行） ========== #
+    def _on_socket_open(self, client, userdata, sock):
+        self._socket_closed.clear()
+        self._loop.add_reader(sock, client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._loop.remove_reader(sock)
+        self._loop.remove_writer(sock)
+        self._socket_closed.set()
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._loop.add_writer(sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._loop.remove_writer(sock)
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            print(f"❌ MQTT 連接失敗 (錯誤碼: {rc})")
+            return
+        for topic, qos in self._subscriptions.items():
+            client.subscribe(topic, qos)
+        self._connected.set()
+
+    def _on_disconnect(self, client, userdata, rc):
+        self._connected.clear()
+        # QoS 0 的訊息斷線後不會重送，讓等待中的 publish() 失敗
+        for mid, (future, qos) in list(self._pending_publish.items()):
+            if qos == 0:
+                del self._pending_publish[mid]
+                if not future.done():
+                    future.set_exception(ConnectionError("MQTT 連線中斷"))
+        if not self._closing and self._reconnect_task is None:
+            print(f"⚠️ MQTT 斷線 (錯誤碼: {rc})，等待自動重連...")
+            self._reconnect_task = self._loop.create_task(self._reconnect())
+
+    def _on_message(self, client, userdata, message):
+        self.received_count += 1
+        for stream in self._streams:
+            if stream.topic_filter is None or mqtt.topic_matches_sub(stream.topic_filter, message.topic):
+                stream._put(message)
+
+    def _on_publish(self, client, userdata, mid):
+        self.published_count += 1
+        pending = self._pending_publish.pop(mid, None)
+        if pending is None:
+            if self._completed_publish is not None:
+                self._completed_publish.add(mid)
+        elif not pending[0].done():
+            pending[0].set_result(mid)
+
+    def _on_subscribe(self, client, userdata, mid, granted_qos):
+        future = self._pending_subscribe.pop(mid, None)
+        if future is not None and not future.done():
+            future.set_result(granted_qos)
+
+    # ========== 連線 ========== #
+    async def connect(self, timeout=None):
+        """連接伺服器並等待連線完成；伺服器暫時無法連接時會持續重試直到 timeout"""
+        self._loop = asyncio.get_running_loop()
+        self._connected = asyncio.Event()
+        self._socket_closed = asyncio.Event()
+        self._inflight = asyncio.Semaphore(self.max_inflight)
+        self._closing = False
+        self._tasks.append(self._loop.create_task(self._misc_loop()))
+        try:
+            self.client.connect(self.broker, self.port, self.keepalive)
+        except OSError as e:
+            print(f"⚠️ 無法連接到 MQTT 伺服器 ({self.broker}:{self.port}): {e}，等待自動重連...")
+            self._reconnect_task = self._loop.create_task(self._reconnect())
+        await asyncio.wait_for(self._connected.wait(), timeout)
+        return self
+
+    async def _reconnect(self):
+        delay = self.reconnect_min_delay
+        try:
+            while not self._closing:
+                await asyncio.sleep(delay)
+                try:
+                    self.client.reconnect()
+                    return
+                except OSError as e:
+                    print(f"⚠️ MQTT 重連失敗: {e}，{delay} 秒後重試")
+                    delay = min(delay * 2, self.reconnect_max_delay)
+        finally:
+            self._reconnect_task = None
+
+    async def _misc_loop(self):
+        # 處理心跳與逾時重送，paho 建議每秒呼叫一次
+        while not self._closing:
+            self.client.loop_misc()
+            await asyncio.sleep(1)
+
+    def is_connected(self):
+        return self._connected is not None and self._connected.is_set()
+
+    async def wait_connected(self, timeout=None):
+        await asyncio.wait_for(self._connected.wait(), timeout)
+
+    async def close(self):
+        """斷開連線並結束所有 messages() 迭代器"""
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self.client.is_connected():
+            # DISCONNECT 由事件迴圈寫出，等待 socket 關閉（最多 1 秒）
+            self.client.disconnect()
+            try:
+                await asyncio.wait_for(self._socket_closed.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        for stream in list(self._streams):
+            stream._put(None)
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ========== 訂閱與發送 ========== #
+    async def subscribe(self, topic, qos=0):
+        """訂閱主題並等待伺服器確認；尚未連線時會在連線後自動訂閱"""
+        self._subscriptions[topic] = qos
+        if not self.is_connected():
+            return None
+        rc, mid = self.client.subscribe(topic, qos)
+        if rc != mqtt.MQTT_ERR_SUCCESS:
+            return None
+        future = self._loop.create_future()
+        self._pending_subscribe[mid] = future
+        return await future
+
+    async def unsubscribe(self, topic):
+        self._subscriptions.pop(topic, None)
+        if self.is_connected():
+            self.client.unsubscribe(topic)
+
+    async def publish(self, topic, payload, qos=0, retain=False):
+        """發送訊息，QoS 0 在寫入 socket 後返回，QoS 1/2 在伺服器確認後返回
+
+        同時等待完成的 publish 超過 max_inflight 時會先等待，斷線時會等到重連後才發送。
+        """
+        async with self._inflight:
+            await self._connected.wait()
+            self._completed_publish = set()
+            try:
+                info = self.client.publish(topic, payload, qos, retain)
+            finally:
+                completed, self._completed_publish = self._completed_publish, None
+            if info.rc == mqtt.MQTT_ERR_NO_CONN:
+                raise ConnectionError("MQTT 尚未連線")
+            if info.mid in completed:
+                return info.mid
+            future = self._loop.create_future()
+            self._pending_publish[info.mid] = (future, qos)
+            return await future
+
+    def messages(self, topic_filter=None):
+        """回傳收到的訊息（paho MQTTMessage）的非同步迭代器
+
+        多個迭代器可同時使用，每個都會收到符合自己篩選條件的訊息。
+
+        Args:
+            topic_filter: 只接收符合此主題篩選（可含 + 與 #）的訊息，None 表示全部
+        """
+        return MessageStream(self, topic_filter, self.max_queue)
@@ -0,0 +1,427 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from Mqtt import MqttPublisher, topic_hand
+from hand_angles import compute_finger_angles, build_hand_payload
+from hand_protocol import PAYLOAD_FORMATS, DeltaDecoder, DeltaEncoder, encode_hand_frame
+from angle_store import AngleStore, AngleStoreReader
+
+# 效能測試：對錄影檔與合成的關鍵點串流量測各階段延遲與整體吞吐量，
+# 結果以 JSON 輸出，可與先前的結果比較以找出效能退步。
+
+BENCH_TOPIC = f"{topic_hand}/benchmark"
+
+# ========== 本機 broker 替身 ========== #
+class _Message:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+class _PublishInfo:
+    rc = 0
+
+class LoopbackBroker:
+    """行程內的 MQTT broker 替身
+
+    不需要網路或 mosquitto，由一個傳遞執行緒把訊息交給訂閱者的 on_message，
+    用來量測發送端與接收端本身的成本。
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._subscribers = []
+        self._thread = threading.Thread(target=self._deliver_loop, daemon=True)
+        self._thread.start()
+
+    def client(self):
+        return LoopbackClient(self)
+
+    def _deliver_loop(self):
+        while True:
+            topic, payload = self._queue.get()
+            message = _Message(topic, payload)
+            for client in list(self._subscribers):
+                if client.on_message is not None:
+                    client.on_message(client, None, message)
+
+class LoopbackClient:
+    """與 paho Client 介面相容的最小客戶端，連接到 LoopbackBroker"""
+
+    def __init__(self, broker):
+        self._broker = broker
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        pass
+
+    def connect_async(self, host, port=1883, keepalive=60):
+        pass
+
+    def connect(self, host, port=1883, keepalive=60):
+        pass
+
+    def loop_start(self):
+        if self.on_connect is not None:
+            self.on_connect(self, None, {}, 0)
+
+    def loop_stop(self):
+        pass
+
+    def subscribe(self, topic, qos=0):
+        self._broker._subscribers.append(self)
+
+    def publish(self, topic, payload, qos=0):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self._broker._queue.put((topic, payload))
+        return _PublishInfo()
+
+    def disconnect(self):
+        if self in self._broker._subscribers:
+            self._broker._subscribers.remove(self)
+
+def _paho_subscriber(host, port, on_message, topic):
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client()
+    client.on_message = on_message
+    client.connect(host, port, 60)
+    client.subscribe(topic)
+    client.loop_start()
+    return client
+
+# ========== 量測工具 ========== #
+def summarize(samples, elapsed=None):
+    """把每次的耗時（秒）整理成統計數據"""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    if len(values) == 0:
+        return {"count": 0}
+    stats = {
+        "count": int(len(values)),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+    total = elapsed if elapsed is not None else values.sum() / 1000
+    if total > 0:
+        stats["throughput_per_s"] = len(values) / total
+    return stats
+
+def _time_each(func, items):
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def synthetic_landmarks(frames, hands=1, seed=0):
+    """產生隨機漫步的關鍵點串流，形狀為 (frames, hands, 21, 3)"""
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(0.3, 0.7, size=(hands, 21, 3)).astype(np.float32)
+    steps = rng.normal(0, 0.002, size=(frames, hands, 21, 3)).astype(np.float32)
+    return base + np.cumsum(steps, axis=0)
+
+def _encode(angles, seq, timestamp, payload_format):
+    if payload_format == "json":
+        payload = build_hand_payload(angles, timestamp)
+        payload["seq"] = seq
+        return json.dumps(payload)
+    return encode_hand_frame(angles, seq, timestamp, compact=payload_format == "binary_u8")
+
+def _encoder(payload_format):
+    """回傳編碼函數 (angles, seq, timestamp)，差量格式的每次呼叫共用同一個 DeltaEncoder"""
+    if payload_format == "delta":
+        encoder = DeltaEncoder()
+        return lambda angles, seq, timestamp: encoder.encode(angles, seq, timestamp)
+    return lambda angles, seq, timestamp: _encode(angles, seq, timestamp, payload_format)
+
+# ========== 各階段 ========== #
+def bench_video(path, max_frames, run_inference):
+    """解碼錄影檔，並可選擇對每一幀進行 MediaPipe 推論與角度計算"""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise RuntimeError(f"無法開啟影片: {path}")
+    decode_samples, frames = [], []
+    while len(frames) < max_frames:
+        start = time.perf_counter()
+        ret, frame = cap.read()
+        if not ret:
+            break
+        decode_samples.append(time.perf_counter() - start)
+        frames.append(frame)
+    cap.release()
+    results = {"decode": summarize(decode_samples)}
+    if not run_inference or not frames:
+        return results
+
+    import mediapipe as mp
+    from hand_angles import landmarks_to_array
+
+    hands = mp.solutions.hands.Hands(static_image_mode=False, max_num_hands=2,
+                                     min_detection_confidence=0.5, min_tracking_confidence=0.5)
+    inference_samples, angle_samples = [], []
+    detected = 0
+    for frame in frames:
+        start = time.perf_counter()
+        result = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        inference_samples.append(time.perf_counter() - start)
+        if result.multi_hand_landmarks:
+            detected += 1
+            start = time.perf_counter()
+            compute_finger_angles(landmarks_to_array(result.multi_hand_landmarks),
+                                  image_size=(frame.shape[1], frame.shape[0]))
+            angle_samples.append(time.perf_counter() - start)
+    hands.close()
+    results["inference"] = summarize(inference_samples)
+    results["inference"]["frames_with_hands"] = detected
+    results["video_angles"] = summarize(angle_samples)
+    return results
+
+def bench_angles(points):
+    frame_points = list(points)
+    return summarize(_time_each(lambda p: compute_finger_angles(p, image_size=(640, 480)), frame_points))
+
+def bench_serialization(all_angles, payload_format):
+    now = time.time()
+    items = list(enumerate(all_angles))
+    # 時間戳以 30 Hz 遞增，差量格式依此發送關鍵幀
+    encode = _encoder(payload_format)
+    samples = _time_each(lambda item: encode(item[1], item[0], now + item[0] / 30), items)
+    stats = summarize(samples)
+    encode = _encoder(payload_format)
+    stats["payload_bytes"] = float(np.mean([len(encode(angles, seq, now + seq / 30)) for seq, angles in items]))
+    return stats
+
+def bench_receive(payloads):
+    """量測接收端的解碼，以及樹莓派接收程式完整的 on_message 處理"""
+    results = {"decode": summarize(_time_each(DeltaDecoder().decode_payload, payloads))}
+
+    receiver_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "raspberry_pi", "receiver.py")
+    spec = importlib.util.spec_from_file_location("pi_receiver", receiver_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    receiver = module.HandDataReceiver()
+    messages = [_Message(topic_hand, payload) for payload in payloads]
+    # 接收程式會大量 print，輸出導向記憶體以只量測處理成本
+    with contextlib.redirect_stdout(io.StringIO()):
+        samples = _time_each(lambda msg: receiver.on_message(receiver.client.client, None, msg), messages)
+    results["pi_on_message"] = summarize(samples)
+    return results
+
+def bench_store(hours, rate=100.0, hands=1, repeat=5):
+    """以 rate Hz 寫入 hours 小時的角度紀錄（時間為模擬值，不等待），量測寫入與查詢
+
+    查詢項目：最近 1 分鐘的原始數據、最近 1 小時以 1 秒分桶、整段紀錄分成 500 桶
+    （全部的手與只查詢一隻手）。
+    """
+    frames = int(hours * 3600 * rate)
+    path = tempfile.mkdtemp(prefix="angle_store_")
+    rng = np.random.default_rng(0)
+    angles = (180 + np.cumsum(rng.normal(0, 1, size=(4096, 5, 4)), axis=0)).astype(np.float32)
+    start = time.time() - hours * 3600
+    try:
+        samples = np.empty(frames)
+        store = AngleStore(path)
+        ingest_start = time.perf_counter()
+        for i in range(frames):
+            t = start + i / rate
+            begin = time.perf_counter()
+            store.append(t, angles[i % len(angles)], hand_id=i % hands, seq=i, timestamp=t)
+            samples[i] = time.perf_counter() - begin
+        store.close()
+        results = {"store_ingest": summarize(samples, time.perf_counter() - ingest_start)}
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+        results["store_ingest"]["bytes_per_frame"] = size / max(frames, 1)
+        results["store_ingest"]["segments"] = store.segments
+
+        reader = AngleStoreReader(path)
+        end = start + frames / rate
+        queries = {
+            "store_query_raw_1min": lambda: reader.query(end - 60, end),
+            "store_query_1h_1s": lambda: reader.downsample(end - 3600, end, 1.0),
+            "store_query_all_500": lambda: reader.downsample(start, end, (end - start) / 500),
+            "store_query_hand_all_500": lambda: reader.downsample(start, end, (end - start) / 500, hand_id=0),
+        }
+        for name, query in queries.items():
+            results[name] = summarize(_time_each(lambda _: query(), range(repeat)))
+        return results
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def bench_end_to_end(all_angles, payload_format, broker=None, timeout=30.0):
+    """角度 → 編碼 → 發送 → 接收 → 解碼 的整體吞吐量與延遲
+
+    Args:
+        broker: (host, port)，None 表示使用 LoopbackBroker
+    """
+    received = []
+    latencies = []
+    done = threading.Event()
+    total = len(all_angles)
+    decoder = DeltaDecoder()
+
+    def on_message(client, userdata, msg):
+        data = decoder.decode_payload(msg.payload)
+        if data is None:
+            return
+        latencies.append(time.time() - data["timestamp"])
+        received.append(data.get("seq"))
+        if len(received) >= total:
+            done.set()
+
+    if broker is None:
+        loopback = LoopbackBroker()
+        subscriber = loopback.client()
+        subscriber.on_message = on_message
+        subscriber.subscribe(BENCH_TOPIC)
+        publisher = MqttPublisher(topic=BENCH_TOPIC, max_queue=total, client=loopback.client())
+    else:
+        host, port = broker
+        subscriber = _paho_subscriber(host, port, on_message, BENCH_TOPIC)
+        publisher = MqttPublisher(broker=host, port=port, topic=BENCH_TOPIC, max_queue=total)
+        time.sleep(0.5)
+    publisher.start()
+
+    publish_samples = []
+    encode = _encoder(payload_format)
+    start = time.perf_counter()
+    for seq, angles in enumerate(all_angles):
+        t0 = time.perf_counter()
+        publisher.publish(encode(angles, seq, time.time()))
+        publish_samples.append(time.perf_counter() - t0)
+    done.wait(timeout)
+    elapsed = time.perf_counter() - start
+
+    publisher.stop()
+    subscriber.disconnect()
+    if broker is not None:
+        subscriber.loop_stop()
+
+    results = {
+        "publish_call": summarize(publish_samples),
+        "latency": summarize(latencies, elapsed),
+        "sent": total,
+        "received": len(received),
+        "dropped": total - len(received),
+        "throughput_per_s": len(received) / elapsed if elapsed > 0 else 0.0,
+    }
+    return results
+
+# ========== 結果比較 ========== #
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+def compare(results, baseline, tolerance):
+    """比較 mean_ms 與 p95_ms，回傳超過容許範圍的項目"""
+    current = _flatten(results.get("stages", {}))
+    previous = _flatten(baseline.get("stages", {}))
+    regressions = []
+    for name, value in current.items():
+        if not name.endswith(("mean_ms", "p95_ms")) or name not in previous:
+            continue
+        if previous[name] > 0 and value > previous[name] * (1 + tolerance):
+            regressions.append({"metric": name, "baseline": previous[name], "current": value})
+    return regressions
+
+def run(args):
+    points = synthetic_landmarks(args.frames, hands=args.hands)
+    all_angles = [compute_finger_angles(p, image_size=(640, 480))[0] for p in points]
+    encode = _encoder(args.format)
+    now = time.time()
+    payloads = [encode(angles, seq, now + seq / 30) for seq, angles in enumerate(all_angles)]
+    payloads = [p.encode() if isinstance(p, str) else p for p in payloads]
+
+    stages = {}
+    if args.video:
+        stages.update(bench_video(args.video, args.frames, not args.skip_inference))
+    stages["angles"] = bench_angles(points)
+    stages["serialize"] = bench_serialization(all_angles, args.format)
+    stages["receive"] = bench_receive(payloads)
+    broker = None
+    if args.broker:
+        host, _, port = args.broker.partition(":")
+        broker = (host, int(port or 1883))
+    stages["end_to_end"] = bench_end_to_end(all_angles, args.format, broker)
+    if args.store_hours > 0:
+        stages.update(bench_store(args.store_hours, args.store_rate, args.hands))
+
+    return {
+        "timestamp": time.time(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "config": {
+            "frames": args.frames,
+            "hands": args.hands,
+            "format": args.format,
+            "video": args.video,
+            "broker": args.broker or "loopback",
+            "store_hours": args.store_hours,
+            "store_rate": args.store_rate,
+        },
+        "stages": stages,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="手部追蹤與 MQTT 傳輸效能測試")
+    parser.add_argument("--frames", type=int, default=1000, help="合成關鍵點的幀數（也是影片最多讀取的幀數）")
+    parser.add_argument("--hands", type=int, default=1, help="每幀的手數")
+    parser.add_argument("--format", choices=PAYLOAD_FORMATS, default="json", help="MQTT 數據格式")
+    parser.add_argument("--video", help="錄影檔路徑，用於量測解碼與推論")
+    parser.add_argument("--skip-inference", action="store_true", help="只量測影片解碼，不執行 MediaPipe")
+    parser.add_argument("--broker", help="實際的 MQTT broker（host[:port]），預設使用行程內替身")
+    parser.add_argument("--store-hours", type=float, default=0.0, help="角度紀錄寫入與查詢測試的紀錄長度（小時），0 表示不測試")
+    parser.add_argument("--store-rate", type=float, default=100.0, help="角度紀錄測試的寫入頻率（Hz）")
+    parser.add_argument("--output", help="結果輸出的 JSON 檔案，預設輸出到標準輸出")
+    parser.add_argument("--baseline", help="先前的結果 JSON，用於比較")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允許比基準慢的比例")
+    args = parser.parse_args()
+
+    results = run(args)
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    for regression in results.get("regressions", []):
+        print(f"⚠️ 效能退步: {regression['metric']} {regression['baseline']:.3f} → {regression['current']:.3f}",
+              file=sys.stderr)
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
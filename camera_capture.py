@@ -0,0 +1,360 @@
+import threading
+import time
+import logging
+import urllib.request
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class LatestFrameCapture:
+    """在獨立執行緒讀取 VideoCapture，只保留最新一幀
+
+    IP Webcam 的 MJPEG 串流若讀取太慢，緩衝區會累積舊畫面。這個類別由背景
+    執行緒持續呼叫 cap.read()，把畫面寫入單格緩衝區，消費端每次取得的都是
+    最新畫面；在被取走之前就被覆蓋的畫面會計入 dropped_frames。
+
+    Args:
+        cap: 已開啟的 cv2.VideoCapture（或任何提供 read()/release() 的物件）
+    """
+
+    def __init__(self, cap):
+        self.cap = cap
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_time = 0.0
+        self._seq = 0            # 已擷取的畫面編號
+        self._consumed_seq = 0   # 消費端最後取得的畫面編號
+        self._running = False
+        self._thread = None
+
+        # 統計資訊
+        self.captured_frames = 0
+        self.dropped_frames = 0
+
+    def start(self):
+        """啟動擷取執行緒"""
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _capture_loop(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            capture_time = time.time()
+            with self._cond:
+                if not ret:
+                    logger.error("無法讀取攝像頭畫面")
+                    self._running = False
+                    self._cond.notify_all()
+                    break
+                # 上一幀還沒被取走就被覆蓋，視為丟棄
+                if self._seq > self._consumed_seq:
+                    self.dropped_frames += 1
+                self._frame = frame
+                self._frame_time = capture_time
+                self._seq += 1
+                self.captured_frames += 1
+                self._cond.notify_all()
+
+    def read_latest(self, timeout=1.0):
+        """等待並取得比上次更新的畫面
+
+        Returns:
+            tuple: (frame, seq, capture_time)，串流結束或逾時時 frame 為 None
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > self._consumed_seq or not self._running, timeout)
+            if self._seq <= self._consumed_seq:
+                return None, self._consumed_seq, self._frame_time
+            self._consumed_seq = self._seq
+            return self._frame, self._seq, self._frame_time
+
+    def read(self):
+        """與 cv2.VideoCapture.read() 相同的介面，回傳 (ret, frame)"""
+        while True:
+            frame, _, _ = self.read_latest()
+            if frame is not None:
+                return True, frame
+            if not self._running:
+                return False, None
+
+    def isOpened(self):
+        return self._running or self._seq > self._consumed_seq
+
+    def stop(self):
+        """停止擷取執行緒"""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def release(self):
+        """停止擷取並釋放攝像頭"""
+        self.stop()
+        self.cap.release()
+
+# ========== MJPEG 串流 ========== #
+# cv2.imdecode 的縮小解碼旗標：JPEG 在解碼時直接以 1/2、1/4、1/8 解析度輸出，
+# 只做部分 IDCT，比完整解碼後再 resize 省下大部分的解碼時間
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# 帶有影像大小的 SOF 標記（排除 DHT 0xC4、JPG 0xC8、DAC 0xCC）
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def jpeg_size(data, length=None):
+    """只讀取 JPEG 標頭取得 (width, height)，找不到時回傳 None"""
+    length = len(data) if length is None else length
+    i = 2
+    while i + 9 <= length:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # 填充位元組
+            i += 1
+            continue
+        segment_length = (data[i + 2] << 8) | data[i + 3]
+        if marker in _SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        if marker == 0xDA:  # 影像資料開始，之後沒有 SOF
+            return None
+        i += 2 + segment_length
+    return None
+
+def decode_scale(source_size, target_size):
+    """解碼後仍不小於 target_size 的最大縮小倍率（1、2、4 或 8）"""
+    if source_size is None or target_size is None:
+        return 1
+    scale = 1
+    for candidate in (2, 4, 8):
+        if source_size[0] // candidate >= target_size[0] and source_size[1] // candidate >= target_size[1]:
+            scale = candidate
+    return scale
+
+class _JpegBuffer:
+    """可重複使用的 JPEG 資料緩衝區，空間不足時才擴大"""
+    __slots__ = ("data", "length")
+
+    def __init__(self, capacity=256 * 1024):
+        self.data = bytearray(capacity)
+        self.length = 0
+
+    def reserve(self, size):
+        if size > len(self.data):
+            self.data = bytearray(max(size, len(self.data) * 2))
+
+    def view(self):
+        return np.frombuffer(self.data, dtype=np.uint8, count=self.length)
+
+class MjpegCapture:
+    """直接解析 IP Webcam 的 MJPEG multipart 串流，以縮小解析度解碼最新畫面
+
+    HTTP 串流無法以 cap.set() 調整解析度，cv2.VideoCapture 每一幀都會以手機的
+    完整解析度解碼。這個類別由背景執行緒讀取串流，只把壓縮的 JPEG 資料複製到
+    三個輪流使用的緩衝區（寫入中、最新、解碼中），不做解碼；消費端呼叫
+    read_latest() 時才解碼最新一幀，在被取走之前就被覆蓋的畫面完全不會解碼。
+    解碼時依 target_size 選擇 IMREAD_REDUCED_COLOR_2/4/8，輸出不小於
+    target_size 的最小解析度。
+
+    介面與 LatestFrameCapture 相同，可直接替換。
+
+    Args:
+        url: MJPEG 串流網址，例如 http://<手機 IP>:8080/video
+        target_size: 需要的最小解析度 (width, height)，None 表示完整解析度
+        scale: 固定的縮小倍率（1、2、4、8），None 表示依 target_size 自動選擇
+        timeout: 連線與讀取逾時（秒）
+    """
+
+    def __init__(self, url, target_size=None, scale=None, timeout=10.0):
+        if scale is not None and scale not in REDUCED_DECODE_FLAGS:
+            raise ValueError(f"不支援的縮小倍率: {scale}")
+        self.url = url
+        self.target_size = target_size
+        self.scale = scale
+        self.timeout = timeout
+        self._response = None
+        self._boundary = None
+        self._at_headers = False  # 已讀過邊界行，下一行是區塊標頭
+        self._cond = threading.Condition()
+        self._write = _JpegBuffer()
+        self._ready = _JpegBuffer()
+        self._decode = _JpegBuffer()
+        self._ready_time = 0.0
+        self._seq = 0            # 已接收的畫面編號
+        self._consumed_seq = 0   # 消費端最後取得的畫面編號
+        self._running = False
+        self._thread = None
+
+        # 統計資訊
+        self.captured_frames = 0
+        self.dropped_frames = 0
+        self.decoded_frames = 0
+        self.decode_errors = 0
+        self.source_size = None  # 手機送出的原始解析度
+        self.frame_size = None   # 解碼後的解析度
+
+    def open(self):
+        """連接串流並讀取 multipart 邊界，失敗時拋出 OSError"""
+        self._response = urllib.request.urlopen(self.url, timeout=self.timeout)
+        content_type = self._response.headers.get("Content-Type", "")
+        for param in content_type.split(";")[1:]:
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "boundary":
+                self._boundary = value.strip('"')
+        return self
+
+    def start(self):
+        """啟動讀取執行緒（尚未連線時先連線）"""
+        if self._running:
+            return self
+        if self._response is None:
+            self.open()
+        self._running = True
+        self._thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _read_part(self, buffer):
+        """讀取下一個 multipart 區塊的 JPEG 到 buffer，串流結束時回傳 False"""
+        stream = self._response
+        content_length = None
+        in_headers = self._at_headers
+        # 區塊標頭：邊界行、Content-Type、Content-Length，以空行結束
+        while True:
+            line = stream.readline()
+            if not line:
+                return False
+            line = line.strip()
+            if line.startswith(b"--"):
+                in_headers = True
+                continue
+            if not in_headers:
+                continue  # 上一個區塊結尾的空行
+            if not line:
+                break
+            key, _, value = line.partition(b":")
+            if key.strip().lower() == b"content-length":
+                content_length = int(value)
+
+        if content_length is None:
+            return self._read_until_boundary(buffer)
+        self._at_headers = False
+        buffer.reserve(content_length)
+        view = memoryview(buffer.data)
+        received = 0
+        while received < content_length:
+            n = stream.readinto(view[received:content_length])
+            if not n:
+                return False
+            received += n
+        buffer.length = content_length
+        return True
+
+    def _read_until_boundary(self, buffer):
+        """沒有 Content-Length 的串流：讀到下一個邊界行為止"""
+        marker = b"--" + (self._boundary or "").lstrip("-").encode()
+        data = bytearray()
+        while True:
+            line = self._response.readline()
+            if not line:
+                return False
+            if line.startswith(marker):
+                break
+            data += line
+        # 去掉邊界前的換行
+        if data.endswith(b"\r\n"):
+            del data[-2:]
+        buffer.reserve(len(data))
+        buffer.data[:len(data)] = data
+        buffer.length = len(data)
+        self._at_headers = True
+        return True
+
+    def _read_loop(self):
+        while self._running:
+            try:
+                ok = self._read_part(self._write)
+            except (OSError, ValueError) as e:
+                logger.error(f"讀取 MJPEG 串流失敗: {e}")
+                ok = False
+            receive_time = time.time()
+            with self._cond:
+                if not ok:
+                    if self._running:
+                        logger.error("MJPEG 串流已結束")
+                    self._running = False
+                    self._cond.notify_all()
+                    break
+                # 上一幀還沒被取走就被覆蓋，視為丟棄（沒有解碼）
+                if self._seq > self._consumed_seq:
+                    self.dropped_frames += 1
+                self._write, self._ready = self._ready, self._write
+                self._ready_time = receive_time
+                self._seq += 1
+                self.captured_frames += 1
+                self._cond.notify_all()
+
+    def _decode_frame(self, buffer):
+        if self.source_size is None:
+            self.source_size = jpeg_size(buffer.data, buffer.length)
+        scale = self.scale if self.scale is not None else decode_scale(self.source_size, self.target_size)
+        frame = cv2.imdecode(buffer.view(), REDUCED_DECODE_FLAGS[scale])
+        if frame is None:
+            self.decode_errors += 1
+            return None
+        self.decoded_frames += 1
+        self.frame_size = (frame.shape[1], frame.shape[0])
+        return frame
+
+    def read_latest(self, timeout=1.0):
+        """等待並解碼比上次更新的畫面
+
+        Returns:
+            tuple: (frame, seq, capture_time)，串流結束、逾時或無法解碼時 frame 為 None
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > self._consumed_seq or not self._running, timeout)
+            if self._seq <= self._consumed_seq:
+                return None, self._consumed_seq, self._ready_time
+            self._consumed_seq = self._seq
+            # 取走最新的緩衝區，解碼期間讀取執行緒只會寫入另外兩個
+            self._decode, self._ready = self._ready, self._decode
+            seq, capture_time = self._seq, self._ready_time
+        return self._decode_frame(self._decode), seq, capture_time
+
+    def read(self):
+        """與 cv2.VideoCapture.read() 相同的介面，回傳 (ret, frame)"""
+        while True:
+            frame, _, _ = self.read_latest()
+            if frame is not None:
+                return True, frame
+            if not self._running:
+                return False, None
+
+    def isOpened(self):
+        return self._running or self._seq > self._consumed_seq
+
+    def stop(self):
+        """停止讀取執行緒"""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._response is not None:
+            self._response.close()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def release(self):
+        self.stop()
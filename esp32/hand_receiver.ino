@@ -11,6 +11,8 @@ const char* password = "YOUR_WIFI_PASSWORD";
 const char* mqtt_broker = "YOUR_MQTT_BROKER_IP";
 const int mqtt_port = 1883;
 const char* mqtt_topic = "hand_tracking";
+const char* resync_topic = "hand_tracking/resync";  // 差量格式要求關鍵幀的主題
+const int HAND_ID = 0;  // 要跟隨的手編號（同時追蹤兩隻手時為 0 或 1）
 
 // 建立 WiFi 和 MQTT 客戶端
 WiFiClient espClient;
@@ -23,6 +25,9 @@ Servo middle;   // 中指
 Servo ring;     // 無名指
 Servo pinky;    // 小指
 
+// 依 finger_id 排列的伺服馬達（二進位格式使用）
+Servo* fingerServos[] = {&thumb, &index, &middle, &ring, &pinky};
+
 // 伺服馬達腳位
 const int THUMB_PIN = 2;   // GPIO2
 const int INDEX_PIN = 4;   // GPIO4
@@ -33,6 +38,30 @@ const int PINKY_PIN = 13;  // GPIO13
 // JSON 文件大小
 const int capacity = JSON_OBJECT_SIZE(50);
 
+// 二進位手部數據格式（與 hand_protocol.py 相同）
+const uint8_t HAND_MAGIC = 0xA5;
+const uint8_t HAND_VERSION = 1;
+const uint8_t HAND_FLAG_UINT8 = 0x01;
+const uint8_t HAND_FLAG_TRACE = 0x02;     // 附有延遲追蹤區塊（ESP32 不使用，只需略過）
+const unsigned int HAND_TRACE_SIZE = 12;
+const unsigned int HAND_HEADER_SIZE = 16;
+const int NUM_FINGERS = 5;
+const int VALUES_PER_FINGER = 4;  // MCP, PIP, DIP, 總計
+
+// 差量／關鍵幀格式（--payload-format delta）：關鍵幀包含全部手指，之間只送改變的手指
+const uint8_t DELTA_MAGIC = 0xA6;
+const uint8_t DELTA_VERSION = 1;
+const uint8_t DELTA_FLAG_KEYFRAME = 0x01;
+const uint8_t DELTA_FLAG_TRACE = 0x02;
+const unsigned int DELTA_HEADER_SIZE = 8;
+const unsigned int KEYFRAME_HEADER_SIZE = 9;  // 關鍵幀時間戳 float64 + 量化間隔 uint8（0.1 度）
+const unsigned int DELTA_TRACE_SIZE = 6;
+const unsigned long RESYNC_INTERVAL = 500;  // 要求關鍵幀的最短間隔（毫秒）
+float deltaStep = 0;          // 最近一個關鍵幀的量化間隔，0 表示尚未收到關鍵幀
+long lastDeltaSeq = -1;
+bool resyncNeeded = false;    // 在 loop() 中發送，callback 中發送會覆蓋 PubSubClient 的接收緩衝區
+unsigned long lastResyncRequest = 0;
+
 void setup() {
     // 初始化序列通訊
     Serial.begin(115200);
@@ -60,6 +89,14 @@ void loop() {
         reconnect();
     }
     client.loop();
+    
+    if (resyncNeeded && millis() - lastResyncRequest >= RESYNC_INTERVAL) {
+        char request[32];
+        snprintf(request, sizeof(request), "{\"hand_ids\":[%d]}", HAND_ID);
+        client.publish(resync_topic, request);
+        lastResyncRequest = millis();
+        resyncNeeded = false;
+    }
 }
 
 void setupWiFi() {
@@ -82,6 +119,16 @@ void setupWiFi() {
 }
 
 void callback(char* topic, byte* payload, unsigned int length) {
+    // 二進位格式以 magic byte 開頭，直接讀取角度，不需要解析 JSON
+    if (length > 0 && payload[0] == HAND_MAGIC) {
+        handleBinaryFrame(payload, length);
+        return;
+    }
+    if (length > 0 && payload[0] == DELTA_MAGIC) {
+        handleDeltaFrame(payload, length);
+        return;
+    }
+    
     // 建立 JSON 緩衝區
     StaticJsonDocument<capacity> doc;
     
@@ -99,14 +146,19 @@ void callback(char* topic, byte* payload, unsigned int length) {
         return;
     }
     
+    // 只跟隨指定編號的手（舊版數據沒有 hand_id，視為 0）
+    if ((doc["hand_id"] | 0) != HAND_ID) {
+        return;
+    }
+    
     // 處理手指數據
     JsonArray fingers = doc["fingers"];
     for (JsonObject finger : fingers) {
         const char* name = finger["name"];
         float total_angle = finger["total_angle"];
         
-        // 將角度轉換為伺服馬達角度（0-180）
-        int servo_angle = map(int(180 - (360-total_angle)), 0, 180, 0, 180);
+        // 將角度轉換為伺服馬達角度（0-180），0 度為伸直
+        int servo_angle = constrain(int(total_angle), 0, 180);
         
         // 控制對應的伺服馬達
         if (strcmp(name, "拇指") == 0) {
@@ -128,6 +180,90 @@ void callback(char* topic, byte* payload, unsigned int length) {
     }
 }
 
+void handleBinaryFrame(byte* payload, unsigned int length) {
+    if (length < HAND_HEADER_SIZE || payload[1] != HAND_VERSION) {
+        Serial.println("不支援的二進位數據版本");
+        return;
+    }
+    
+    bool compact = payload[2] & HAND_FLAG_UINT8;
+    unsigned int valueSize = compact ? 1 : sizeof(float);
+    unsigned int traceSize = (payload[2] & HAND_FLAG_TRACE) ? HAND_TRACE_SIZE : 0;
+    if (length != HAND_HEADER_SIZE + NUM_FINGERS * VALUES_PER_FINGER * valueSize + traceSize) {
+        Serial.println("二進位數據長度不正確");
+        return;
+    }
+    if (payload[3] != HAND_ID) {
+        return;
+    }
+    
+    for (int i = 0; i < NUM_FINGERS; i++) {
+        // 每根手指的第 4 個值為總計角度
+        unsigned int offset = HAND_HEADER_SIZE + (i * VALUES_PER_FINGER + 3) * valueSize;
+        float total_angle;
+        if (compact) {
+            total_angle = payload[offset];
+        } else {
+            // ESP32 與發送端同為 little-endian，可直接複製
+            memcpy(&total_angle, payload + offset, sizeof(float));
+        }
+        
+        int servo_angle = constrain(int(total_angle), 0, 180);  // 0 度為伸直，與 servo_control.py 相同
+        fingerServos[i]->write(servo_angle);
+    }
+}
+
+void handleDeltaFrame(byte* payload, unsigned int length) {
+    if (length < DELTA_HEADER_SIZE || (payload[1] >> 4) != DELTA_VERSION) {
+        Serial.println("不支援的差量數據版本");
+        return;
+    }
+    
+    // 序號所有手共用：不連續表示有訊息遺失，遺失的訊息可能包含這隻手的手指
+    uint16_t seq = payload[4] | (payload[5] << 8);
+    if (lastDeltaSeq >= 0 && uint16_t(seq - lastDeltaSeq) != 1) {
+        resyncNeeded = true;
+    }
+    lastDeltaSeq = seq;
+    if (payload[2] != HAND_ID) {
+        return;
+    }
+    
+    uint8_t flags = payload[1];
+    uint8_t mask = payload[3];
+    bool keyframe = flags & DELTA_FLAG_KEYFRAME;
+    if (!keyframe && deltaStep == 0) {
+        // 剛啟動，等待關鍵幀
+        resyncNeeded = true;
+        return;
+    }
+    
+    // 先確認長度再讀取關鍵幀標頭與角度，避免讀取超出 payload
+    unsigned int offset = DELTA_HEADER_SIZE + (keyframe ? KEYFRAME_HEADER_SIZE : 0);
+    unsigned int fingers = 0;
+    for (int i = 0; i < NUM_FINGERS; i++) {
+        if (mask & (1 << i)) fingers++;
+    }
+    unsigned int traceSize = (flags & DELTA_FLAG_TRACE) ? DELTA_TRACE_SIZE : 0;
+    if (length != offset + fingers * VALUES_PER_FINGER + traceSize) {
+        Serial.println("差量數據長度不正確");
+        return;
+    }
+    if (keyframe) {
+        deltaStep = payload[DELTA_HEADER_SIZE + 8] / 10.0;
+        resyncNeeded = false;
+    }
+    
+    // 只更新有改變的手指，其他伺服馬達維持目前位置
+    for (int i = 0; i < NUM_FINGERS; i++) {
+        if (!(mask & (1 << i))) continue;
+        float total_angle = payload[offset + 3] * deltaStep;
+        int servo_angle = constrain(int(total_angle), 0, 180);
+        fingerServos[i]->write(servo_angle);
+        offset += VALUES_PER_FINGER;
+    }
+}
+
 void reconnect() {
     while (!client.connected()) {
         Serial.print("嘗試 MQTT 連接...");
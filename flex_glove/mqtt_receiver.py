@@ -1,20 +1,18 @@
-import paho.mqtt.client as mqtt
+import asyncio
 import json
-import time
+import os
+import sys
+
+# async_mqtt.py 可放在本資料夾，或直接使用專案根目錄的版本
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from async_mqtt import AsyncMqttClient
 
 # MQTT設定
 MQTT_BROKER = "broker.emqx.io"
 MQTT_PORT = 1883
 MQTT_TOPIC = "flex_glove/data"
 
-# 當連接到MQTT broker時的回調函數
-def on_connect(client, userdata, flags, rc):
-    print("Connected to MQTT broker with result code: " + str(rc))
-    # 訂閱主題
-    client.subscribe(MQTT_TOPIC)
-    print(f"Subscribed to topic: {MQTT_TOPIC}")
-
-# 當收到訊息時的回調函數
+# 處理收到的訊息
 def on_message(client, userdata, msg):
     try:
         # 解析JSON數據
@@ -38,26 +36,25 @@ def on_message(client, userdata, msg):
     except Exception as e:
         print(f"Error: {e}")
 
-def main():
-    # 創建MQTT客戶端
-    client = mqtt.Client()
-    
-    # 設置回調函數
-    client.on_connect = on_connect
-    client.on_message = on_message
-    
-    try:
-        # 連接到MQTT broker
-        print(f"Connecting to MQTT broker at {MQTT_BROKER}...")
-        client.connect(MQTT_BROKER, MQTT_PORT, 60)
+async def receive():
+    # 連接到MQTT broker，斷線時自動重連並重新訂閱
+    print(f"Connecting to MQTT broker at {MQTT_BROKER}...")
+    async with AsyncMqttClient(MQTT_BROKER, MQTT_PORT) as client:
+        print("Connected to MQTT broker")
+        messages = client.messages()
+        await client.subscribe(MQTT_TOPIC)
+        print(f"Subscribed to topic: {MQTT_TOPIC}")
         
         # 開始接收訊息
         print("Starting message loop...")
-        client.loop_forever()
-        
+        async for msg in messages:
+            on_message(client.client, None, msg)
+
+def main():
+    try:
+        asyncio.run(receive())
     except KeyboardInterrupt:
         print("\nProgram terminated by user")
-        client.disconnect()
     except Exception as e:
         print(f"Error: {e}")
 
@@ -0,0 +1,167 @@
+import json
+import time
+
+AUTOSCALER_STATS_TOPIC = "hand_tracking/stats/autoscaler"
+
+def build_ladder(scales=(1.0,), complexities=(None,), redetect_intervals=(None,)):
+    """由各參數的允許值建立操作點階梯，第 0 階品質最高、最後一階最省運算
+
+    每一階只調整一個參數，依序輪流：全畫面偵測間隔、輸入縮放、模型複雜度，
+    讓品質以最小的步伐下降。各參數的允許值需由品質高到低排列。
+
+    Returns:
+        list[dict]: 每一階的 {"scale", "model_complexity", "redetect_interval"}
+    """
+    knobs = [("redetect_interval", list(redetect_intervals)), ("scale", list(scales)),
+             ("model_complexity", list(complexities))]
+    indices = {name: 0 for name, _ in knobs}
+    ladder = [{name: values[0] for name, values in knobs}]
+    while True:
+        stepped = False
+        for name, values in knobs:
+            if indices[name] + 1 < len(values):
+                indices[name] += 1
+                ladder.append({knob: knob_values[indices[knob]] for knob, knob_values in knobs})
+                stepped = True
+        if not stepped:
+            return ladder
+
+class FpsAutoscaler:
+    """依推論延遲調整輸入縮放、模型複雜度與全畫面偵測間隔，維持目標推論頻率
+
+    每次推論以 record() 記錄延遲。每隔 window 秒以平均延遲估計可持續的推論頻率
+    （1 / 平均延遲）：低於 target_fps 時降一階，高於 target_fps / headroom 時
+    升一階（品質較高）。調整後等待 cooldown 秒再判斷，讓模型重新載入與 ROI
+    追蹤穩定下來，避免在兩階之間來回切換。
+
+    推論頻率本身會被 AdaptiveScheduler 在手部靜止時刻意降低，因此以延遲而不是
+    實際推論次數判斷；實際頻率只記錄在統計資訊中。
+
+    Args:
+        target_fps: 目標推論頻率（Hz）
+        ladder: build_ladder() 建立的操作點階梯
+        window: 每次判斷使用的時間範圍（秒）
+        cooldown: 調整後至少等待的秒數
+        headroom: 升階的條件，可持續頻率需高於 target_fps / headroom
+        min_samples: 每次判斷至少需要的推論次數
+        publish_interval: 發送統計數據的間隔（秒）
+    """
+
+    def __init__(self, target_fps=25.0, ladder=None, window=2.0, cooldown=3.0, headroom=0.7,
+                 min_samples=10, publish_interval=10.0):
+        self.target_fps = target_fps
+        self.ladder = ladder or build_ladder()
+        self.window = window
+        self.cooldown = cooldown
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.publish_interval = publish_interval
+
+        self.level = 0
+        self._window_start = None
+        self._latency_sum = 0.0
+        self._samples = 0
+        self._last_change = None
+        self._last_publish = None
+        self._changed = True  # 有尚未發送的調整
+
+        # 最近一次判斷的量測結果
+        self.latency_ms = None
+        self.sustainable_fps = None
+        self.achieved_fps = None
+        self.changes = 0
+
+    @property
+    def point(self):
+        """目前的操作點"""
+        return self.ladder[self.level]
+
+    def record(self, latency, now=None):
+        """記錄一次推論延遲（秒），操作點改變時回傳新的操作點，否則回傳 None"""
+        now = time.time() if now is None else now
+        if self._window_start is None:
+            self._window_start = now
+            self._last_change = now
+        self._latency_sum += latency
+        self._samples += 1
+
+        elapsed = now - self._window_start
+        if elapsed < self.window or self._samples < self.min_samples:
+            return None
+
+        self.latency_ms = self._latency_sum / self._samples * 1000
+        self.sustainable_fps = 1000 / self.latency_ms if self.latency_ms > 0 else float("inf")
+        self.achieved_fps = self._samples / elapsed
+        self._window_start = now
+        self._latency_sum = 0.0
+        self._samples = 0
+        if now - self._last_change < self.cooldown:
+            return None
+
+        level = self.level
+        if self.sustainable_fps < self.target_fps and level + 1 < len(self.ladder):
+            level += 1
+        elif self.sustainable_fps * self.headroom > self.target_fps and level > 0:
+            level -= 1
+        if level == self.level:
+            return None
+        self.level = level
+        self._last_change = now
+        self._changed = True
+        self.changes += 1
+        return self.point
+
+    def snapshot(self):
+        return {
+            "timestamp": time.time(),
+            "target_fps": self.target_fps,
+            "level": self.level,
+            "levels": len(self.ladder),
+            "operating_point": dict(self.point),
+            "latency_ms": round(self.latency_ms, 2) if self.latency_ms is not None else None,
+            "sustainable_fps": round(self.sustainable_fps, 1) if self.sustainable_fps is not None else None,
+            "achieved_fps": round(self.achieved_fps, 1) if self.achieved_fps is not None else None,
+            "changes": self.changes,
+        }
+
+    def maybe_publish(self, publisher, topic=AUTOSCALER_STATS_TOPIC):
+        """操作點改變或到了發送間隔時把目前狀態發送到 topic，回傳是否有發送
+
+        Args:
+            publisher: Mqtt.MqttPublisher
+        """
+        now = time.time()
+        if not self._changed and self._last_publish is not None and now - self._last_publish < self.publish_interval:
+            return False
+        self._changed = False
+        self._last_publish = now
+        publisher.publish(json.dumps(self.snapshot()), topic=topic)
+        return True
+
+class ReloadableHands:
+    """可在執行中切換 model_complexity 的 MediaPipe Hands，介面與 Hands 相同
+
+    Args:
+        factory: 以 model_complexity 建立（並預熱）Hands 的函數
+        model_complexity: 初始的模型複雜度
+    """
+
+    def __init__(self, factory, model_complexity=1):
+        self.factory = factory
+        self.model_complexity = model_complexity
+        self.hands = factory(model_complexity)
+
+    def process(self, frame_rgb):
+        return self.hands.process(frame_rgb)
+
+    def set_model_complexity(self, model_complexity):
+        """重新載入模型（在推論執行緒呼叫，載入期間推論暫停）"""
+        if model_complexity is None or model_complexity == self.model_complexity:
+            return
+        hands = self.factory(model_complexity)
+        self.hands, previous = hands, self.hands
+        self.model_complexity = model_complexity
+        previous.close()
+
+    def close(self):
+        self.hands.close()
@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from async_mqtt import AsyncMqttClient
+from hand_protocol import FINGER_NAMES, DeltaDecoder
+from latency_stats import RollingHistogram
+from Mqtt import broker_address, port, topic_hand
+
+# 感測融合：同時訂閱攝影機的手部數據與彎曲感測手套，兩個來源各自保存在固定長度的
+# 環形緩衝區，以固定頻率在同一個時間點取樣、逐根手指加權融合後發送單一數據流。
+# 攝影機數據過期（手離開畫面、遮擋）時權重降低，改由手套數據補上。
+
+GLOVE_TOPIC = "flex_glove/data"
+FUSED_TOPIC = f"{topic_hand}/fused"
+FUSION_STATS_TOPIC = f"{topic_hand}/stats/fusion"
+GLOVE_KEYS = ("thumb", "index", "middle", "ring", "pinky")  # 手套 JSON 的鍵值，順序與 FINGER_NAMES 相同
+
+FUSION_RATE = 30.0  # 融合輸出頻率（Hz）
+ALIGNMENT_DELAY = 0.05  # 取樣時間點落後現在的秒數，讓兩個來源都有前後兩筆數據可以內插
+CAMERA_FRESH = 1.0  # 攝影機數據在此秒數內視為完全可信（發送端靜止時每秒至少送一次）
+CAMERA_TIMEOUT = 1.5  # 攝影機數據超過此秒數後權重為 0
+GLOVE_TIMEOUT = 0.5  # 手套數據超過此秒數後不使用
+BUFFER_SIZE = 64  # 每個來源保存的數據筆數
+
+def camera_bend(fingers):
+    """把攝影機的各手指總計角度轉換為彎曲度（0 伸直 ~ 100 完全彎曲），與手套數值方向相同"""
+    totals = np.array([finger["total_angle"] for finger in fingers], dtype=np.float64)
+    return np.clip(totals / 180 * 100, 0, 100)
+
+def bend_to_total(bend):
+    """camera_bend 的反函數，讓融合結果可以直接給使用 total_angle 的接收端"""
+    return np.asarray(bend) * 1.8
+
+class SampleRing:
+    """固定長度的時間序列環形緩衝區，寫入 O(1)、記憶體用量固定
+
+    Args:
+        capacity: 保存的數據筆數
+        width: 每筆數據的數值個數
+    """
+
+    def __init__(self, capacity=BUFFER_SIZE, width=5):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, width), dtype=np.float64)
+        self.count = 0
+        self._next = 0
+
+    def append(self, t, values):
+        # 數據晚到（時間早於最新一筆）時丟棄，保持時間遞增
+        if self.count and t < self.times[self._next - 1]:
+            return False
+        self.times[self._next] = t
+        self.values[self._next] = values
+        self._next = (self._next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return True
+
+    @property
+    def latest_time(self):
+        return self.times[self._next - 1] if self.count else None
+
+    def sample(self, t):
+        """時間 t 的數值與所用數據的時間
+
+        t 在兩筆數據之間時線性內插，所用時間為 t；t 晚於最新一筆時維持最新一筆，
+        早於最舊一筆時使用最舊一筆。沒有數據時回傳 (None, None)。
+        """
+        if not self.count:
+            return None, None
+        start = (self._next - self.count) % self.capacity
+        order = (start + np.arange(self.count)) % self.capacity
+        times = self.times[order]
+        index = int(np.searchsorted(times, t, side="right"))
+        if index >= self.count:
+            return self.values[order[-1]].copy(), times[-1]
+        if index == 0:
+            return self.values[order[0]].copy(), times[0]
+        t0, t1 = times[index - 1], times[index]
+        v0, v1 = self.values[order[index - 1]], self.values[order[index]]
+        alpha = (t - t0) / (t1 - t0) if t1 > t0 else 1.0
+        return v0 + (v1 - v0) * alpha, t
+
+class FusionHub:
+    """融合攝影機與彎曲感測手套的手指彎曲度
+
+    兩個來源都以接收時間（本機時鐘）排序，手套數據沒有時間戳，攝影機的發送端時鐘
+    也不一定同步。每個輸出週期在 now - delay 取樣兩個來源，攝影機的信心依數據的
+    新舊程度計算：CAMERA_FRESH 內為 1，到 CAMERA_TIMEOUT 線性降為 0；
+    融合值 = 信心 × 攝影機 + (1 - 信心) × 手套。手套數據過期時只使用攝影機，
+    兩者都沒有可用數據時不輸出。
+
+    Args:
+        hand_id: 與手套融合的攝影機手編號
+        rate: 輸出頻率（Hz）
+        delay: 取樣時間點落後的秒數
+        camera_fresh: 攝影機數據完全可信的秒數
+        camera_timeout: 攝影機數據權重降為 0 的秒數
+        glove_timeout: 手套數據不再使用的秒數
+        capacity: 每個來源的環形緩衝區長度
+    """
+
+    def __init__(self, hand_id=0, rate=FUSION_RATE, delay=ALIGNMENT_DELAY, camera_fresh=CAMERA_FRESH,
+                 camera_timeout=CAMERA_TIMEOUT, glove_timeout=GLOVE_TIMEOUT, capacity=BUFFER_SIZE):
+        self.hand_id = hand_id
+        self.rate = rate
+        self.delay = delay
+        self.camera_fresh = camera_fresh
+        self.camera_timeout = camera_timeout
+        self.glove_timeout = glove_timeout
+        self.camera = SampleRing(capacity)
+        self.glove = SampleRing(capacity)
+        self.seq = 0
+
+        # 對齊延遲：輸出時間與所用數據接收時間的差距（毫秒）
+        self.histograms = {
+            "camera": RollingHistogram(),
+            "glove": RollingHistogram(),
+            "skew": RollingHistogram(),  # 兩個來源所用數據的時間差
+        }
+        self.decoder = DeltaDecoder()  # 差量格式遺失訊息時等待下一個關鍵幀
+        self.received = {"camera": 0, "glove": 0}
+        self.invalid = 0
+        self.stale = 0  # 差量格式遺失訊息後、收到關鍵幀前而略過的攝影機數據
+        self.late = 0
+        self.published = 0
+
+    # ========== 接收 ========== #
+    def on_camera(self, payload, receive_time, topic=None):
+        """處理一筆攝影機數據；topic 為差量格式的來源，用於偵測遺失並要求關鍵幀"""
+        try:
+            data = self.decoder.decode_payload(payload, topic)
+            if data is None or data.get("hand_id", 0) != self.hand_id:
+                return
+            if data.get("stale"):
+                # 遺失訊息後未改變的手指可能是舊角度，等待關鍵幀
+                self.stale += 1
+                return
+            bend = camera_bend(data["fingers"])
+        except (ValueError, KeyError, TypeError):
+            self.invalid += 1
+            return
+        self.received["camera"] += 1
+        if not self.camera.append(receive_time, bend):
+            self.late += 1
+
+    def on_glove(self, payload, receive_time):
+        try:
+            data = json.loads(payload)
+            bend = np.clip([float(data[key]) for key in GLOVE_KEYS], 0, 100)
+        except (ValueError, KeyError, TypeError):
+            self.invalid += 1
+            return
+        self.received["glove"] += 1
+        if not self.glove.append(receive_time, bend):
+            self.late += 1
+
+    # ========== 融合 ========== #
+    def camera_confidence(self, age):
+        if age <= self.camera_fresh:
+            return 1.0
+        if age >= self.camera_timeout:
+            return 0.0
+        return 1.0 - (age - self.camera_fresh) / (self.camera_timeout - self.camera_fresh)
+
+    def fuse(self, now):
+        """計算時間 now 的融合結果，回傳要發送的 dict，沒有可用數據時回傳 None"""
+        t = now - self.delay
+        camera, camera_time = self.camera.sample(t)
+        glove, glove_time = self.glove.sample(t)
+
+        camera_weight = 0.0
+        if camera is not None:
+            camera_weight = self.camera_confidence(now - self.camera.latest_time)
+        use_glove = glove is not None and now - self.glove.latest_time <= self.glove_timeout
+        if camera_weight == 0.0 and not use_glove:
+            return None
+        if not use_glove:
+            camera_weight = 1.0
+
+        if camera_weight == 1.0:
+            bend = camera
+        elif camera_weight == 0.0:
+            bend = glove
+        else:
+            bend = camera_weight * camera + (1 - camera_weight) * glove
+
+        if camera is not None:
+            self.histograms["camera"].add((now - camera_time) * 1000, now)
+        if use_glove:
+            self.histograms["glove"].add((now - glove_time) * 1000, now)
+        if camera is not None and use_glove:
+            self.histograms["skew"].add(abs(camera_time - glove_time) * 1000, now)
+
+        self.seq += 1
+        totals = bend_to_total(bend)
+        return {
+            "timestamp": now,
+            "seq": self.seq,
+            "hand_id": self.hand_id,
+            "camera_weight": round(camera_weight, 3),
+            "fingers": [
+                {
+                    "finger_id": i,
+                    "name": FINGER_NAMES[i],
+                    "bend": round(float(bend[i]), 1),
+                    "total_angle": round(float(totals[i]), 1),
+                }
+                for i in range(len(FINGER_NAMES))
+            ],
+        }
+
+    def snapshot(self):
+        now = time.time()
+        return {
+            "timestamp": now,
+            "received": dict(self.received),
+            "invalid": self.invalid,
+            "stale": self.stale,
+            "late": self.late,
+            "published": self.published,
+            "alignment": {name: histogram.summary(now=now) for name, histogram in self.histograms.items()},
+        }
+
+    # ========== 執行 ========== #
+    async def _ingest(self, messages, handler):
+        async for message in messages:
+            handler(message.payload, time.time())
+
+    async def _ingest_camera(self, client, messages):
+        async for message in messages:
+            receive_time = time.time()
+            self.on_camera(message.payload, receive_time, message.topic)
+            # 差量格式遺失訊息、發送端重新啟動或尚未收到關鍵幀時要求發送端送出關鍵幀
+            for topic, request in self.decoder.resync_requests(receive_time):
+                await client.publish(topic, request)
+
+    async def _output_loop(self, client, topic):
+        interval = 1.0 / self.rate
+        next_time = time.perf_counter()
+        while True:
+            fused = self.fuse(time.time())
+            if fused is not None:
+                await client.publish(topic, json.dumps(fused, ensure_ascii=False))
+                self.published += 1
+            next_time += interval
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # 落後時不補發錯過的週期
+                next_time = time.perf_counter()
+
+    async def _stats_loop(self, client, topic, interval):
+        while True:
+            await asyncio.sleep(interval)
+            stats = self.snapshot()
+            await client.publish(topic, json.dumps(stats))
+            alignment = stats["alignment"]
+            print(f"📊 攝影機 {stats['received']['camera']} 筆，手套 {stats['received']['glove']} 筆，"
+                  f"輸出 {self.published} 筆，對齊延遲 p95 攝影機 {alignment['camera']['p95_ms']} ms / "
+                  f"手套 {alignment['glove']['p95_ms']} ms")
+
+    async def run(self, client, camera_topic=topic_hand, glove_topic=GLOVE_TOPIC, output_topic=FUSED_TOPIC,
+                  stats_topic=FUSION_STATS_TOPIC, stats_interval=10.0):
+        """在已連線的 AsyncMqttClient 上執行接收、融合輸出與統計發送"""
+        camera_messages = client.messages(camera_topic)
+        glove_messages = client.messages(glove_topic)
+        await client.subscribe(camera_topic)
+        await client.subscribe(glove_topic)
+        print(f"✅ 已訂閱主題: {camera_topic}, {glove_topic}")
+        print(f"✅ 以 {self.rate:g} Hz 發送融合數據到 {output_topic}")
+        await asyncio.gather(
+            self._ingest_camera(client, camera_messages),
+            self._ingest(glove_messages, self.on_glove),
+            self._output_loop(client, output_topic),
+            self._stats_loop(client, stats_topic, stats_interval),
+        )
+
+async def run_hub(args):
+    hub = FusionHub(args.hand_id, args.rate, args.delay, camera_timeout=args.camera_timeout,
+                    glove_timeout=args.glove_timeout)
+    print(f"🔄 正在連接到 MQTT broker ({args.broker}:{args.port})...")
+    async with AsyncMqttClient(args.broker, args.port) as client:
+        await hub.run(client, args.camera_topic, args.glove_topic, args.output_topic,
+                      stats_interval=args.stats_interval)
+
+def main():
+    parser = argparse.ArgumentParser(description="融合攝影機手部追蹤與彎曲感測手套的數據")
+    parser.add_argument("--broker", default=broker_address, help="MQTT 伺服器位址")
+    parser.add_argument("--port", type=int, default=port, help="MQTT 伺服器端口")
+    parser.add_argument("--camera-topic", default=topic_hand, help="攝影機手部數據主題")
+    parser.add_argument("--glove-topic", default=GLOVE_TOPIC, help="手套數據主題")
+    parser.add_argument("--output-topic", default=FUSED_TOPIC, help="融合數據發送主題")
+    parser.add_argument("--hand-id", type=int, default=0, help="與手套融合的攝影機手編號")
+    parser.add_argument("--rate", type=float, default=FUSION_RATE, help="輸出頻率（Hz）")
+    parser.add_argument("--delay", type=float, default=ALIGNMENT_DELAY, help="取樣時間點落後的秒數")
+    parser.add_argument("--camera-timeout", type=float, default=CAMERA_TIMEOUT, help="攝影機數據權重降為 0 的秒數")
+    parser.add_argument("--glove-timeout", type=float, default=GLOVE_TIMEOUT, help="手套數據不再使用的秒數")
+    parser.add_argument("--stats-interval", type=float, default=10.0, help="發送統計數據的間隔（秒）")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run_hub(args))
+    except KeyboardInterrupt:
+        print("\n🛑 程式結束")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from async_mqtt import AsyncMqttClient
+from hand_protocol import DeltaDecoder
+from Mqtt import broker_address, port, topic_hand
+
+# 手勢辨識：把每隻手的 15 個關節角度（5 根手指 × MCP/PIP/DIP）與手勢樣板比對，
+# 以遲滯避免在兩個手勢之間跳動，只在手勢改變（以及低頻率的 heartbeat）時發送事件。
+# 只需要手勢的接收端訂閱 GESTURE_TOPIC 即可，不必處理完整頻率的角度數據流。
+
+GESTURE_TOPIC = f"{topic_hand}/gesture"
+GESTURE_FIELDS = ("mcp", "pip", "dip")  # 比對使用的角度，total 由 pip + dip 決定不重複計入
+
+ENTER_DISTANCE = 25.0  # 與樣板的 RMS 角度差低於此值（度）才進入手勢
+EXIT_DISTANCE = 35.0  # 目前的手勢與樣板的差超過此值（度）才離開
+SWITCH_MARGIN = 5.0  # 其他手勢需比目前的手勢近此值（度）以上才切換
+HOLD_TIME = 0.15  # 新手勢需持續的秒數
+LOST_TIMEOUT = 1.0  # 手超過此秒數沒有數據時視為離開，發送手勢 None
+GESTURE_HEARTBEAT = 5.0  # 手勢沒有改變時，每隔此秒數重送一次目前的手勢
+
+# 內建樣板：每根手指 (MCP, PIP, DIP) 角度（度），0 為伸直
+_STRAIGHT = [5, 5, 5]
+_BENT = [70, 95, 55]
+_THUMB_OPEN = [20, 10, 5]
+_THUMB_FOLDED = [40, 40, 50]
+
+GESTURE_TEMPLATES = {
+    "open": [_THUMB_OPEN, _STRAIGHT, _STRAIGHT, _STRAIGHT, _STRAIGHT],
+    "fist": [_THUMB_FOLDED, _BENT, _BENT, _BENT, _BENT],
+    "point": [_THUMB_FOLDED, _STRAIGHT, _BENT, _BENT, _BENT],
+    "victory": [_THUMB_FOLDED, _STRAIGHT, _STRAIGHT, _BENT, _BENT],
+    "thumbs_up": [_THUMB_OPEN, _BENT, _BENT, _BENT, _BENT],
+    "rock": [_THUMB_FOLDED, _STRAIGHT, _BENT, _BENT, _STRAIGHT],
+    "ok": [[30, 30, 30], [50, 70, 50], _STRAIGHT, _STRAIGHT, _STRAIGHT],
+}
+
+GESTURE_LABELS = {
+    "open": "張開",
+    "fist": "握拳",
+    "point": "指",
+    "victory": "勝利",
+    "thumbs_up": "讚",
+    "rock": "搖滾",
+    "ok": "OK",
+}
+
+def angle_vector(angles):
+    """把單手的角度（例如 compute_finger_angles 回傳的一列）轉換為 15 維向量"""
+    if isinstance(angles, np.ndarray) and angles.dtype.names:
+        return np.stack([angles[field] for field in GESTURE_FIELDS], axis=-1).astype(np.float32).reshape(-1)
+    return np.array([[float(finger[field]) for field in GESTURE_FIELDS] for finger in angles],
+                    dtype=np.float32).reshape(-1)
+
+def payload_vector(data):
+    """把解碼後的手部數據轉換為 15 維向量"""
+    return np.array([[float(finger[f"{field}_angle"]) for field in GESTURE_FIELDS] for finger in data["fingers"]],
+                    dtype=np.float32).reshape(-1)
+
+def load_templates(path):
+    """讀取樣板檔，格式為 {手勢: [樣本, ...]}，每個樣本為 5 × 3 角度"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_templates(path, templates):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(templates, f, ensure_ascii=False, indent=2)
+
+class GestureIndex:
+    """預先計算的手勢樣板最近鄰索引
+
+    所有樣本排成 (N, 15) 矩陣並預先算好平方範數，查詢時一次矩陣乘法
+    即可得到所有手、所有樣本的距離：|x - t|² = |x|² - 2 x·t + |t|²。
+    同一手勢可有多個樣本（例如錄製的不同角度），手勢的距離取最近的樣本。
+    距離為 15 個角度的 RMS 差（度）。
+
+    Args:
+        templates: {手勢: 5 × 3 角度} 或 {手勢: [5 × 3 角度, ...]}
+    """
+
+    def __init__(self, templates=None):
+        templates = GESTURE_TEMPLATES if templates is None else templates
+        names, samples = [], []
+        for name, values in templates.items():
+            values = np.asarray(values, dtype=np.float32)
+            values = values.reshape(-1, len(GESTURE_FIELDS) * 5)
+            names.append(name)
+            samples.append(values)
+        if not names:
+            raise ValueError("沒有手勢樣板")
+        self.names = names
+        self.matrix = np.concatenate(samples)
+        self.norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        # 各手勢第一個樣本在矩陣中的位置，reduceat 以此取每個手勢的最小距離
+        self.offsets = np.cumsum([0] + [len(s) for s in samples[:-1]])
+        self.dims = self.matrix.shape[1]
+
+    def distances(self, vectors):
+        """回傳 (hands, gestures) 的 RMS 角度差（度）
+
+        Args:
+            vectors: (hands, 15) 或 (15,) 角度向量
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        squared = (np.einsum("ij,ij->i", vectors, vectors)[:, np.newaxis]
+                   - 2 * vectors @ self.matrix.T + self.norms)
+        nearest = np.minimum.reduceat(squared, self.offsets, axis=1)
+        return np.sqrt(np.maximum(nearest, 0) / self.dims)
+
+    def match(self, vector):
+        """回傳最接近的 (手勢, 距離)"""
+        distances = self.distances(vector)[0]
+        best = int(np.argmin(distances))
+        return self.names[best], float(distances[best])
+
+class GestureState:
+    """一隻手的手勢狀態（遲滯）
+
+    進入手勢需距離低於 enter_distance，離開需超過較大的 exit_distance，
+    其他手勢需比目前的手勢近 switch_margin 以上才切換，且新的結果需持續
+    hold_time 秒，避免手勢在邊界附近來回跳動。
+    """
+
+    def __init__(self, now):
+        self.gesture = None
+        self.distance = None
+        self.since = now  # 目前手勢開始的時間
+        self.last_seen = now
+        self.last_sent = None
+        self.handedness = None
+        self.candidate = None  # 等待持續 hold_time 的新結果
+        self.candidate_since = now
+
+class GestureEngine:
+    """辨識每隻手的手勢，手勢改變時產生事件
+
+    Args:
+        index: GestureIndex，None 表示使用內建樣板
+        enter_distance: 進入手勢的距離門檻（度）
+        exit_distance: 離開手勢的距離門檻（度）
+        switch_margin: 切換到其他手勢需要的距離差（度）
+        hold_time: 新手勢需持續的秒數
+        lost_timeout: 手沒有數據多久後視為離開（秒）
+        heartbeat: 手勢沒有改變時重送的間隔（秒），0 表示不重送
+    """
+
+    def __init__(self, index=None, enter_distance=ENTER_DISTANCE, exit_distance=EXIT_DISTANCE,
+                 switch_margin=SWITCH_MARGIN, hold_time=HOLD_TIME, lost_timeout=LOST_TIMEOUT,
+                 heartbeat=GESTURE_HEARTBEAT):
+        self.index = index if index is not None else GestureIndex()
+        self.enter_distance = enter_distance
+        self.exit_distance = exit_distance
+        self.switch_margin = switch_margin
+        self.hold_time = hold_time
+        self.lost_timeout = lost_timeout
+        self.heartbeat = heartbeat
+        self.states = {}  # hand_id -> GestureState
+
+        # 統計資訊
+        self.changes = 0
+
+    def _select(self, state, distances):
+        """套用遲滯，回傳這次的結果應為哪個手勢（None 表示沒有）"""
+        best = int(np.argmin(distances))
+        if state.gesture is not None:
+            current = self.index.names.index(state.gesture)
+            if (distances[current] <= self.exit_distance
+                    and distances[best] > distances[current] - self.switch_margin):
+                return current
+        return best if distances[best] <= self.enter_distance else None
+
+    def _event(self, hand_id, state, previous, now):
+        state.last_sent = now
+        return {
+            "timestamp": now,
+            "hand_id": hand_id,
+            "handedness": state.handedness,
+            "gesture": state.gesture,
+            "previous": previous,
+            "changed": state.gesture != previous,
+            "distance": round(state.distance, 1) if state.distance is not None else None,
+            "held": round(now - state.since, 2),
+        }
+
+    def update(self, hands, now):
+        """以這次推論的所有手更新手勢
+
+        Args:
+            hands: [(hand_id, angles, handedness), ...]，angles 為 5 根手指的角度
+            now: 畫面時間（秒）
+
+        Returns:
+            list[dict]: 需要發送的手勢事件
+        """
+        events = []
+        if hands:
+            # 所有手一次查詢
+            vectors = np.stack([angle_vector(angles) for _, angles, _ in hands])
+            all_distances = self.index.distances(vectors)
+        else:
+            all_distances = []
+        for (hand_id, _, handedness), distances in zip(hands, all_distances):
+            state = self.states.get(hand_id)
+            if state is None:
+                state = self.states[hand_id] = GestureState(now)
+            state.last_seen = now
+            state.handedness = handedness
+            selected = self._select(state, distances)
+            gesture = self.index.names[selected] if selected is not None else None
+            if gesture == state.gesture:
+                state.candidate = gesture
+                state.distance = float(distances[selected]) if selected is not None else None
+            else:
+                if gesture != state.candidate:
+                    state.candidate = gesture
+                    state.candidate_since = now
+                if now - state.candidate_since >= self.hold_time:
+                    previous = state.gesture
+                    state.gesture = gesture
+                    state.distance = float(distances[selected]) if selected is not None else None
+                    state.since = now
+                    self.changes += 1
+                    events.append(self._event(hand_id, state, previous, now))
+                    continue
+            if self.heartbeat and state.last_sent is not None and now - state.last_sent >= self.heartbeat:
+                events.append(self._event(hand_id, state, state.gesture, now))
+
+        # 離開畫面的手：有手勢時發送 None 後移除
+        for hand_id, state in list(self.states.items()):
+            if now - state.last_seen < self.lost_timeout:
+                continue
+            del self.states[hand_id]
+            if state.gesture is not None:
+                previous, state.gesture, state.distance = state.gesture, None, None
+                state.since = now
+                self.changes += 1
+                events.append(self._event(hand_id, state, previous, now))
+        return events
+
+# ========== 命令列工具 ========== #
+def format_event(event):
+    gesture = event["gesture"]
+    label = GESTURE_LABELS.get(gesture, gesture) if gesture is not None else "無"
+    if not event["changed"]:
+        return f"🔄 手 {event['hand_id']}: {label} (持續 {event['held']:.1f} 秒)"
+    return f"✋ 手 {event['hand_id']}: {label} (距離 {event['distance']}°)"
+
+async def watch_gestures(args):
+    """顯示手勢事件"""
+    async with AsyncMqttClient(args.broker, args.port) as client:
+        messages = client.messages(args.topic)
+        await client.subscribe(args.topic)
+        print(f"✅ 已訂閱主題: {args.topic}")
+        async for message in messages:
+            try:
+                print(format_event(json.loads(message.payload)))
+            except (ValueError, KeyError) as e:
+                print(f"❌ 無效的手勢事件: {e}")
+
+async def record_template(args):
+    """收集一段時間的手部數據，以各角度的中位數作為新樣本加入樣板檔"""
+    try:
+        templates = load_templates(args.library)
+    except FileNotFoundError:
+        templates = {name: [values] for name, values in GESTURE_TEMPLATES.items()}
+    samples = []
+    decoder = DeltaDecoder()
+    async with AsyncMqttClient(args.broker, args.port) as client:
+        messages = client.messages(topic_hand)
+        await client.subscribe(topic_hand)
+        print(f"🔄 請擺出手勢「{args.record}」，收集 {args.seconds:g} 秒...")
+        deadline = time.time() + args.seconds
+        while time.time() < deadline:
+            try:
+                message = await asyncio.wait_for(messages.__anext__(), deadline - time.time())
+            except asyncio.TimeoutError:
+                break
+            try:
+                data = decoder.decode_payload(message.payload, message.topic)
+            except ValueError:
+                continue
+            if data is not None and data.get("hand_id", 0) == args.hand_id:
+                samples.append(payload_vector(data))
+    if not samples:
+        print("❌ 沒有收到手部數據")
+        return
+    sample = np.median(samples, axis=0).reshape(5, len(GESTURE_FIELDS))
+    templates.setdefault(args.record, []).append(np.round(sample, 1).tolist())
+    save_templates(args.library, templates)
+    print(f"✅ 以 {len(samples)} 筆數據新增「{args.record}」樣本到 {args.library} "
+          f"(共 {len(templates[args.record])} 個樣本)")
+
+def main():
+    parser = argparse.ArgumentParser(description="顯示手勢事件或錄製手勢樣板")
+    parser.add_argument("--broker", default=broker_address, help="MQTT 伺服器位址")
+    parser.add_argument("--port", type=int, default=port, help="MQTT 伺服器端口")
+    parser.add_argument("--topic", default=GESTURE_TOPIC, help="手勢事件主題")
+    parser.add_argument("--record", metavar="NAME", help="錄製手勢樣本並加入樣板檔")
+    parser.add_argument("--library", default="gestures.json", help="樣板檔（hand_with_mqtt.py --gestures 使用）")
+    parser.add_argument("--seconds", type=float, default=3.0, help="錄製的秒數")
+    parser.add_argument("--hand-id", type=int, default=0, help="錄製的手編號")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(record_template(args) if args.record else watch_gestures(args))
+    except KeyboardInterrupt:
+        print("\n🛑 程式結束")
+
+if __name__ == "__main__":
+    main()
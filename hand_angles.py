@@ -0,0 +1,134 @@
+import numpy as np
+
+from hand_protocol import FINGER_NAMES, encode_hand_frame
+
+# 各手指對應的 MediaPipe 關鍵點編號 (MCP, PIP, DIP, TIP)
+FINGER_JOINTS = np.array([
+    [1, 2, 3, 4],     # 拇指
+    [5, 6, 7, 8],     # 食指
+    [9, 10, 11, 12],  # 中指
+    [13, 14, 15, 16], # 無名指
+    [17, 18, 19, 20]  # 小指
+])
+WRIST = 0
+NUM_LANDMARKS = 21
+
+# 每根手指一筆紀錄，角度以 float32 儲存
+ANGLE_DTYPE = np.dtype([
+    ("mcp", np.float32),
+    ("pip", np.float32),
+    ("dip", np.float32),
+    ("total", np.float32),
+])
+
+# 每個關節角度的三個點 (a, b, c)，形狀為 (5, 3, 3)：手指 × [MCP, PIP, DIP] × 三點
+_JOINT_TRIPLETS = np.stack([
+    np.stack([np.full(5, WRIST), FINGER_JOINTS[:, 0], FINGER_JOINTS[:, 1]], axis=1),
+    FINGER_JOINTS[:, 0:3],
+    FINGER_JOINTS[:, 1:4],
+], axis=1)
+
+def landmarks_to_array(multi_hand_landmarks):
+    """把 MediaPipe 的 multi_hand_landmarks 轉換為 (hands, 21, 3) 陣列
+
+    Args:
+        multi_hand_landmarks: hands.process() 回傳的 multi_hand_landmarks
+
+    Returns:
+        np.ndarray: float32 陣列，最後一維為 (x, y, z)
+    """
+    if not multi_hand_landmarks:
+        return np.empty((0, NUM_LANDMARKS, 3), dtype=np.float32)
+    return np.array(
+        [[(lm.x, lm.y, lm.z) for lm in hand.landmark] for hand in multi_hand_landmarks],
+        dtype=np.float32,
+    )
+
+def compute_finger_angles(points, image_size=None, use_z=False):
+    """一次計算所有手、所有手指的 MCP/PIP/DIP 角度
+
+    角度為相鄰兩段骨骼向量的夾角，
+    手指伸直時為 0 度。
+
+    Args:
+        points: (hands, 21, 3) 或 (21, 3) 的關鍵點陣列（MediaPipe 正規化座標）
+        image_size: (width, height)，提供時先換算成像素座標，避免長寬比造成角度誤差
+        use_z: 是否使用 z 座標計算 3D 角度
+
+    Returns:
+        np.ndarray: 形狀為 (hands, 5) 的 ANGLE_DTYPE 結構化陣列
+    """
+    points = np.asarray(points, dtype=np.float32)
+    if points.ndim == 2:
+        points = points[np.newaxis]
+
+    coords = points if use_z else points[..., :2]
+    if image_size is not None:
+        width, height = image_size
+        # MediaPipe 的 z 與 x 使用相同比例
+        scale = np.array([width, height, width][:coords.shape[-1]], dtype=np.float32)
+        coords = coords * scale
+
+    # (hands, 5, 3, 3, dims)：手 × 手指 × 關節 × 三點 × 座標
+    triplets = coords[:, _JOINT_TRIPLETS]
+    ba = triplets[:, :, :, 1] - triplets[:, :, :, 0]
+    bc = triplets[:, :, :, 2] - triplets[:, :, :, 1]
+
+    dot = np.einsum("...i,...i->...", ba, bc)
+    norms = np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)
+    cos_theta = np.divide(dot, norms, out=np.ones_like(dot), where=norms > 0)
+    joint_angles = np.degrees(np.arccos(np.clip(cos_theta, -1.0, 1.0)))
+
+    angles = np.empty(joint_angles.shape[:2], dtype=ANGLE_DTYPE)
+    angles["mcp"] = joint_angles[..., 0]
+    angles["pip"] = joint_angles[..., 1]
+    angles["dip"] = joint_angles[..., 2]
+    angles["total"] = np.minimum(angles["pip"] + angles["dip"], 180.0)
+    return angles
+
+def build_hand_payload(angles, timestamp):
+    """由單手的角度陣列 (5,) 建立 MQTT 發送用的字典"""
+    return {
+        "timestamp": timestamp,
+        "fingers": [
+            {
+                "finger_id": finger_id,
+                "name": FINGER_NAMES[finger_id],
+                "mcp_angle": float(finger["mcp"]),
+                "pip_angle": float(finger["pip"]),
+                "dip_angle": float(finger["dip"]),
+                "total_angle": float(finger["total"]),
+            }
+            for finger_id, finger in enumerate(angles)
+        ],
+    }
+
+def encode_hand_payload(payload_format, angles, seq, timestamp, hand_id=0, trace=None, delta_encoder=None,
+                        extra=None):
+    """依 MQTT 數據格式編碼單手的角度
+
+    Args:
+        payload_format: hand_protocol.PAYLOAD_FORMATS 之一
+        angles: 單手的角度陣列 (5,)
+        seq: 發送序號
+        timestamp: 時間戳
+        hand_id: 手的編號
+        trace: 各階段時間戳（TRACE_FIELDS），None 表示不附加
+        delta_encoder: payload_format 為 "delta" 時使用的 DeltaEncoder
+        extra: JSON 格式額外附加的欄位（例如 handedness），其他格式忽略
+
+    Returns:
+        dict | bytes: JSON 格式為字典，其他格式為 bytes
+    """
+    if payload_format == "json":
+        payload = build_hand_payload(angles, timestamp)
+        payload["seq"] = seq
+        payload["hand_id"] = hand_id
+        payload.update(extra or {})
+        if trace is not None:
+            payload["trace"] = trace
+        return payload
+    if payload_format == "delta":
+        return delta_encoder.encode(angles, seq, timestamp, hand_id=hand_id, trace=trace)
+    return encode_hand_frame(angles, seq, timestamp, hand_id=hand_id, compact=payload_format == "binary_u8",
+                             trace=trace)
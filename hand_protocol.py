@@ -0,0 +1,368 @@
+import json
+import struct
+import threading
+import time
+
+# 手指名稱，索引即為 finger_id
+FINGER_NAMES = ["拇指", "食指", "中指", "無名指", "小指"]
+ANGLE_FIELDS = ("mcp", "pip", "dip", "total")
+
+# ========== 二進位手部數據格式 ========== #
+# 標頭（little-endian，16 bytes）：
+#   magic     uint8   固定為 0xA5，用來和 JSON 區分
+#   version   uint8   格式版本
+#   flags     uint8   bit0 = 角度以 uint8 儲存（1 度解析度）
+#                     bit1 = 內容後附有延遲追蹤區塊
+#   hand_id   uint8   手的編號
+#   seq       uint32  序號
+#   timestamp float64 時間戳（秒）
+# 內容：5 根手指 × (MCP, PIP, DIP, 總計) 角度，float32 或 uint8
+# 延遲追蹤區塊（選用）：擷取、推論開始、推論結束時間，
+#   以「比 timestamp 早幾毫秒」的 float32 儲存
+MAGIC = 0xA5
+VERSION = 1
+FLAG_UINT8 = 0x01
+FLAG_TRACE = 0x02
+HEADER = struct.Struct("<BBBBId")
+NUM_VALUES = len(FINGER_NAMES) * len(ANGLE_FIELDS)
+BODY_FLOAT32 = struct.Struct(f"<{NUM_VALUES}f")
+BODY_UINT8 = struct.Struct(f"<{NUM_VALUES}B")
+TRACE_FIELDS = ("capture_time", "inference_start", "inference_end")
+TRACE = struct.Struct(f"<{len(TRACE_FIELDS)}f")
+
+# 可選用的發送格式
+PAYLOAD_FORMATS = ("json", "binary", "binary_u8", "delta")
+
+def encode_hand_frame(angles, seq, timestamp, hand_id=0, compact=False, trace=None):
+    """把單手的角度編碼為二進位格式
+
+    Args:
+        angles: 5 根手指的角度，每根手指可用 "mcp"/"pip"/"dip"/"total" 取值
+            （例如 hand_angles.compute_finger_angles 回傳的一列）
+        seq: 序號（uint32，超過時取餘數）
+        timestamp: 時間戳（秒）
+        hand_id: 手的編號
+        compact: True 時角度以 uint8 儲存（四捨五入到 1 度）
+        trace: 延遲追蹤用的時間戳字典（鍵為 TRACE_FIELDS），None 表示不附加
+
+    Returns:
+        bytes: 編碼後的數據（float32 為 96 bytes，uint8 為 36 bytes，附加追蹤區塊再加 12 bytes）
+    """
+    values = [float(finger[field]) for finger in angles for field in ANGLE_FIELDS]
+    flags = 0
+    if compact:
+        flags |= FLAG_UINT8
+        body = BODY_UINT8.pack(*(min(max(int(round(v)), 0), 255) for v in values))
+    else:
+        body = BODY_FLOAT32.pack(*values)
+    if trace is not None:
+        flags |= FLAG_TRACE
+        body += TRACE.pack(*((timestamp - trace[field]) * 1000 for field in TRACE_FIELDS))
+    return HEADER.pack(MAGIC, VERSION, flags, hand_id, seq & 0xFFFFFFFF, timestamp) + body
+
+def decode_hand_frame(data):
+    """解碼二進位格式，回傳與 JSON 格式相同結構的字典
+
+    Raises:
+        ValueError: 數據長度、標記或版本不正確
+    """
+    if len(data) < HEADER.size:
+        raise ValueError(f"數據長度不足: {len(data)} bytes")
+    magic, version, flags, hand_id, seq, timestamp = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"不是手部二進位數據 (magic={magic:#x})")
+    if version != VERSION:
+        raise ValueError(f"不支援的格式版本: {version}")
+
+    body = BODY_UINT8 if flags & FLAG_UINT8 else BODY_FLOAT32
+    trace_size = TRACE.size if flags & FLAG_TRACE else 0
+    if len(data) != HEADER.size + body.size + trace_size:
+        raise ValueError(f"數據長度不正確: {len(data)} bytes")
+    values = body.unpack_from(data, HEADER.size)
+
+    fingers = []
+    for finger_id, name in enumerate(FINGER_NAMES):
+        offset = finger_id * len(ANGLE_FIELDS)
+        finger = {"finger_id": finger_id, "name": name}
+        for i, field in enumerate(ANGLE_FIELDS):
+            finger[f"{field}_angle"] = float(values[offset + i])
+        fingers.append(finger)
+
+    frame = {
+        "version": version,
+        "seq": seq,
+        "hand_id": hand_id,
+        "timestamp": timestamp,
+        "fingers": fingers,
+    }
+    if trace_size:
+        offsets = TRACE.unpack_from(data, HEADER.size + body.size)
+        frame["trace"] = {field: timestamp - offset / 1000 for field, offset in zip(TRACE_FIELDS, offsets)}
+    return frame
+
+# ========== 差量／關鍵幀格式 ========== #
+# 每隔 keyframe_interval 秒（或接收端要求時）發送一次完整的關鍵幀，之間只發送
+# 角度變化超過量化間隔的手指。角度以 uint8 儲存（單位為量化間隔）。
+# 標頭（little-endian，8 bytes）：
+#   magic     uint8   固定為 0xA6
+#   flags     uint8   bit0 = 關鍵幀，bit1 = 內容後附有延遲追蹤區塊，bit4-7 = 格式版本
+#   hand_id   uint8   手的編號
+#   mask      uint8   bit i = 內容包含 finger_id i 的角度（關鍵幀為 0x1F）
+#   seq       uint16  序號（所有手共用，超過時取餘數），接收端以此偵測遺失
+#   offset    uint16  時間戳比關鍵幀晚幾毫秒
+# 關鍵幀另附：關鍵幀時間戳 float64、量化間隔 uint8（0.1 度）
+# 內容：mask 中每根手指 4 個 uint8 角度 (MCP, PIP, DIP, 總計)
+# 延遲追蹤區塊（選用）：擷取、推論開始、推論結束時間比時間戳早幾毫秒，uint16
+DELTA_MAGIC = 0xA6
+DELTA_VERSION = 1
+FLAG_KEYFRAME = 0x01
+DELTA_HEADER = struct.Struct("<BBBBHH")
+KEYFRAME_HEADER = struct.Struct("<dB")
+DELTA_TRACE = struct.Struct(f"<{len(TRACE_FIELDS)}H")
+ALL_FINGERS = (1 << len(FINGER_NAMES)) - 1
+RESYNC_SUBTOPIC = "resync"  # 接收端要求關鍵幀的子主題，例如 hand_tracking/resync
+REORDER_WINDOW = 64  # 序號倒退不超過此值視為亂序，超過時視為發送端重新啟動
+
+class DeltaEncoder:
+    """差量／關鍵幀格式的編碼器，保存每隻手接收端目前持有的角度
+
+    每根手指只在任一角度與接收端持有的值相差 threshold 以上時發送，
+    接收端看到的角度與實際值的差小於 threshold（至少半個量化間隔）。
+
+    Args:
+        step: 量化間隔（度），0.1 ~ 25.5
+        threshold: 發送門檻（度），預設等於 step
+        keyframe_interval: 每隻手發送關鍵幀的間隔（秒）
+    """
+
+    def __init__(self, step=1.0, threshold=None, keyframe_interval=1.0):
+        self.step_code = min(max(int(round(step * 10)), 1), 255)
+        self.step = self.step_code / 10
+        self.threshold = self.step if threshold is None else threshold
+        self.keyframe_interval = keyframe_interval
+        self._hands = {}  # hand_id -> [關鍵幀時間戳, 接收端持有的量化角度 list]
+        self._requested = set()  # 接收端要求關鍵幀的手
+        self._lock = threading.Lock()  # 保護 _hands 與 _requested
+
+        # 統計資訊
+        self.keyframes = 0
+        self.deltas = 0
+        self.bytes = 0
+
+    def request_keyframe(self, hand_ids=None):
+        """下一次發送這些手時改送關鍵幀（可在其他執行緒呼叫），None 表示全部"""
+        with self._lock:
+            self._requested.update(list(self._hands) if hand_ids is None else hand_ids)
+
+    def encode(self, angles, seq, timestamp, hand_id=0, trace=None):
+        """把單手的角度編碼為關鍵幀或差量幀，參數與 encode_hand_frame 相同
+
+        Returns:
+            bytes: 關鍵幀 37 bytes，差量幀 8 + 4 × 改變的手指數 bytes，附加追蹤區塊再加 6 bytes
+        """
+        values = [float(finger[field]) for finger in angles for field in ANGLE_FIELDS]
+        quantized = [min(max(int(round(value / self.step)), 0), 255) for value in values]
+        # request_keyframe 可能在 MQTT 網路執行緒上同時修改 _requested
+        with self._lock:
+            state = self._hands.get(hand_id)
+            # 時間戳以 uint16 毫秒記錄與關鍵幀的差，關鍵幀間隔不可超過 65 秒
+            keyframe = (state is None or hand_id in self._requested
+                        or timestamp - state[0] >= min(self.keyframe_interval, 65.0))
+            if keyframe:
+                self._requested.discard(hand_id)
+                state = self._hands[hand_id] = [timestamp, quantized]
+                mask = ALL_FINGERS
+                flags = FLAG_KEYFRAME
+                body = KEYFRAME_HEADER.pack(timestamp, self.step_code) + bytes(quantized)
+                self.keyframes += 1
+            else:
+                held = state[1]
+                mask = 0
+                body = b""
+                width = len(ANGLE_FIELDS)
+                for finger_id in range(len(FINGER_NAMES)):
+                    finger = slice(finger_id * width, (finger_id + 1) * width)
+                    if any(abs(value - code * self.step) >= self.threshold
+                           for value, code in zip(values[finger], held[finger])):
+                        mask |= 1 << finger_id
+                        held[finger] = quantized[finger]
+                        body += bytes(quantized[finger])
+                flags = 0
+                self.deltas += 1
+        if trace is not None:
+            flags |= FLAG_TRACE
+            body += DELTA_TRACE.pack(*(min(max(int(round((timestamp - trace[field]) * 1000)), 0), 0xFFFF)
+                                       for field in TRACE_FIELDS))
+        offset = int(round((timestamp - state[0]) * 1000))
+        frame = DELTA_HEADER.pack(DELTA_MAGIC, flags | DELTA_VERSION << 4, hand_id, mask, seq & 0xFFFF,
+                                  min(max(offset, 0), 0xFFFF)) + body
+        self.bytes += len(frame)
+        return frame
+
+class DeltaDecoder:
+    """差量／關鍵幀格式的解碼器，其他格式交給 decode_payload
+
+    每個來源（MQTT 主題）的每隻手各自保存目前的角度，差量幀只更新其中
+    改變的手指，輸出與 JSON 格式相同結構的完整數據。序號不連續時表示有
+    訊息遺失，該來源所有手的數據標記為 stale 並要求關鍵幀；尚未收到關鍵幀
+    的手無法解碼，回傳 None。序號小幅倒退的差量幀視為亂序而略過，倒退超過
+    REORDER_WINDOW 時視為發送端重新啟動，捨棄該來源的狀態並要求關鍵幀；
+    關鍵幀一律接受並以其序號重新開始。
+
+    Args:
+        resync_interval: 同一來源要求關鍵幀的最短間隔（秒）
+    """
+
+    def __init__(self, resync_interval=0.5):
+        self.resync_interval = resync_interval
+        self._hands = {}  # (來源, hand_id) -> 手的狀態
+        self._last_seq = {}  # 來源 -> 完整序號
+        self._pending = {}  # 來源 -> 需要關鍵幀的 hand_id 集合，包含 None 表示全部
+        self._last_request = {}
+
+        # 統計資訊
+        self.keyframes = 0
+        self.deltas = 0
+        self.gaps = 0  # 遺失的訊息數
+        self.waiting = 0  # 等待關鍵幀而無法解碼的訊息數
+        self.reordered = 0  # 比已收到的訊息舊而略過的訊息數
+        self.restarts = 0  # 偵測到發送端重新啟動（序號大幅倒退）的次數
+
+    def _request(self, source, hand_id):
+        self._pending.setdefault(source, set()).add(hand_id)
+
+    def decode_payload(self, payload, source=None):
+        """解碼 MQTT 收到的手部數據（任何格式）
+
+        Args:
+            payload: MQTT 訊息內容
+            source: 數據來源（通常為 MQTT 主題），不同來源的手各自保存狀態
+
+        Returns:
+            dict | None: 解碼後的數據，差量幀無法解碼（等待關鍵幀、過時）時為 None
+
+        Raises:
+            ValueError: 數據格式不正確
+        """
+        if payload[:1] != bytes([DELTA_MAGIC]):
+            return decode_payload(payload)
+        return self.decode_delta_frame(payload, source)
+
+    def decode_delta_frame(self, data, source=None):
+        if len(data) < DELTA_HEADER.size:
+            raise ValueError(f"數據長度不足: {len(data)} bytes")
+        magic, flags, hand_id, mask, seq, offset = DELTA_HEADER.unpack_from(data)
+        if flags >> 4 != DELTA_VERSION:
+            raise ValueError(f"不支援的格式版本: {flags >> 4}")
+        keyframe = bool(flags & FLAG_KEYFRAME)
+        fingers = [finger_id for finger_id in range(len(FINGER_NAMES)) if mask >> finger_id & 1]
+        position = DELTA_HEADER.size + (KEYFRAME_HEADER.size if keyframe else 0)
+        trace_size = DELTA_TRACE.size if flags & FLAG_TRACE else 0
+        if len(data) != position + len(fingers) * len(ANGLE_FIELDS) + trace_size:
+            raise ValueError(f"數據長度不正確: {len(data)} bytes")
+
+        # 16 位元序號展開為連續的序號，並偵測遺失、亂序與發送端重新啟動
+        last = self._last_seq.get(source)
+        if last is not None:
+            diff = (seq - last) & 0xFFFF
+            if diff == 0 or diff >= 0x8000:
+                if (last - seq) & 0xFFFF > REORDER_WINDOW:
+                    # 發送端重新啟動（序號從 0 開始）：舊的基準時間與角度都不再有效
+                    self.restarts += 1
+                    for hand_key in [hand_key for hand_key in self._hands if hand_key[0] == source]:
+                        del self._hands[hand_key]
+                    self._request(source, None)
+                elif not keyframe:
+                    self.reordered += 1
+                    return None
+                # 關鍵幀包含完整角度，一律接受並從它的序號重新計算
+            else:
+                if diff > 1:
+                    self.gaps += diff - 1
+                    for (hand_source, _), state in self._hands.items():
+                        if hand_source == source:
+                            state["stale"] = True
+                    self._request(source, None)
+                seq = last + diff
+        self._last_seq[source] = seq
+
+        key = (source, hand_id)
+        state = self._hands.get(key)
+        if keyframe:
+            base, step_code = KEYFRAME_HEADER.unpack_from(data, DELTA_HEADER.size)
+            state = self._hands[key] = {"base": base, "step": step_code / 10,
+                                        "values": [0.0] * NUM_VALUES, "stale": False}
+            self.keyframes += 1
+        elif state is None:
+            self.waiting += 1
+            self._request(source, hand_id)
+            return None
+        else:
+            self.deltas += 1
+
+        values = state["values"]
+        width = len(ANGLE_FIELDS)
+        for i, finger_id in enumerate(fingers):
+            codes = data[position + i * width:position + (i + 1) * width]
+            values[finger_id * width:(finger_id + 1) * width] = [code * state["step"] for code in codes]
+
+        timestamp = state["base"] + offset / 1000
+        frame = {
+            "version": DELTA_VERSION,
+            "seq": seq,
+            "hand_id": hand_id,
+            "timestamp": timestamp,
+            "fingers": [
+                dict({"finger_id": finger_id, "name": name},
+                     **{f"{field}_angle": values[finger_id * width + i] for i, field in enumerate(ANGLE_FIELDS)})
+                for finger_id, name in enumerate(FINGER_NAMES)
+            ],
+            "keyframe": keyframe,
+            "changed_fingers": fingers,
+            "stale": state["stale"],
+        }
+        if trace_size:
+            offsets = DELTA_TRACE.unpack_from(data, len(data) - trace_size)
+            frame["trace"] = {field: timestamp - offset / 1000 for field, offset in zip(TRACE_FIELDS, offsets)}
+        return frame
+
+    def resync_requests(self, now=None):
+        """回傳需要發送的關鍵幀請求 [(主題, payload)]，同一來源每 resync_interval 秒最多一次
+
+        請求發送到 <來源>/resync，內容為 {"hand_ids": [...]}，null 表示全部的手。
+        """
+        now = time.time() if now is None else now
+        requests = []
+        for source, hand_ids in list(self._pending.items()):
+            if source is None or now - self._last_request.get(source, 0.0) < self.resync_interval:
+                continue
+            del self._pending[source]
+            self._last_request[source] = now
+            payload = {"hand_ids": None if None in hand_ids else sorted(hand_ids)}
+            requests.append((f"{source}/{RESYNC_SUBTOPIC}", json.dumps(payload)))
+        return requests
+
+def parse_resync_request(payload):
+    """解析關鍵幀請求，回傳 hand_id 清單，None 表示全部的手"""
+    try:
+        hand_ids = json.loads(payload).get("hand_ids")
+    except (ValueError, AttributeError):
+        return None
+    return [int(hand_id) for hand_id in hand_ids] if isinstance(hand_ids, list) else None
+
+def decode_payload(payload):
+    """解碼 MQTT 收到的手部數據，自動判斷二進位或 JSON 格式
+
+    也接受舊版發送端重複編碼的 JSON 字串。
+
+    Raises:
+        ValueError: 數據格式不正確（包含 json.JSONDecodeError）
+    """
+    if payload[:1] == bytes([MAGIC]):
+        return decode_hand_frame(payload)
+    if payload[:1] == bytes([DELTA_MAGIC]):
+        raise ValueError("差量格式需要以 DeltaDecoder 解碼")
+    data = json.loads(payload.decode() if isinstance(payload, (bytes, bytearray)) else payload)
+    if isinstance(data, str):
+        data = json.loads(data)
+    return data
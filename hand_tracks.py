@@ -0,0 +1,158 @@
+import numpy as np
+from numpy.lib import recfunctions
+
+from hand_angles import ANGLE_DTYPE
+
+class OneEuroFilter:
+    """向量化的 One Euro 濾波器，一次處理陣列中的所有元素
+
+    截止頻率隨變化速度調整：靜止時以 min_cutoff 強力平滑去除抖動，
+    快速移動時截止頻率提高，避免固定參數 EMA 的延遲。
+
+    Args:
+        min_cutoff: 靜止時的截止頻率（Hz），越小越平滑
+        beta: 截止頻率隨速度（單位/秒）增加的比例，越大快速移動時延遲越小
+        d_cutoff: 速度估計的截止頻率（Hz）
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.02, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self._x = None
+        self._dx = None
+        self._t = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x, t):
+        """以時間 t（秒）的新數值更新濾波器，回傳平滑後的陣列"""
+        x = np.asarray(x, dtype=np.float64)
+        if self._x is None or self._x.shape != x.shape:
+            self._x = x.copy()
+            self._dx = np.zeros_like(x)
+            self._t = t
+            return x.copy()
+
+        dt = t - self._t
+        if dt <= 0:
+            return self._x.copy()
+        alpha_d = self._alpha(self.d_cutoff, dt)
+        self._dx = alpha_d * (x - self._x) / dt + (1 - alpha_d) * self._dx
+        alpha = self._alpha(self.min_cutoff + self.beta * np.abs(self._dx), dt)
+        self._x = alpha * x + (1 - alpha) * self._x
+        self._t = t
+        return self._x.copy()
+
+class HandTrack:
+    """一隻被追蹤的手：編號、位置、左右手投票與自己的濾波狀態"""
+
+    def __init__(self, track_id, centroid, now, angle_filter):
+        self.track_id = track_id
+        self.centroid = centroid
+        self.last_seen = now
+        self.filter = angle_filter
+        self._votes = {}
+
+    @property
+    def handedness(self):
+        """累積信心最高的左右手標籤，沒有標籤時為 None"""
+        if not self._votes:
+            return None
+        return max(self._votes, key=self._votes.get)
+
+    def vote(self, label, score):
+        # 舊的投票逐漸衰減，讓判斷錯誤的標籤能被修正
+        for key in self._votes:
+            self._votes[key] *= 0.9
+        if label is not None:
+            self._votes[label] = self._votes.get(label, 0.0) + score
+
+    def smooth(self, angles, now):
+        """以 One Euro 濾波器平滑單手的 ANGLE_DTYPE 陣列 (5,)"""
+        values = self.filter(recfunctions.structured_to_unstructured(angles), now)
+        return recfunctions.unstructured_to_structured(values.astype(np.float32), dtype=ANGLE_DTYPE)
+
+class HandTracker:
+    """以 MediaPipe 的左右手標籤與位置連續性追蹤每一隻手
+
+    每次推論的手依手部中心距離與左右手標籤配對到既有軌跡，每個軌跡的角度
+    各自平滑，兩隻手的數據不會互相混合。新出現的手取得目前未使用的最小編號，
+    因此只有一隻手時編號固定為 0。
+
+    Args:
+        max_distance: 相鄰兩次推論間手部中心的最大移動距離（正規化座標）
+        handedness_penalty: 左右手標籤不同時加上的距離成本；MediaPipe 偶爾會判斷錯左右手，因此不完全禁止
+        max_missing: 軌跡超過此秒數沒有被偵測到時移除
+        min_cutoff, beta, d_cutoff: OneEuroFilter 參數（角度單位為度）
+    """
+
+    def __init__(self, max_distance=0.25, handedness_penalty=0.1, max_missing=0.5,
+                 min_cutoff=1.0, beta=0.02, d_cutoff=1.0):
+        self.max_distance = max_distance
+        self.handedness_penalty = handedness_penalty
+        self.max_missing = max_missing
+        self.filter_params = {"min_cutoff": min_cutoff, "beta": beta, "d_cutoff": d_cutoff}
+        self.tracks = []
+
+    def _new_track(self, centroid, now):
+        used = {track.track_id for track in self.tracks}
+        track_id = next(i for i in range(len(used) + 1) if i not in used)
+        track = HandTrack(track_id, centroid, now, OneEuroFilter(**self.filter_params))
+        self.tracks.append(track)
+        return track
+
+    def _match(self, centroids, labels):
+        """貪婪配對，回傳 {偵測索引: 軌跡}"""
+        if not self.tracks or not len(centroids):
+            return {}
+        previous = np.array([track.centroid for track in self.tracks])
+        cost = np.linalg.norm(centroids[:, None, :] - previous[None, :, :], axis=-1)
+        allowed = cost <= self.max_distance
+        for d, label in enumerate(labels):
+            for t, track in enumerate(self.tracks):
+                if label is not None and track.handedness not in (None, label):
+                    cost[d, t] += self.handedness_penalty
+
+        matches = {}
+        used_tracks = set()
+        for index in np.argsort(cost, axis=None):
+            d, t = np.unravel_index(index, cost.shape)
+            if not allowed[d, t] or d in matches or t in used_tracks:
+                continue
+            matches[d] = self.tracks[t]
+            used_tracks.add(t)
+        return matches
+
+    def update(self, points, handedness, all_angles, now):
+        """更新軌跡並平滑各手的角度
+
+        Args:
+            points: (hands, 21, 3) 關鍵點陣列，沒有偵測到手時為空陣列
+            handedness: [(label, score), ...]，與 points 順序相同
+            all_angles: compute_finger_angles 的結果 (hands, 5)
+            now: 畫面時間（秒）
+
+        Returns:
+            [(HandTrack, 平滑後的角度), ...]，順序與 points 相同
+        """
+        centroids = points[..., :2].mean(axis=1) if len(points) else np.empty((0, 2))
+        handedness = list(handedness) + [(None, 0.0)] * (len(points) - len(handedness))
+        matches = self._match(centroids, [label for label, _ in handedness])
+
+        results = []
+        for d in range(len(points)):
+            track = matches.get(d) or self._new_track(centroids[d], now)
+            track.centroid = centroids[d]
+            track.last_seen = now
+            track.vote(*handedness[d])
+            results.append((track, track.smooth(all_angles[d], now)))
+
+        self.tracks = [track for track in self.tracks if now - track.last_seen <= self.max_missing]
+        return results
@@ -1,19 +1,29 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 import threading
-from PIL import ImageFont, ImageDraw, Image
 import time
-import json
-import os
 import logging
-import base64
-from Mqtt import mqtt_publisher, mqtt_subscriber
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from Mqtt import mqtt_publisher, mqtt_subscriber, get_publisher, topic_hand
+from camera_capture import LatestFrameCapture, MjpegCapture
+from pipeline import Pipeline
+from adaptive_scheduler import AdaptiveScheduler
+from landmark_recorder import LandmarkRecorder, LandmarkRecording, ReplaySource, handedness_from_result
+from overlay import GlyphAtlas, draw_text
+from hand_protocol import PAYLOAD_FORMATS, RESYNC_SUBTOPIC, TRACE_FIELDS, DeltaEncoder, parse_resync_request
+from hand_angles import FINGER_NAMES, landmarks_to_array, compute_finger_angles, encode_hand_payload
+from hand_tracks import HandTracker
+from fps_autoscaler import FpsAutoscaler, ReloadableHands, build_ladder
+from gesture_engine import GESTURE_TOPIC, GestureEngine, GestureIndex, load_templates
 
 # 設置日誌
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 程式啟動時間，用於記錄啟動到首次發送所需的時間
+_start_time = time.time()
+
 # 手機攝像頭設置
 MOBILE_CAMERA_IP = "10.219.83.13"  # 手機 IP 地址
 MOBILE_CAMERA_PORT = 8080  # IP Webcam 的預設端口
@@ -24,56 +34,91 @@ CAMERA_WIDTH = 640  # 減小解析度以提高性能
 CAMERA_HEIGHT = 480
 CAMERA_FPS = 30
 
-# 使用預設字體
-font = ImageFont.load_default()
+# HTTP 串流無法以 cap.set() 調整解析度，改為自行解析 MJPEG 串流並以縮小解析度解碼
+# （解碼後不小於 CAMERA_WIDTH x CAMERA_HEIGHT），來不及處理的畫面不解碼
+USE_MJPEG_READER = True
+MJPEG_DECODE_SCALE = None  # 固定的縮小倍率（1、2、4、8），None 表示自動選擇
 
-# 初始化 MediaPipe
-try:
-    # 設置 MediaPipe 參數
-    mp_hands = mp.solutions.hands
-    hands = mp_hands.Hands(
-        static_image_mode=False,
-        max_num_hands=2,
-        min_detection_confidence=0.5,
-        min_tracking_confidence=0.5
-    )
-    mp_draw = mp.solutions.drawing_utils
-    
-    # 等待 MediaPipe 初始化完成
-    time.sleep(2)
-    
-    logger.info("MediaPipe 初始化完成")
-except Exception as e:
-    logger.error(f"初始化 MediaPipe 時發生錯誤: {str(e)}")
-    raise
+# MediaPipe 參數（模型在 load_hand_model() 中才載入，匯入此模組不會初始化 MediaPipe）
+MAX_NUM_HANDS = 2
+MIN_DETECTION_CONFIDENCE = 0.5
+MIN_TRACKING_CONFIDENCE = 0.5
+MODEL_COMPLEXITY = 1  # 0 較快、1 較準確
 
-# 計算角度的函數
-def calculate_angle(a, b, c):
-    """計算三點之間的角度（2D）
+# 推論後端："solutions" 為 mp.solutions.hands（同步 process()），
+# "tasks" 為 MediaPipe Tasks 的 HandLandmarker（LIVE_STREAM 非同步推論，需要模型檔）
+INFERENCE_BACKENDS = ("solutions", "tasks")
+INFERENCE_BACKEND = "solutions"
+HAND_LANDMARKER_MODEL = "hand_landmarker.task"  # https://developers.google.com/mediapipe/solutions/vision/hand_landmarker
+
+def load_hand_model(warmup=True, backend=INFERENCE_BACKEND, model_path=HAND_LANDMARKER_MODEL,
+                    model_complexity=MODEL_COMPLEXITY):
+    """載入 MediaPipe 手部模型
     
-    Args:
-        a: 點 A 的座標 (x, y)
-        b: 點 B 的座標 (x, y) - 中間點
-        c: 點 C 的座標 (x, y)
+    第一次推論會啟動計算圖並配置緩衝區，預熱時先以空白畫面執行一次，
+    第一幀真正的畫面就不需要等待，也不需要固定等待初始化完成。
     
-    Returns:
-        float: 角度（度數）
+    Args:
+        warmup: 是否以空白畫面預熱
+        backend: 推論後端，見 INFERENCE_BACKENDS
+        model_path: tasks 後端使用的 hand_landmarker.task 模型檔
+        model_complexity: solutions 後端的模型複雜度（0 或 1）
     """
-    # 計算向量
-    ba = np.array(b) - np.array(a)
-    bc = np.array(c) - np.array(b)
-    
-    # 計算餘弦值
-    cos_theta = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-    
-    # 計算角度並轉換為度數
-    angle = np.arccos(np.clip(cos_theta, -1.0, 1.0))  # 避免數值誤差
-    return np.degrees(angle)
+    try:
+        blank = np.zeros((CAMERA_HEIGHT, CAMERA_WIDTH, 3), dtype=np.uint8)
+        if backend == "tasks":
+            from live_stream_hands import LiveStreamHands
+            hands = LiveStreamHands(
+                model_path,
+                max_num_hands=MAX_NUM_HANDS,
+                min_detection_confidence=MIN_DETECTION_CONFIDENCE,
+                min_tracking_confidence=MIN_TRACKING_CONFIDENCE
+            )
+            if warmup:
+                hands.warmup(blank)
+            logger.info(f"MediaPipe HandLandmarker 初始化完成 ({model_path})")
+            return hands
+        
+        import mediapipe as mp
+        
+        def create_hands(complexity):
+            hands = mp.solutions.hands.Hands(
+                static_image_mode=False,
+                max_num_hands=MAX_NUM_HANDS,
+                model_complexity=complexity,
+                min_detection_confidence=MIN_DETECTION_CONFIDENCE,
+                min_tracking_confidence=MIN_TRACKING_CONFIDENCE
+            )
+            if warmup:
+                hands.process(blank)
+            return hands
+        
+        # FpsAutoscaler 可在執行中切換 model_complexity
+        hands = ReloadableHands(create_hands, model_complexity)
+        logger.info("MediaPipe 初始化完成")
+        return hands
+    except Exception as e:
+        logger.error(f"初始化 MediaPipe 時發生錯誤: {str(e)}")
+        raise
 
 def init_camera():
-    """Initialize camera"""
+    """Initialize camera and start the background capture thread
+    
+    Returns:
+        MjpegCapture or LatestFrameCapture, None if the camera cannot be opened
+    """
     print(f"Connecting to mobile camera: {MOBILE_CAMERA_URL}")
     
+    if USE_MJPEG_READER and MOBILE_CAMERA_URL.startswith("http"):
+        try:
+            capture = MjpegCapture(MOBILE_CAMERA_URL, target_size=(CAMERA_WIDTH, CAMERA_HEIGHT),
+                                   scale=MJPEG_DECODE_SCALE).start()
+        except OSError as e:
+            print(f"❌ Failed to connect to mobile camera ({MOBILE_CAMERA_URL}): {e}")
+            return None
+        print(f"✅ Successfully connected to mobile camera ({MOBILE_CAMERA_URL}, MJPEG reader)")
+        return capture
+    
     # Only use mobile camera
     cap = cv2.VideoCapture(MOBILE_CAMERA_URL)
     if not cap.isOpened():
@@ -93,33 +138,342 @@ def init_camera():
     fps = cap.get(cv2.CAP_PROP_FPS)
     print(f"Parameters after setting - Width: {width}, Height: {height}, FPS: {fps}")
 
-    return cap
+    # 由背景執行緒讀取串流，管線只處理最新畫面，避免處理過時的緩衝畫面
+    return LatestFrameCapture(cap).start()
+
+# 管線參數
+PIPELINE_QUEUE_SIZE = 2  # 各階段之間的佇列長度，越短延遲越低
+METRICS_INTERVAL = 5.0  # 記錄各階段統計資訊的間隔（秒）
+
+# MQTT 數據格式："json"、"binary"（float32）、"binary_u8"（uint8，1 度解析度）
+# 或 "delta"（定期發送關鍵幀，之間只發送角度有變化的手指）
+PAYLOAD_FORMAT = "json"
+DELTA_STEP = 1.0  # 差量格式的量化間隔（度）
+KEYFRAME_INTERVAL = 1.0  # 差量格式每隻手發送關鍵幀的間隔（秒）
+
+# 自適應推論與發送參數
+MIN_INFERENCE_INTERVAL = 0.0  # 手部快速移動時的推論間隔（秒），0 表示每幀都推論
+MAX_INFERENCE_INTERVAL = 0.3  # 手部靜止或不在畫面中時的推論間隔（秒）
+PUBLISH_DEADBAND = 2.0  # 任一關節角度變化超過此值（度）才發送
+HEARTBEAT_INTERVAL = 1.0  # 角度沒有變化時，每隔此秒數仍發送一次完整數據
+
+# ROI 追蹤參數：以上一幀的手部位置裁切畫面後再推論
+USE_ROI_TRACKING = True
+ROI_PADDING = 0.25  # 手部外框向外擴張的比例
+ROI_MAX_SIZE = 256  # 裁切區域最長邊超過此值時縮小（像素）
+
+# 角度平滑（One Euro 濾波器，每隻手各自平滑）
+SMOOTHING_MIN_CUTOFF = 1.0  # 靜止時的截止頻率（Hz），越小越平滑
+SMOOTHING_BETA = 0.02  # 截止頻率隨角速度增加的比例，越大快速移動時延遲越小
+
+# 推論頻率自動調整：依推論延遲在以下範圍內調整輸入縮放、模型複雜度與全畫面偵測間隔，
+# 維持目標頻率，操作點發送到 hand_tracking/stats/autoscaler（0 表示不調整）
+AUTOSCALE_TARGET_FPS = 25.0
+AUTOSCALE_SCALES = (1.0, 0.75, 0.5)  # 推論前的畫面縮放比例
+AUTOSCALE_COMPLEXITIES = (1, 0)  # solutions 後端的 model_complexity
+AUTOSCALE_REDETECT_INTERVALS = (30, 60, 120)  # ROI 追蹤時每隔幾幀全畫面偵測一次
+
+def create_autoscaler(target_fps=AUTOSCALE_TARGET_FPS, backend=INFERENCE_BACKEND):
+    """依推論後端支援的參數建立 FpsAutoscaler，target_fps 為 0 時回傳 None"""
+    if not target_fps:
+        return None
+    solutions = backend == "solutions"
+    ladder = build_ladder(
+        scales=AUTOSCALE_SCALES,
+        complexities=AUTOSCALE_COMPLEXITIES if solutions else (None,),
+        redetect_intervals=AUTOSCALE_REDETECT_INTERVALS if solutions and USE_ROI_TRACKING else (None,),
+    )
+    return FpsAutoscaler(target_fps, ladder)
+
+# 手勢辨識：與角度計算一起執行，手勢改變時發送事件到 hand_tracking/gesture
+USE_GESTURES = True
+GESTURE_LIBRARY = None  # gesture_engine.py --record 錄製的樣板檔，None 表示使用內建樣板
+
+def create_gesture_engine(enabled=USE_GESTURES, library=GESTURE_LIBRARY):
+    """建立 GestureEngine，enabled 為 False 時回傳 None"""
+    if not enabled:
+        return None
+    index = GestureIndex(load_templates(library) if library else None)
+    logger.info(f"手勢樣板: {', '.join(index.names)}")
+    return GestureEngine(index)
+
+def draw_overlay(frame, result, angles, fps, glyph_atlas):
+    """在畫面上繪製手部關鍵點、FPS 與各手指角度（原地修改 BGR 畫面）"""
+    if result is None or not result.multi_hand_landmarks:
+        return frame
+    
+    import mediapipe as mp
+    for hand_landmarks in result.multi_hand_landmarks:
+        mp.solutions.drawing_utils.draw_landmarks(frame, hand_landmarks, mp.solutions.hands.HAND_CONNECTIONS)
+    
+    # 顯示 FPS 和解析度
+    draw_text(frame, (2, 2), f"FPS: {fps}", glyph_atlas)
+    draw_text(frame, (2, 20), f"Res: {frame.shape[1]}x{frame.shape[0]}", glyph_atlas)
+    
+    y_offset = 40  # 調整文字起始位置
+    for hand_angles in angles:
+        for name, finger in zip(FINGER_NAMES, hand_angles):
+            text = f"{name} PIP:{int(finger['pip'])}° DIP:{int(finger['dip'])}° 總計:{int(finger['total'])}°"
+            draw_text(frame, (2, y_offset), text, glyph_atlas)
+            y_offset += 20  # 減小行間距
+    
+    return frame
+
+def camera_source(capture):
+    """管線來源：從 LatestFrameCapture 取得最新畫面"""
+    def capture_stage():
+        while capture.isOpened():
+            frame, seq, capture_time = capture.read_latest()
+            if frame is not None:
+                return {"frame": frame, "seq": seq, "capture_time": capture_time}
+        return None
+    return capture_stage
+
+def replay_source(recording, speed=1.0, loop=False):
+    """管線來源：重播錄製的關鍵點，略過攝像頭與推論"""
+    frames = enumerate(ReplaySource(recording, speed, loop))
+    image_size = recording.image_size or (CAMERA_WIDTH, CAMERA_HEIGHT)
+    
+    def replay_stage():
+        for seq, (_, points, handedness) in frames:
+            now = time.time()
+            return {
+                "frame": None,
+                "seq": seq,
+                "capture_time": now,
+                "inference_start": now,
+                "inference_end": now,
+                "result": None,
+                "points": points,
+                "handedness": handedness,
+                "image_size": image_size,
+            }
+        return None
+    return replay_stage
+
+def build_hand_pipeline(source, payload_format=PAYLOAD_FORMAT, recorder=None, hands=None, autoscaler=None,
+                        gestures=None):
+    """建立 擷取 → 推論 → 特徵 → 發送 的管線
+    
+    每個階段在自己的執行緒上執行，以有界佇列相連，佇列滿時丟棄最舊的畫面，
+    讓推論、角度計算與網路發送可以和擷取同時進行。
+    MediaPipe 的推論在 C++ 中執行，可與其他執行緒並行。
+    推論頻率與發送時機由 AdaptiveScheduler 依手部動作決定。
+    使用 LiveStreamHands 時推論階段只送出畫面，結果由回呼送往特徵階段。
+    
+    Args:
+        source: 管線來源函數（camera_source 或 replay_source）
+        payload_format: MQTT 數據格式
+        recorder: LandmarkRecorder，提供時記錄每一幀推論得到的關鍵點
+        hands: load_hand_model() 載入的模型，None 表示來源已提供關鍵點（重播）
+        autoscaler: FpsAutoscaler，提供時依推論延遲調整操作點
+        gestures: GestureEngine，提供時辨識手勢並發送手勢事件
+    """
+    run_inference = hands is not None
+    live_stream = run_inference and hasattr(hands, "submit")
+    scheduler = AdaptiveScheduler(
+        min_interval=MIN_INFERENCE_INTERVAL,
+        max_interval=MAX_INFERENCE_INTERVAL,
+        deadband=PUBLISH_DEADBAND,
+        heartbeat_interval=HEARTBEAT_INTERVAL
+    )
+    tracker = hands
+    # HandLandmarker 在 LIVE_STREAM 模式已自行以上一幀的位置追蹤手部
+    if run_inference and USE_ROI_TRACKING and not live_stream:
+        from roi_tracker import RoiHandTracker
+        tracker = RoiHandTracker(hands, padding=ROI_PADDING, max_roi_size=ROI_MAX_SIZE)
+        if autoscaler is not None and autoscaler.point["redetect_interval"] is not None:
+            tracker.redetect_interval = autoscaler.point["redetect_interval"]
+    hand_tracker = HandTracker(min_cutoff=SMOOTHING_MIN_CUTOFF, beta=SMOOTHING_BETA)
+    state = {
+        "seq": 0,  # 發送序號，接收端可用來偵測遺失的訊息
+    }
+    delta_encoder = None
+    if payload_format == "delta":
+        delta_encoder = DeltaEncoder(step=DELTA_STEP, keyframe_interval=KEYFRAME_INTERVAL)
+        # 接收端遺失訊息或剛啟動時會要求關鍵幀，不必等到下一個關鍵幀間隔
+        get_publisher().subscribe(f"{topic_hand}/{RESYNC_SUBTOPIC}",
+                                  lambda payload: delta_encoder.request_keyframe(parse_resync_request(payload)))
+    
+    def inference_input(frame):
+        """依目前的操作點縮小畫面並轉換為 RGB"""
+        scale = autoscaler.point["scale"] if autoscaler is not None else 1.0
+        if scale < 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    
+    def record_latency(packet):
+        if autoscaler is None:
+            return
+        point = autoscaler.record(packet["inference_end"] - packet["inference_start"], packet["inference_end"])
+        if point is not None:
+            # 關鍵點為正規化座標，縮放畫面不影響角度計算
+            if point["redetect_interval"] is not None and hasattr(tracker, "redetect_interval"):
+                tracker.redetect_interval = point["redetect_interval"]
+            if point["model_complexity"] is not None and hasattr(hands, "set_model_complexity"):
+                hands.set_model_complexity(point["model_complexity"])
+            logger.info(f"推論操作點調整為第 {autoscaler.level} 階 {point} "
+                        f"(可持續 {autoscaler.sustainable_fps:.1f} FPS，目標 {autoscaler.target_fps:g} FPS)")
+        autoscaler.maybe_publish(get_publisher())
+    
+    def inference_stage(packet):
+        # 手部靜止時降低推論頻率，略過的畫面仍會顯示
+        if not scheduler.should_infer(packet["capture_time"]):
+            packet["result"] = None
+            packet["points"] = None
+            return packet
+        
+        # 轉換 BGR 到 RGB
+        frame = packet["frame"]
+        packet["inference_start"] = time.time()
+        frame_rgb = inference_input(frame)
+        result = tracker.process(frame_rgb)
+        packet["inference_end"] = time.time()
+        record_latency(packet)
+        packet["result"] = result
+        packet["points"] = landmarks_to_array(result.multi_hand_landmarks)
+        packet["handedness"] = handedness_from_result(result)
+        packet["image_size"] = (frame.shape[1], frame.shape[0])
+        return packet
+    
+    def submit_stage(packet):
+        # 非同步推論：送出畫面後立即處理下一幀，結果由 on_inference_result 送出
+        if not scheduler.should_infer(packet["capture_time"]):
+            packet["result"] = None
+            packet["points"] = None
+            return packet
+        # 上一幀仍在推論中，這一幀已過時，直接丟棄
+        if hands.busy():
+            return None
+        
+        frame = packet["frame"]
+        packet["inference_start"] = time.time()
+        packet["image_size"] = (frame.shape[1], frame.shape[0])
+        hands.submit(inference_input(frame), packet["capture_time"], packet)
+        return None
+    
+    def on_inference_result(result, packet):
+        if packet is None:
+            return
+        packet["inference_end"] = time.time()
+        packet["result"] = result
+        packet["points"] = landmarks_to_array(result.multi_hand_landmarks)
+        packet["handedness"] = handedness_from_result(result)
+        record_latency(packet)
+        pipeline.stages[0].emit(packet)
+    
+    def feature_stage(packet):
+        points = packet["points"]
+        packet["angles"] = []
+        packet["hands"] = []
+        packet["gesture_events"] = []
+        if points is None:
+            return packet
+        
+        if recorder is not None:
+            recorder.append(packet["capture_time"], points, packet["handedness"])
+        scheduler.update_motion(points, packet["capture_time"])
+        # 一次計算所有手的關節角度，顯示與 MQTT 發送共用同一份結果
+        all_angles = compute_finger_angles(points, image_size=packet["image_size"]) if len(points) else []
+        # 每隻手配對到自己的軌跡後各自平滑，兩隻手的角度不會互相混合
+        packet["hands"] = hand_tracker.update(points, packet["handedness"], all_angles, packet["capture_time"])
+        packet["angles"] = [angles for _, angles in packet["hands"]]
+        if gestures is not None:
+            hands_angles = [(track.track_id, angles, track.handedness) for track, angles in packet["hands"]]
+            packet["gesture_events"] = gestures.update(hands_angles, packet["capture_time"])
+        return packet
+    
+    def publish_stage(packet):
+        current_time = time.time()
+        for track, angles in packet["hands"]:
+            # 每隻手的角度變化超過門檻或到了 heartbeat 時間才發送 MQTT 消息
+            if not scheduler.should_publish(angles, current_time, key=track.track_id):
+                continue
+            # 附加各階段時間戳，接收端可計算延遲
+            trace = {field: packet[field] for field in TRACE_FIELDS}
+            payload = encode_hand_payload(payload_format, angles, state["seq"], current_time, track.track_id, trace,
+                                          delta_encoder, extra={"handedness": track.handedness})
+            mqtt_publisher(payload)
+            if state["seq"] == 0:
+                logger.info(f"首次發送 (啟動後 {time.time() - _start_time:.2f} 秒)")
+            state["seq"] += 1
+            logger.debug(f"📨 發送手部數據 (手: {track.track_id}, 序號: {state['seq']}, 推論間隔: {scheduler.interval:.2f}s)")
+        # 手勢事件只在手勢改變與 heartbeat 時產生，發送到獨立的主題
+        for event in packet["gesture_events"]:
+            get_publisher().publish(event, topic=GESTURE_TOPIC)
+            if event["changed"]:
+                logger.info(f"手勢 (手: {event['hand_id']}): {event['previous']} → {event['gesture']}")
+        return packet
+    
+    pipeline = Pipeline(source, source_name="capture" if run_inference else "replay")
+    if live_stream:
+        pipeline.add_stage("inference", submit_stage, PIPELINE_QUEUE_SIZE)
+        hands.on_result = on_inference_result
+    elif run_inference:
+        pipeline.add_stage("inference", inference_stage, PIPELINE_QUEUE_SIZE)
+    # 重播時不丟棄任何一幀，佇列滿時讓來源等待
+    pipeline.add_stage("feature", feature_stage, PIPELINE_QUEUE_SIZE, drop_oldest=run_inference)
+    pipeline.add_stage("publish", publish_stage, PIPELINE_QUEUE_SIZE, drop_oldest=run_inference)
+    return pipeline
 
 # 主程序函數
-def hand_camera():
-    # 初始化攝像頭
-    cap = init_camera()
-    if cap is None:
+def hand_camera(headless=False, payload_format=PAYLOAD_FORMAT, record_path=None,
+                backend=INFERENCE_BACKEND, model_path=HAND_LANDMARKER_MODEL, target_fps=AUTOSCALE_TARGET_FPS,
+                gestures=USE_GESTURES, gesture_library=GESTURE_LIBRARY):
+    """執行手部追蹤
+    
+    Args:
+        headless: 不顯示視窗也不繪製畫面，適用於沒有螢幕的主機（按 Ctrl+C 結束）
+        payload_format: MQTT 數據格式，見 PAYLOAD_FORMAT
+        record_path: 錄製關鍵點的資料夾，None 表示不錄製
+        backend: 推論後端，見 INFERENCE_BACKENDS
+        model_path: tasks 後端使用的模型檔
+        target_fps: 自動調整的目標推論頻率，0 表示不調整
+        gestures: 是否辨識手勢
+        gesture_library: 手勢樣板檔，None 表示使用內建樣板
+    """
+    # 攝像頭連線、模型載入與預熱、MQTT 連線互不相依，同時進行以縮短啟動時間
+    startup_start = time.time()
+    get_publisher()  # MQTT 在背景執行緒連線
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        camera_future = executor.submit(init_camera)
+        model_future = executor.submit(load_hand_model, True, backend, model_path)
+        # 中文字形快取，畫面文字直接繪製在 BGR 畫面上
+        atlas_future = executor.submit(GlyphAtlas) if not headless else None
+        capture = camera_future.result()
+        try:
+            hands = model_future.result()
+        except Exception:
+            if capture is not None:
+                capture.release()
+            raise
+        glyph_atlas = atlas_future.result() if atlas_future else None
+    if capture is None:
         logger.error("無法初始化攝像頭")
+        hands.close()
         return
+    logger.info(f"攝像頭與模型已就緒 ({time.time() - startup_start:.2f} 秒)")
+    
+    recorder = LandmarkRecorder(record_path, max_hands=MAX_NUM_HANDS, image_size=(CAMERA_WIDTH, CAMERA_HEIGHT)) if record_path else None
+    autoscaler = create_autoscaler(target_fps, backend)
+    gesture_engine = create_gesture_engine(gestures, gesture_library)
+    pipeline = build_hand_pipeline(camera_source(capture), payload_format, recorder, hands, autoscaler,
+                                   gesture_engine).start()
     
     # 初始化變數
     last_time = time.time()
     frame_count = 0
     fps = 0
-    last_mqtt_time = time.time()
-    mqtt_interval = 2.0  # 每兩秒傳送一次
-    last_hand_time = time.time()
-    hand_interval = 0.1  # 手部追蹤更新間隔
+    last_metrics_time = time.time()
     
-    while True:
-        try:
-            ret, frame = cap.read()
-            if not ret:
-                logger.error("無法讀取攝像頭畫面")
-                break
+    try:
+        # 顯示必須在主執行緒進行，無視窗模式下主執行緒只負責統計
+        while pipeline.is_running():
+            packet = pipeline.get_output(timeout=1.0)
+            if packet is None:
+                continue
             
-            # 計算 FPS
+            # 計算 FPS（完成整條管線的畫面數）
             frame_count += 1
             current_time = time.time()
             if current_time - last_time >= 1.0:
@@ -127,275 +481,83 @@ def hand_camera():
                 frame_count = 0
                 last_time = current_time
             
-            # 只在特定時間間隔進行手部追蹤
-            if current_time - last_hand_time >= hand_interval:
-                # 轉換 BGR 到 RGB
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                result = hands.process(frame_rgb)
-                
-                if result.multi_hand_landmarks:
-                    for hand_landmarks in result.multi_hand_landmarks:
-                        mp_draw.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-                        
-                        landmarks = hand_landmarks.landmark
-                        
-                        fingers = {
-                            "拇指": [1, 2, 3, 4],
-                            "食指": [5, 6, 7, 8],
-                            "中指": [9, 10, 11, 12],
-                            "無名指": [13, 14, 15, 16],
-                            "小指": [17, 18, 19, 20]
-                        }
-                        
-                        angles = {}
-                        y_offset = 30  # 調整文字起始位置
-                        
-                        for name, indices in fingers.items():
-                            # 取得關節座標，並轉換為相對座標
-                            mcp = [landmarks[indices[0]].x * frame.shape[1], landmarks[indices[0]].y * frame.shape[0]]
-                            pip = [landmarks[indices[1]].x * frame.shape[1], landmarks[indices[1]].y * frame.shape[0]]
-                            dip = [landmarks[indices[2]].x * frame.shape[1], landmarks[indices[2]].y * frame.shape[0]]
-                            tip = [landmarks[indices[3]].x * frame.shape[1], landmarks[indices[3]].y * frame.shape[0]]
-                            
-                            # 計算角度
-                            pip_angle = calculate_angle(mcp, pip, dip)
-                            dip_angle = calculate_angle(pip, dip, tip)
-                            
-                            # 確保角度在合理範圍內
-                            pip_angle = min(max(pip_angle, 0), 180)
-                            dip_angle = min(max(dip_angle, 0), 180)
-                            
-                            # 計算總角度
-                            total_angle = pip_angle + dip_angle
-                            if total_angle > 180:
-                                total_angle = 180
-                            
-                            angles[name] = (pip_angle, dip_angle, total_angle)
-                        
-                        # 繪製中文字
-                        img_pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-                        draw = ImageDraw.Draw(img_pil)
-                        
-                        # 顯示 FPS 和效能資訊
-                        draw.text((2, 2), f"FPS: {fps}", font=font, fill=(255, 255, 0))
-                        draw.text((2, 20), f"Res: {CAMERA_WIDTH}x{CAMERA_HEIGHT}", font=font, fill=(255, 255, 0))
-                        
-                        for name, (pip_angle, dip_angle, total_angle) in angles.items():
-                            text = f"{name} PIP:{int(pip_angle)}° DIP:{int(dip_angle)}° 總計:{int(180-(360-total_angle))}°"
-                            draw.text((2, y_offset), text, font=font, fill=(255, 255, 0))
-                            y_offset += 20  # 減小行間距
-                        
-                        # 只在特定時間間隔發送 MQTT 消息
-                        if current_time - last_mqtt_time >= mqtt_interval:
-                            # 建立包含所有手指數據的字典
-                            all_fingers_data = {
-                                "timestamp": time.time(),
-                                "fingers": []
-                            }
-                            
-                            for name, (pip_angle, dip_angle, total_angle) in angles.items():
-                                finger_data = {
-                                    "name": name,
-                                    "pip_angle": float(pip_angle),
-                                    "dip_angle": float(dip_angle),
-                                    "total_angle": float(total_angle)
-                                }
-                                all_fingers_data["fingers"].append(finger_data)
-                            
-                            # 將所有手指數據轉換為 JSON 並發送
-                            try:
-                                data_str = json.dumps(all_fingers_data)
-                                mqtt_publisher(data_str)
-                                print(f"📨 發送手部數據 (時間: {time.strftime('%H:%M:%S', time.localtime(time.time()))})")
-                            except Exception as e:
-                                logger.error(f"發送 MQTT 數據時發生錯誤: {str(e)}")
-                                logger.error(f"數據格式: {data_str}")
-                            last_mqtt_time = current_time
-                        
-                        frame = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
-                
-                last_hand_time = current_time
+            if current_time - last_metrics_time >= METRICS_INTERVAL:
+                logger.info(Pipeline.format_metrics(pipeline.metrics(reset=True)))
+                last_metrics_time = current_time
             
-            # 顯示視頻幀
+            if headless:
+                continue
+            
+            frame = draw_overlay(packet["frame"], packet["result"], packet["angles"], fps, glyph_atlas)
             cv2.imshow("Hand Tracking", frame)
             
-            # 檢查退出條件
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
-            
-        except Exception as e:
-            logger.error(f"處理攝像頭畫面時發生錯誤: {str(e)}")
-            break
-    
-    # 清理資源
-    cap.release()
-    cv2.destroyAllWindows()
-
-def init_camera():
-    """Initialize camera"""
-    print(f"Connecting to mobile camera: {MOBILE_CAMERA_URL}")
-    
-    # Only use mobile camera
-    cap = cv2.VideoCapture(MOBILE_CAMERA_URL)
-    if not cap.isOpened():
-        print(f"❌ Failed to connect to mobile camera ({MOBILE_CAMERA_URL})")
-        return None
-    
-    print(f"✅ Successfully connected to mobile camera ({MOBILE_CAMERA_URL})")
-    
-    # Set camera parameters
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
-    cap.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
-    
-    # Check if parameters are set successfully
-    width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-    height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    print(f"Parameters after setting - Width: {width}, Height: {height}, FPS: {fps}")
-
-    return cap
+    finally:
+        logger.info(f"擷取畫面: {capture.captured_frames}，丟棄過時畫面: {capture.dropped_frames}")
+        if isinstance(capture, MjpegCapture):
+            logger.info(f"解碼畫面: {capture.decoded_frames}，解析度: {capture.source_size} → {capture.frame_size}")
+        capture.release()
+        pipeline.stop()
+        if autoscaler is not None:
+            logger.info(f"推論操作點: 第 {autoscaler.level} 階 {autoscaler.point}，調整 {autoscaler.changes} 次")
+        if backend == "tasks":
+            logger.info(f"送出推論: {hands.submitted}，完成: {hands.completed}，"
+                        f"MediaPipe 略過: {hands.skipped}，等待過多未送出: {hands.rejected}")
+        hands.close()
+        if recorder is not None:
+            recorder.close()
+            logger.info(f"已錄製 {recorder.count} 幀關鍵點到 {record_path}")
+        if not headless:
+            cv2.destroyAllWindows()
 
-# 主程序函數
-def hand_camera():
-    # 初始化攝像頭
-    cap = init_camera()
-    if cap is None:
-        print("❌ 無法初始化攝像頭")
-        return
+def replay_hands(path, speed=1.0, loop=False, payload_format=PAYLOAD_FORMAT, gestures=USE_GESTURES,
+                 gesture_library=GESTURE_LIBRARY):
+    """重播錄製的關鍵點，經過角度計算與 MQTT 發送，不需要攝像頭
     
-# 不需要重複設置相機參數，因為已經在 init_camera() 中設置過了
-    # 使用 init_camera() 中設置的解析度和幀率
-    
-    # 初始化變數
-    last_time = time.time()
-    frame_count = 0
-    fps = 0
-    last_mqtt_time = time.time()
-    mqtt_interval = 2.0  # 每兩秒傳送一次
-    last_hand_time = time.time()
-    hand_interval = 0.3  # 增加手部追蹤更新間隔到0.3秒
-    last_angles = {}  # 用於存儲上一幀的角度
-    angle_smoothing = 0.3  # 角度平滑參數（0.0-1.0）
-    
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # 計算 FPS
-        frame_count += 1
-        current_time = time.time()
-        if current_time - last_time >= 1.0:
-            fps = frame_count
-            frame_count = 0
-            last_time = current_time
-        
-        # 只在特定時間間隔進行手部追蹤
-        if current_time - last_hand_time >= hand_interval:
-            # 轉換 BGR 到 RGB
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            result = hands.process(frame_rgb)
-            
-            if result.multi_hand_landmarks:
-                for hand_landmarks in result.multi_hand_landmarks:
-                    mp_draw.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-                    
-                    landmarks = hand_landmarks.landmark
-                    
-                    # 使用數字編碼替代中文字符
-                    fingers = {
-                        0: [1, 2, 3, 4],    # 拇指
-                        1: [5, 6, 7, 8],    # 食指
-                        2: [9, 10, 11, 12], # 中指
-                        3: [13, 14, 15, 16],# 無名指
-                        4: [17, 18, 19, 20] # 小指
-                    }
-                    
-                    angles = {}
-                    y_offset = 30  # 調整文字起始位置
-                    
-                    for name, indices in fingers.items():
-                        # 取得關節座標，只使用 x, y 座標
-                        mcp = [landmarks[indices[0]].x, landmarks[indices[0]].y]
-                        pip = [landmarks[indices[1]].x, landmarks[indices[1]].y]
-                        dip = [landmarks[indices[2]].x, landmarks[indices[2]].y]
-                        tip = [landmarks[indices[3]].x, landmarks[indices[3]].y]
-                        
-                        # 計算角度
-                        pip_angle = calculate_angle(mcp, pip, dip)
-                        dip_angle = calculate_angle(pip, dip, tip)
-                        
-                        # 計算總角度
-                        total_angle = pip_angle + dip_angle
-                        if total_angle > 180:
-                            total_angle = 180
-                        
-                        # 如果有上一幀的角度，進行平滑處理
-                        if name in last_angles:
-                            last_pip, last_dip, last_total = last_angles[name]
-                            pip_angle = pip_angle * angle_smoothing + last_pip * (1 - angle_smoothing)
-                            dip_angle = dip_angle * angle_smoothing + last_dip * (1 - angle_smoothing)
-                            total_angle = total_angle * angle_smoothing + last_total * (1 - angle_smoothing)
-                        
-                        angles[name] = (pip_angle, dip_angle, total_angle)
-                        last_angles[name] = angles[name]
-                    
-                    # 繪製中文字
-                    img_pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-                    draw = ImageDraw.Draw(img_pil)
-                    
-                    # 顯示 FPS 和效能資訊
-                    draw.text((2, 2), f"FPS: {fps}", font=font, fill=(255, 255, 0))
-                    # 顯示解析度和幀率
-                    draw.text((2, 20), f"Res: {frame.shape[1]}x{frame.shape[0]}", font=font, fill=(255, 255, 0))
-                    draw.text((2, 40), f"FPS: {fps}", font=font, fill=(255, 255, 0))
-                    
-                    # 在顯示時將數字轉換回中文字符
-                    finger_names = ["拇指", "食指", "中指", "無名指", "小指"]
-                    for idx, (pip_angle, dip_angle, total_angle) in angles.items():
-                        name = finger_names[idx]
-                        text = f"{name} PIP:{int(pip_angle)}° DIP:{int(dip_angle)}° 總計:{int(total_angle)}°"
-                        draw.text((2, y_offset), text, font=font, fill=(255, 255, 0))
-                        y_offset += 20  # 減小行間距
-                    
-                    # 只在特定時間間隔發送 MQTT 消息
-                    if current_time - last_mqtt_time >= mqtt_interval:
-                        # 建立包含所有手指數據的字典
-                        all_fingers_data = {
-                            "timestamp": time.time(),
-                            "fingers": []
-                        }
-                        
-                        for name, (pip_angle, dip_angle, total_angle) in angles.items():
-                            # 使用數字編碼替代中文字符
-                            finger_data = {
-                                "finger_id": idx,
-                                "pip_angle": float(pip_angle),
-                                "dip_angle": float(dip_angle),
-                                "total_angle": float(total_angle)
-                            }
-                            all_fingers_data["fingers"].append(finger_data)
-                        
-                        # 將所有手指數據轉換為 JSON 並發送
-                        data_str = json.dumps(all_fingers_data)
-                        mqtt_publisher(data_str)
-                        print(f"📨 發送手部數據 (時間: {time.strftime('%H:%M:%S', time.localtime(time.time()))})")
-                        last_mqtt_time = current_time
-                    
-                    frame = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
-            
-            last_hand_time = current_time
-        
-        cv2.imshow("Hand Tracking", frame)
-        
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-    
-    cap.release()
-    cv2.destroyAllWindows()
+    Args:
+        path: 錄製資料夾
+        speed: 播放速度倍率，0 表示最快速度
+        loop: 播放完畢後是否從頭開始
+        payload_format: MQTT 數據格式
+        gestures: 是否辨識手勢
+        gesture_library: 手勢樣板檔，None 表示使用內建樣板
+    """
+    recording = LandmarkRecording(path)
+    logger.info(f"重播 {len(recording)} 幀關鍵點 (速度: {speed if speed > 0 else '最快'})")
+    pipeline = build_hand_pipeline(replay_source(recording, speed, loop), payload_format,
+                                   gestures=create_gesture_engine(gestures, gesture_library)).start()
+    last_metrics_time = time.time()
+    try:
+        while pipeline.is_running():
+            pipeline.get_output(timeout=1.0)
+            if time.time() - last_metrics_time >= METRICS_INTERVAL:
+                logger.info(Pipeline.format_metrics(pipeline.metrics(reset=True)))
+                last_metrics_time = time.time()
+    finally:
+        pipeline.stop()
+        logger.info(Pipeline.format_metrics(pipeline.metrics()))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="手部追蹤與 MQTT 發送")
+    parser.add_argument("--headless", action="store_true", help="不繪製畫面也不開啟視窗")
+    parser.add_argument("--payload-format", choices=PAYLOAD_FORMATS, default=PAYLOAD_FORMAT, help="MQTT 數據格式")
+    parser.add_argument("--record", metavar="DIR", help="把每一幀的關鍵點錄製到資料夾")
+    parser.add_argument("--replay", metavar="DIR", help="重播錄製的關鍵點而不使用攝像頭")
+    parser.add_argument("--speed", type=float, default=1.0, help="重播速度倍率，0 表示最快速度")
+    parser.add_argument("--loop", action="store_true", help="重復重播")
+    parser.add_argument("--backend", choices=INFERENCE_BACKENDS, default=INFERENCE_BACKEND,
+                        help="推論後端（tasks 為 HandLandmarker 非同步推論）")
+    parser.add_argument("--model", default=HAND_LANDMARKER_MODEL, help="tasks 後端的 hand_landmarker.task 模型檔")
+    parser.add_argument("--target-fps", type=float, default=AUTOSCALE_TARGET_FPS,
+                        help="自動調整畫面縮放、模型複雜度與偵測間隔以維持的推論頻率，0 表示不調整")
+    parser.add_argument("--gestures", metavar="FILE", default=GESTURE_LIBRARY,
+                        help="gesture_engine.py --record 錄製的手勢樣板檔，預設使用內建樣板")
+    parser.add_argument("--no-gestures", action="store_true", help="不辨識手勢")
+    args = parser.parse_args()
+    if args.replay:
+        args.headless = True
+    
     try:
         # 啟動 MQTT 訂閱者線程
         subscriber_thread = threading.Thread(target=mqtt_subscriber)
@@ -403,10 +565,19 @@ if __name__ == "__main__":
         subscriber_thread.start()
 
         # 啟動主程序
-        hand_camera()
+        if args.replay:
+            replay_hands(args.replay, args.speed, args.loop, args.payload_format,
+                         not args.no_gestures, args.gestures)
+        else:
+            hand_camera(headless=args.headless, payload_format=args.payload_format, record_path=args.record,
+                        backend=args.backend, model_path=args.model, target_fps=args.target_fps,
+                        gestures=not args.no_gestures, gesture_library=args.gestures)
     except KeyboardInterrupt:
         print("\n程式結束")
     except Exception as e:
         print(f"發生錯誤: {str(e)}")
     finally:
-        cv2.destroyAllWindows()
+        # 送出佇列中剩餘的訊息並關閉 MQTT 連線
+        get_publisher().stop()
+        if not args.headless:
+            cv2.destroyAllWindows()
\ No newline at end of file
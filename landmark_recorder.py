@@ -0,0 +1,192 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from hand_angles import NUM_LANDMARKS
+
+# 關鍵點錄製格式：一個資料夾，每個欄位一個以 np.memmap 存取的二進位檔，
+# 另有 meta.json 記錄幀數與參數。寫入時以區塊為單位預先配置空間，
+# 關閉時截斷到實際幀數。
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+
+# 左右手編碼：-1 表示該位置沒有手
+HANDEDNESS_LABELS = {"Left": 0, "Right": 1}
+HANDEDNESS_NAMES = {value: key for key, value in HANDEDNESS_LABELS.items()}
+
+def _columns(max_hands):
+    """各欄位的 (檔名, dtype, 每幀形狀)"""
+    return {
+        "timestamp": ("timestamp.f64", np.float64, ()),
+        "hand_count": ("hand_count.u8", np.uint8, ()),
+        "landmarks": ("landmarks.f32", np.float32, (max_hands, NUM_LANDMARKS, 3)),
+        "handedness": ("handedness.i8", np.int8, (max_hands,)),
+        "score": ("score.f32", np.float32, (max_hands,)),
+    }
+
+def handedness_from_result(result):
+    """從 hands.process() 的結果取出 [(label, score), ...]"""
+    if not result.multi_handedness:
+        return []
+    return [(h.classification[0].label, h.classification[0].score) for h in result.multi_handedness]
+
+class LandmarkRecorder:
+    """把每一幀的關鍵點、左右手與時間戳附加到錄製資料夾
+
+    Args:
+        path: 錄製資料夾路徑（不存在時建立）
+        max_hands: 每幀最多記錄的手數
+        image_size: 原始畫面大小 (width, height)，重播時用於角度計算
+        chunk_frames: 每次擴充檔案時預先配置的幀數
+    """
+
+    def __init__(self, path, max_hands=2, image_size=None, chunk_frames=4096):
+        self.path = path
+        self.max_hands = max_hands
+        self.image_size = image_size
+        self.chunk_frames = chunk_frames
+        self.count = 0
+        self._capacity = 0
+        self._columns = _columns(max_hands)
+        self._maps = {}
+        os.makedirs(path, exist_ok=True)
+        self._grow(chunk_frames)
+
+    def _grow(self, capacity):
+        self.flush()
+        self._maps = {}
+        for name, (filename, dtype, shape) in self._columns.items():
+            filepath = os.path.join(self.path, filename)
+            row_bytes = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+            with open(filepath, "ab") as f:
+                f.truncate(capacity * row_bytes)
+            self._maps[name] = np.memmap(filepath, dtype=dtype, mode="r+", shape=(capacity,) + shape)
+        self._capacity = capacity
+
+    def append(self, timestamp, points, handedness=()):
+        """附加一幀
+
+        Args:
+            timestamp: 擷取時間（秒）
+            points: (hands, 21, 3) 關鍵點陣列，沒有手時為空陣列
+            handedness: [(label, score), ...]，label 為 "Left" / "Right"
+        """
+        if self.count >= self._capacity:
+            self._grow(self._capacity + self.chunk_frames)
+        i = self.count
+        hands = min(len(points), self.max_hands)
+        maps = self._maps
+        maps["timestamp"][i] = timestamp
+        maps["hand_count"][i] = hands
+        maps["landmarks"][i] = 0
+        maps["handedness"][i] = -1
+        maps["score"][i] = 0
+        if hands:
+            maps["landmarks"][i, :hands] = points[:hands]
+            for h, (label, score) in enumerate(list(handedness)[:hands]):
+                maps["handedness"][i, h] = HANDEDNESS_LABELS.get(label, -1)
+                maps["score"][i, h] = score
+        self.count += 1
+
+    def append_result(self, result, timestamp, points=None):
+        """附加 hands.process() 的結果，points 已計算過時可直接傳入"""
+        if points is None:
+            from hand_angles import landmarks_to_array
+            points = landmarks_to_array(result.multi_hand_landmarks)
+        self.append(timestamp, points, handedness_from_result(result))
+
+    def _write_meta(self):
+        meta = {
+            "version": FORMAT_VERSION,
+            "frames": self.count,
+            "max_hands": self.max_hands,
+            "image_size": list(self.image_size) if self.image_size else None,
+        }
+        with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def flush(self):
+        """把資料寫回磁碟並更新 meta.json"""
+        for column in self._maps.values():
+            column.flush()
+        if self._maps:
+            self._write_meta()
+
+    def close(self):
+        """截斷預先配置但未使用的空間"""
+        self.flush()
+        self._maps = {}
+        for filename, dtype, shape in self._columns.values():
+            row_bytes = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+            with open(os.path.join(self.path, filename), "r+b") as f:
+                f.truncate(self.count * row_bytes)
+        self._write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class LandmarkRecording:
+    """以唯讀 memmap 開啟錄製資料夾，不需要把整份錄製載入記憶體"""
+
+    def __init__(self, path):
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"不支援的錄製格式版本: {meta['version']}")
+        self.path = path
+        self.frames = meta["frames"]
+        self.max_hands = meta["max_hands"]
+        self.image_size = tuple(meta["image_size"]) if meta["image_size"] else None
+        for name, (filename, dtype, shape) in _columns(self.max_hands).items():
+            if self.frames:
+                column = np.memmap(os.path.join(path, filename), dtype=dtype, mode="r",
+                                   shape=(self.frames,) + shape)
+            else:
+                column = np.empty((0,) + shape, dtype=dtype)
+            setattr(self, name, column)
+
+    def __len__(self):
+        return self.frames
+
+    def frame(self, index):
+        """回傳 (timestamp, points, handedness)，points 形狀為 (hands, 21, 3)"""
+        hands = int(self.hand_count[index])
+        handedness = [(HANDEDNESS_NAMES.get(int(self.handedness[index, h]), "Unknown"), float(self.score[index, h]))
+                      for h in range(hands)]
+        return float(self.timestamp[index]), np.array(self.landmarks[index, :hands]), handedness
+
+class ReplaySource:
+    """依錄製時的時間間隔重播關鍵點
+
+    Args:
+        recording: LandmarkRecording
+        speed: 播放速度倍率，1.0 為即時，0 表示不等待（最快速度）
+        loop: 播放完畢後是否從頭開始
+    """
+
+    def __init__(self, recording, speed=1.0, loop=False):
+        self.recording = recording
+        self.speed = speed
+        self.loop = loop
+
+    def __iter__(self):
+        recording = self.recording
+        if len(recording) == 0:
+            return
+        while True:
+            start_wall = time.perf_counter()
+            start_recorded = float(recording.timestamp[0])
+            for index in range(len(recording)):
+                timestamp, points, handedness = recording.frame(index)
+                if self.speed > 0:
+                    delay = (timestamp - start_recorded) / self.speed - (time.perf_counter() - start_wall)
+                    if delay > 0:
+                        time.sleep(delay)
+                yield timestamp, points, handedness
+            if not self.loop:
+                break
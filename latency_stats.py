@@ -0,0 +1,155 @@
+import json
+import math
+import time
+
+# 延遲統計：接收端用手部數據中的時間戳計算各階段延遲，並定期發送到統計主題。
+# 跨機器的單向延遲需要發送端與接收端的時鐘同步（例如啟用 NTP）。
+
+STATS_TOPIC = "hand_tracking/stats/latency"
+
+# 各階段的名稱與計算方式（起點, 終點），時間戳鍵值見 hand_protocol.TRACE_FIELDS
+LATENCY_STAGES = {
+    "queue": ("capture_time", "inference_start"),        # 擷取後等待推論
+    "inference": ("inference_start", "inference_end"),   # MediaPipe 推論
+    "process": ("inference_end", "timestamp"),           # 角度計算與發送排隊
+    "network": ("timestamp", "receive_time"),            # broker 與網路傳輸
+    "end_to_end": ("capture_time", "receive_time"),      # 擷取到接收
+}
+
+class RollingHistogram:
+    """以對數刻度分桶的滾動直方圖，記憶體用量固定
+
+    最近 window 秒的數據分成 slots 段，每段有自己的分桶計數，過期的段會被清空，
+    因此不需要保存每一筆數據。
+
+    Args:
+        window: 統計的時間範圍（秒）
+        slots: 時間範圍分成幾段
+        min_ms: 最小可分辨的值（毫秒），更小的值歸入第一個桶
+        max_ms: 最大值（毫秒），更大的值歸入最後一個桶
+        buckets_per_decade: 每 10 倍範圍的分桶數
+    """
+
+    def __init__(self, window=60.0, slots=6, min_ms=0.1, max_ms=60000.0, buckets_per_decade=20):
+        self.slot_duration = window / slots
+        self.min_ms = min_ms
+        self.buckets_per_decade = buckets_per_decade
+        self._log_min = math.log10(min_ms)
+        self.num_buckets = int(math.ceil((math.log10(max_ms) - self._log_min) * buckets_per_decade)) + 1
+        self._counts = [[0] * self.num_buckets for _ in range(slots)]
+        self._slot_ids = [None] * slots
+
+    def _bucket(self, value_ms):
+        if value_ms <= self.min_ms:
+            return 0
+        index = int((math.log10(value_ms) - self._log_min) * self.buckets_per_decade)
+        return min(index, self.num_buckets - 1)
+
+    def _bucket_value(self, index):
+        """桶的代表值（上下界的幾何平均）"""
+        return 10 ** (self._log_min + (index + 0.5) / self.buckets_per_decade)
+
+    def _slot(self, now):
+        slot_id = int(now / self.slot_duration)
+        index = slot_id % len(self._counts)
+        if self._slot_ids[index] != slot_id:
+            self._counts[index] = [0] * self.num_buckets
+            self._slot_ids[index] = slot_id
+        return index
+
+    def add(self, value_ms, now=None):
+        now = time.time() if now is None else now
+        self._counts[self._slot(now)][self._bucket(value_ms)] += 1
+
+    def _merged(self, now):
+        current = int(now / self.slot_duration)
+        merged = [0] * self.num_buckets
+        for slot_id, counts in zip(self._slot_ids, self._counts):
+            if slot_id is not None and current - slot_id < len(self._counts):
+                for i, count in enumerate(counts):
+                    merged[i] += count
+        return merged
+
+    def summary(self, percentiles=(50, 95, 99), now=None):
+        """回傳 count 與各百分位數（毫秒）"""
+        now = time.time() if now is None else now
+        merged = self._merged(now)
+        total = sum(merged)
+        result = {"count": total}
+        for p in percentiles:
+            result[f"p{p}_ms"] = None
+            if total == 0:
+                continue
+            target = total * p / 100
+            cumulative = 0
+            for index, count in enumerate(merged):
+                cumulative += count
+                if cumulative >= target:
+                    result[f"p{p}_ms"] = round(self._bucket_value(index), 3)
+                    break
+        return result
+
+class LatencyTracker:
+    """記錄每筆手部數據的各階段延遲與遺失的序號
+
+    Args:
+        name: 接收端名稱，用於統計主題
+        publish_interval: 發送統計數據的間隔（秒）
+    """
+
+    def __init__(self, name, publish_interval=10.0, window=60.0):
+        self.name = name
+        self.publish_interval = publish_interval
+        self.histograms = {stage: RollingHistogram(window=window) for stage in LATENCY_STAGES}
+        self.received = 0
+        self.lost = 0
+        self._last_seq = None
+        self._last_publish = time.time()
+
+    def record(self, data, receive_time=None):
+        """記錄一筆已解碼的手部數據，回傳本筆各階段延遲（毫秒）"""
+        receive_time = time.time() if receive_time is None else receive_time
+        self.received += 1
+
+        seq = data.get("seq")
+        if seq is not None:
+            if self._last_seq is not None and seq > self._last_seq + 1:
+                self.lost += seq - self._last_seq - 1
+            self._last_seq = seq
+
+        times = dict(data.get("trace") or {})
+        times["receive_time"] = receive_time
+        if "timestamp" in data:
+            times["timestamp"] = data["timestamp"]
+
+        latencies = {}
+        for stage, (start, end) in LATENCY_STAGES.items():
+            if start in times and end in times:
+                value = (times[end] - times[start]) * 1000
+                latencies[stage] = value
+                # 時鐘不同步可能造成負值，仍記錄在最小的桶以保留筆數
+                self.histograms[stage].add(max(value, 0.0), receive_time)
+        return latencies
+
+    def snapshot(self):
+        now = time.time()
+        return {
+            "receiver": self.name,
+            "timestamp": now,
+            "received": self.received,
+            "lost": self.lost,
+            "stages": {stage: histogram.summary(now=now) for stage, histogram in self.histograms.items()},
+        }
+
+    def maybe_publish(self, client, topic=STATS_TOPIC):
+        """到了發送間隔時把統計數據發送到 <topic>/<name>，回傳是否有發送"""
+        now = time.time()
+        if now - self._last_publish < self.publish_interval:
+            return False
+        self._last_publish = now
+        client.publish(f"{topic}/{self.name}", json.dumps(self.snapshot()))
+        return True
+
+def format_latency(latencies):
+    """把各階段延遲轉換為單行文字"""
+    return " ".join(f"{stage}:{value:.1f}ms" for stage, value in latencies.items())
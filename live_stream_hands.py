@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import OrderedDict
+
+import mediapipe as mp
+from mediapipe.framework.formats import classification_pb2, landmark_pb2
+from mediapipe.tasks.python import BaseOptions, vision
+
+class TasksResult:
+    """HandLandmarker 的結果，屬性與 hands.process() 的回傳值相同，繪圖與角度計算不需要修改"""
+
+    def __init__(self, multi_hand_landmarks, multi_handedness):
+        self.multi_hand_landmarks = multi_hand_landmarks
+        self.multi_handedness = multi_handedness
+
+    @classmethod
+    def from_tasks(cls, result):
+        if not result.hand_landmarks:
+            return cls(None, None)
+        landmarks = [
+            landmark_pb2.NormalizedLandmarkList(landmark=[
+                landmark_pb2.NormalizedLandmark(x=lm.x, y=lm.y, z=lm.z) for lm in hand
+            ])
+            for hand in result.hand_landmarks
+        ]
+        handedness = [
+            classification_pb2.ClassificationList(classification=[
+                classification_pb2.Classification(index=c.index, label=c.category_name, score=c.score)
+                for c in categories
+            ])
+            for categories in result.handedness
+        ]
+        return cls(landmarks, handedness)
+
+class LiveStreamHands:
+    """以 MediaPipe Tasks 的 HandLandmarker（LIVE_STREAM 模式）非同步推論
+
+    submit() 只把畫面交給 MediaPipe 就返回，推論在 MediaPipe 自己的執行緒進行，
+    完成後以 on_result(result, context) 回呼，擷取與畫面繪製不需要等待推論。
+    等待結果的畫面達到 max_pending 筆時不再送出新畫面（呼叫端可先以 busy()
+    判斷，省下色彩轉換）：detect_async() 在計算圖忙碌時會持有 GIL 等待，
+    而結果回呼需要 GIL，連續送出會互相等待。MediaPipe 若仍略過某幀（不會回呼），
+    收到較新的結果時較舊的等待項目一併移除；等待超過 pending_timeout 秒的項目
+    也視為已略過，避免一直沒有回呼時永遠不再送出畫面。
+
+    HandLandmarker 在 LIVE_STREAM 模式會以上一幀的關鍵點追蹤手部，只在追蹤
+    失敗時才執行手掌偵測，作用與 RoiHandTracker 相同。
+
+    Args:
+        model_path: hand_landmarker.task 模型檔路徑
+        max_num_hands: 最多偵測的手數
+        min_detection_confidence: 手掌偵測的最低信心
+        min_presence_confidence: 追蹤時判斷手仍在畫面中的最低信心
+        min_tracking_confidence: 追蹤成功的最低信心，低於此值時重新偵測
+        max_pending: 同時等待結果的畫面數上限
+        pending_timeout: 等待結果超過此秒數的畫面視為已被略過
+    """
+
+    def __init__(self, model_path, max_num_hands=2, min_detection_confidence=0.5,
+                 min_presence_confidence=0.5, min_tracking_confidence=0.5, max_pending=1, pending_timeout=1.0):
+        self.max_pending = max_pending
+        self.pending_timeout = pending_timeout
+        self.on_result = None  # 回呼函數 (TasksResult, context)，在 MediaPipe 的執行緒上執行
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()  # timestamp_ms -> (context, 送出時間)
+        self._last_timestamp = -1
+
+        # 統計資訊
+        self.submitted = 0
+        self.completed = 0
+        self.skipped = 0  # MediaPipe 忙碌而略過（或逾時沒有回呼）的畫面
+        self.rejected = 0  # 等待中的畫面已達上限而未送出的畫面
+
+        options = vision.HandLandmarkerOptions(
+            base_options=BaseOptions(model_asset_path=model_path),
+            running_mode=vision.RunningMode.LIVE_STREAM,
+            num_hands=max_num_hands,
+            min_hand_detection_confidence=min_detection_confidence,
+            min_hand_presence_confidence=min_presence_confidence,
+            min_tracking_confidence=min_tracking_confidence,
+            result_callback=self._on_result,
+        )
+        self.landmarker = vision.HandLandmarker.create_from_options(options)
+
+    def _on_result(self, result, image, timestamp_ms):
+        with self._lock:
+            context = self._pending.get(timestamp_ms, (None, None))[0]
+        if self.on_result is not None:
+            self.on_result(TasksResult.from_tasks(result), context)
+        # 回呼執行完才移除等待項目，避免回呼尚未返回時就送出下一幀
+        with self._lock:
+            self._pending.pop(timestamp_ms, None)
+            # 比這個結果更早送出卻沒有回呼的畫面已被 MediaPipe 略過
+            while self._pending and next(iter(self._pending)) < timestamp_ms:
+                self._pending.popitem(last=False)
+                self.skipped += 1
+            self.completed += 1
+
+    def _expire_pending(self):
+        """移除等待超過 pending_timeout 秒的畫面（呼叫前需持有 _lock）"""
+        now = time.monotonic()
+        while self._pending:
+            _, submit_time = next(iter(self._pending.values()))
+            if now - submit_time < self.pending_timeout:
+                break
+            self._pending.popitem(last=False)
+            self.skipped += 1
+
+    def busy(self):
+        """等待結果的畫面是否已達上限"""
+        with self._lock:
+            self._expire_pending()
+            return len(self._pending) >= self.max_pending
+
+    def submit(self, frame_rgb, timestamp, context=None):
+        """送出一幀 RGB 畫面，不等待推論結果
+
+        Args:
+            frame_rgb: RGB 畫面
+            timestamp: 擷取時間（秒），MediaPipe 要求嚴格遞增，相同或倒退時自動加 1 毫秒
+            context: 回呼時一併傳回的資料（例如管線的 packet）
+
+        Returns:
+            bool: 是否已送出
+        """
+        with self._lock:
+            self._expire_pending()
+            if len(self._pending) >= self.max_pending:
+                self.rejected += 1
+                return False
+            timestamp_ms = max(int(timestamp * 1000), self._last_timestamp + 1)
+            self._last_timestamp = timestamp_ms
+            self._pending[timestamp_ms] = (context, time.monotonic())
+            self.submitted += 1
+        image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
+        self.landmarker.detect_async(image, timestamp_ms)
+        return True
+
+    def warmup(self, frame_rgb, timeout=5.0):
+        """送出一幀並等待結果，讓第一幀真正的畫面不需要等待計算圖初始化"""
+        done = threading.Event()
+        callback, self.on_result = self.on_result, lambda result, context: done.set()
+        try:
+            self.submit(frame_rgb, time.time())
+            if done.wait(timeout):
+                return True
+            # 預熱逾時：清除等待項目，否則之後的畫面會一直被視為忙碌
+            with self._lock:
+                self.skipped += len(self._pending)
+                self._pending.clear()
+            return False
+        finally:
+            self.on_result = callback
+
+    def close(self):
+        self.landmarker.close()
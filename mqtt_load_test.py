@@ -0,0 +1,380 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from Mqtt import topic_hand
+from benchmark import summarize, synthetic_landmarks
+from hand_angles import compute_finger_angles, build_hand_payload
+from hand_protocol import PAYLOAD_FORMATS, DeltaDecoder, DeltaEncoder, encode_hand_frame
+from mqtt_test_simple import BROKER, PORT
+
+# 負載測試：以 mqtt_test_simple.MQTTTest 的發布者/訂閱者為基礎，同時啟動
+# N 個發布者與 M 個訂閱者，以設定的頻率與 QoS 發送手部數據，統計實際吞吐量、
+# 遺失率、亂序與延遲分布，用來評估 broker 與接收端能承受的攝像頭數量。
+# 每個發布者發送到 <prefix>/<編號>，訂閱者訂閱 <prefix>/#，
+# 延遲以數據中的時間戳計算，發布者與訂閱者在不同主機時需要時鐘同步。
+
+LOAD_TOPIC = f"{topic_hand}/load"
+
+class LoadPublisher:
+    """以固定頻率發送手部數據的發布者
+
+    Args:
+        index: 發布者編號，決定發送的子主題
+        all_angles: 預先計算的角度陣列，依序循環使用
+        rate: 每秒發送的訊息數
+        qos: MQTT QoS 等級
+        payload_format: 數據格式，見 hand_protocol.PAYLOAD_FORMATS
+        topic_prefix: 測試主題前綴
+        max_inflight: QoS 1/2 尚未確認的最大訊息數
+    """
+
+    def __init__(self, index, all_angles, rate, qos=0, payload_format="json", topic_prefix=LOAD_TOPIC,
+                 max_inflight=100):
+        self.index = index
+        self.topic = f"{topic_prefix}/{index}"
+        self.rate = rate
+        self.qos = qos
+        self.payload_format = payload_format
+        self._templates = [build_hand_payload(angles, 0.0) for angles in all_angles] \
+            if payload_format == "json" else all_angles
+        self._delta = DeltaEncoder() if payload_format == "delta" else None
+
+        self.client = mqtt.Client(f"load-pub-{os.getpid()}-{index}")
+        self.client.max_inflight_messages_set(max_inflight)
+        self.connected = threading.Event()
+        self.client.on_connect = self.on_connect
+
+        # 統計資訊
+        self.sent = 0
+        self.bytes = 0
+        self.errors = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            self.connected.set()
+        else:
+            print(f"❌ 發布者 {self.index} 連接失敗 (錯誤碼: {rc})", file=sys.stderr)
+
+    def connect(self, broker, port):
+        self.client.connect(broker, port)
+        self.client.loop_start()
+
+    def _encode(self, seq, timestamp):
+        template = self._templates[seq % len(self._templates)]
+        if self.payload_format == "json":
+            template["timestamp"] = timestamp
+            template["seq"] = seq
+            return json.dumps(template)
+        if self._delta is not None:
+            return self._delta.encode(template, seq, timestamp)
+        return encode_hand_frame(template, seq, timestamp, compact=self.payload_format == "binary_u8")
+
+    def run(self, duration, stop_event):
+        """發送 duration 秒，落後超過一個間隔時略過錯過的時間點而不是一次補發"""
+        interval = 1.0 / self.rate
+        start = time.perf_counter()
+        next_time = start
+        seq = 0
+        while not stop_event.is_set():
+            now = time.perf_counter()
+            if now - start >= duration:
+                break
+            delay = next_time - now
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -interval:
+                missed = int(-delay / interval)
+                self.skipped += missed
+                next_time += missed * interval
+            payload = self._encode(seq, time.time())
+            info = self.client.publish(self.topic, payload, qos=self.qos)
+            if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                self.sent += 1
+                self.bytes += len(payload)
+            else:
+                self.errors += 1
+            seq += 1
+            next_time += interval
+        self.elapsed = time.perf_counter() - start
+
+    def stop(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+class _SequenceTracker:
+    """追蹤單一發布者的序號，記憶體用量只與尚未收到的序號數量有關"""
+
+    def __init__(self):
+        self.max_seq = -1
+        self.missing = set()
+        self.unique = 0
+        self.reordered = 0
+        self.duplicates = 0
+
+    def add(self, seq):
+        if seq > self.max_seq:
+            self.missing.update(range(self.max_seq + 1, seq))
+            self.max_seq = seq
+            self.unique += 1
+        elif seq in self.missing:
+            # 比已收到的序號更早發送，但較晚到達
+            self.missing.discard(seq)
+            self.reordered += 1
+            self.unique += 1
+        else:
+            self.duplicates += 1
+
+class LoadSubscriber:
+    """訂閱所有發布者並記錄每筆訊息的延遲與序號"""
+
+    def __init__(self, index, qos=0, topic_prefix=LOAD_TOPIC):
+        self.index = index
+        self.qos = qos
+        self.topic_prefix = topic_prefix
+        self.client = mqtt.Client(f"load-sub-{os.getpid()}-{index}")
+        self.client.on_connect = self.on_connect
+        self.client.on_subscribe = self.on_subscribe
+        self.client.on_message = self.on_message
+        self.subscribed = threading.Event()
+        self.decoder = DeltaDecoder()  # 各發布者的主題各自保存差量格式的狀態
+
+        # 統計資訊
+        self.received = 0
+        self.invalid = 0
+        self.undecodable = 0
+        self.latencies = []
+        self.trackers = {}
+        self.first_receive = None
+        self.last_receive = None
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe(f"{self.topic_prefix}/#", qos=self.qos)
+        else:
+            print(f"❌ 訂閱者 {self.index} 連接失敗 (錯誤碼: {rc})", file=sys.stderr)
+
+    def on_subscribe(self, client, userdata, mid, granted_qos):
+        self.subscribed.set()
+
+    def on_message(self, client, userdata, msg):
+        receive_time = time.time()
+        try:
+            data = self.decoder.decode_payload(msg.payload, msg.topic)
+        except ValueError:
+            self.invalid += 1
+            return
+        if data is None:
+            # 差量格式：比已收到的訊息舊，或尚未收到關鍵幀
+            self.undecodable += 1
+            return
+        timestamp = data.get("timestamp") if isinstance(data, dict) else None
+        if timestamp is None:
+            # 格式正確但缺少時間戳記的訊息無法計算延遲，視為無效
+            self.invalid += 1
+            return
+        self.received += 1
+        if self.first_receive is None:
+            self.first_receive = receive_time
+        self.last_receive = receive_time
+        self.latencies.append(receive_time - timestamp)
+
+        publisher = msg.topic.rsplit("/", 1)[-1]
+        tracker = self.trackers.get(publisher)
+        if tracker is None:
+            tracker = self.trackers[publisher] = _SequenceTracker()
+        tracker.add(data.get("seq", 0))
+
+    def connect(self, broker, port):
+        self.client.connect(broker, port)
+        self.client.loop_start()
+
+    def stop(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def report(self, expected):
+        unique = sum(t.unique for t in self.trackers.values())
+        lost = max(expected - unique, 0)
+        elapsed = (self.last_receive - self.first_receive) if self.received > 1 else 0.0
+        return {
+            "received": self.received,
+            "unique": unique,
+            "duplicates": sum(t.duplicates for t in self.trackers.values()),
+            "reordered": sum(t.reordered for t in self.trackers.values()),
+            "invalid": self.invalid,
+            "undecodable": self.undecodable,
+            "lost": lost,
+            "drop_rate": lost / expected if expected else 0.0,
+            "throughput_per_s": self.received / elapsed if elapsed > 0 else 0.0,
+            "latency": summarize(self.latencies),
+        }
+
+class MQTTLoadTest:
+    """同時執行多個發布者與訂閱者的負載測試
+
+    Args:
+        broker, port: MQTT broker 位址
+        publishers: 發布者數量（相當於攝像頭數量）
+        subscribers: 訂閱者數量（相當於接收端數量）
+        rate: 每個發布者每秒發送的訊息數
+        qos: 發送與訂閱的 QoS 等級
+        payload_format: 數據格式
+        topic_prefix: 測試主題前綴
+        max_inflight: 每個發布者 QoS 1/2 尚未確認的最大訊息數
+        frames: 合成數據的幀數，發送時循環使用
+    """
+
+    def __init__(self, broker=BROKER, port=PORT, publishers=1, subscribers=1, rate=30.0, qos=0,
+                 payload_format="json", topic_prefix=LOAD_TOPIC, max_inflight=100, frames=300):
+        self.broker = broker
+        self.port = port
+        self.rate = rate
+        self.qos = qos
+        self.payload_format = payload_format
+        all_angles = [compute_finger_angles(p, image_size=(640, 480))[0] for p in synthetic_landmarks(frames)]
+        self.publishers = [LoadPublisher(i, all_angles, rate, qos, payload_format, topic_prefix, max_inflight)
+                           for i in range(publishers)]
+        self.subscribers = [LoadSubscriber(i, qos, topic_prefix) for i in range(subscribers)]
+        self._stop = threading.Event()
+
+    def _wait(self, events, timeout):
+        deadline = time.time() + timeout
+        for event in events:
+            if not event.wait(max(deadline - time.time(), 0)):
+                raise ConnectionError(f"無法在 {timeout} 秒內連接到 MQTT broker {self.broker}:{self.port}")
+
+    def _drain(self, expected, timeout):
+        """等待訂閱者收完或接收數量不再增加"""
+        deadline = time.time() + timeout
+        last_total = -1
+        while time.time() < deadline:
+            total = sum(s.received for s in self.subscribers)
+            if total >= expected * len(self.subscribers) or total == last_total:
+                return
+            last_total = total
+            time.sleep(0.5)
+
+    def run(self, duration=10.0, connect_timeout=10.0, drain_timeout=10.0):
+        """執行負載測試並回傳統計結果"""
+        print("🔄 正在連接到 MQTT...", file=sys.stderr)
+        for subscriber in self.subscribers:
+            subscriber.connect(self.broker, self.port)
+        for publisher in self.publishers:
+            publisher.connect(self.broker, self.port)
+        try:
+            self._wait([s.subscribed for s in self.subscribers] + [p.connected for p in self.publishers],
+                       connect_timeout)
+            print(f"📤 {len(self.publishers)} 個發布者 × {self.rate} Hz，{len(self.subscribers)} 個訂閱者，"
+                  f"QoS {self.qos}，{duration} 秒", file=sys.stderr)
+
+            threads = [threading.Thread(target=p.run, args=(duration, self._stop), daemon=True)
+                       for p in self.publishers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            expected = sum(p.sent for p in self.publishers)
+            self._drain(expected, drain_timeout)
+        finally:
+            self._stop.set()
+            for client in self.publishers + self.subscribers:
+                client.stop()
+        return self.report(duration)
+
+    def stop(self):
+        self._stop.set()
+
+    def report(self, duration):
+        expected = sum(p.sent for p in self.publishers)
+        elapsed = max((p.elapsed for p in self.publishers), default=0.0)
+        subscribers = [s.report(expected) for s in self.subscribers]
+        all_latencies = [value for s in self.subscribers for value in s.latencies]
+        received = sum(s["unique"] for s in subscribers)
+        expected_total = expected * len(subscribers)
+        return {
+            "timestamp": time.time(),
+            "config": {
+                "broker": f"{self.broker}:{self.port}",
+                "publishers": len(self.publishers),
+                "subscribers": len(self.subscribers),
+                "rate": self.rate,
+                "qos": self.qos,
+                "format": self.payload_format,
+                "duration": duration,
+            },
+            "publish": {
+                "target_per_s": self.rate * len(self.publishers),
+                "sent": expected,
+                "errors": sum(p.errors for p in self.publishers),
+                "skipped": sum(p.skipped for p in self.publishers),
+                "throughput_per_s": expected / elapsed if elapsed > 0 else 0.0,
+                "bytes_per_s": sum(p.bytes for p in self.publishers) / elapsed if elapsed > 0 else 0.0,
+            },
+            "receive": {
+                "expected": expected_total,
+                "unique": received,
+                "duplicates": sum(s["duplicates"] for s in subscribers),
+                "reordered": sum(s["reordered"] for s in subscribers),
+                "drop_rate": 1 - received / expected_total if expected_total else 0.0,
+                "throughput_per_s": sum(s["throughput_per_s"] for s in subscribers),
+                "latency": summarize(all_latencies),
+            },
+            "subscribers": subscribers,
+        }
+
+def format_report(results):
+    """把結果轉換為簡短的文字摘要"""
+    publish, receive = results["publish"], results["receive"]
+    latency = receive["latency"]
+    lines = [
+        f"📤 發送: {publish['sent']} 筆 ({publish['throughput_per_s']:.0f}/s，目標 {publish['target_per_s']:.0f}/s)"
+        f" {publish['bytes_per_s'] / 1024:.1f} KB/s 錯誤 {publish['errors']} 略過 {publish['skipped']}",
+        f"📩 接收: {receive['unique']}/{receive['expected']} 筆 ({receive['throughput_per_s']:.0f}/s)"
+        f" 遺失 {receive['drop_rate']:.2%} 亂序 {receive['reordered']} 重複 {receive['duplicates']}",
+    ]
+    if latency["count"]:
+        lines.append(f"⏱️ 延遲: p50 {latency['p50_ms']:.1f}ms p95 {latency['p95_ms']:.1f}ms "
+                     f"p99 {latency['p99_ms']:.1f}ms max {latency['max_ms']:.1f}ms")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT 多客戶端負載測試")
+    parser.add_argument("--broker", default=f"{BROKER}:{PORT}", help="MQTT broker（host[:port]）")
+    parser.add_argument("--publishers", type=int, default=4, help="發布者數量")
+    parser.add_argument("--subscribers", type=int, default=1, help="訂閱者數量")
+    parser.add_argument("--rate", type=float, default=30.0, help="每個發布者每秒發送的訊息數")
+    parser.add_argument("--qos", type=int, choices=(0, 1, 2), default=0, help="MQTT QoS 等級")
+    parser.add_argument("--format", choices=PAYLOAD_FORMATS, default="json", help="MQTT 數據格式")
+    parser.add_argument("--duration", type=float, default=10.0, help="發送時間（秒）")
+    parser.add_argument("--inflight", type=int, default=100, help="QoS 1/2 尚未確認的最大訊息數")
+    parser.add_argument("--topic", default=LOAD_TOPIC, help="測試主題前綴")
+    parser.add_argument("--output", help="結果輸出的 JSON 檔案，預設輸出到標準輸出")
+    args = parser.parse_args()
+
+    host, _, port = args.broker.partition(":")
+    load_test = MQTTLoadTest(host, int(port or PORT), args.publishers, args.subscribers, args.rate, args.qos,
+                             args.format, args.topic, args.inflight)
+    try:
+        results = load_test.run(args.duration)
+    except KeyboardInterrupt:
+        print("\n🛑 程式結束", file=sys.stderr)
+        return
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    print(format_report(results), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
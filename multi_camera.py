@@ -0,0 +1,323 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from Mqtt import get_publisher, topic_hand
+from camera_capture import LatestFrameCapture, MjpegCapture
+from hand_angles import landmarks_to_array, compute_finger_angles, encode_hand_payload
+from hand_protocol import PAYLOAD_FORMATS, RESYNC_SUBTOPIC, DeltaEncoder, parse_resync_request
+
+# 設置日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 共享記憶體中的畫面大小，不同解析度的攝像頭會先縮放到這個大小
+FRAME_WIDTH = 640
+FRAME_HEIGHT = 480
+SLOTS_PER_CAMERA = 3  # 每個攝像頭的共享畫面格數
+STATS_INTERVAL = 5.0  # 記錄統計資訊的間隔（秒）
+
+class SharedFrameBuffer:
+    """存放在 multiprocessing.shared_memory 中的多格畫面緩衝區
+
+    擷取端把畫面寫入其中一格，推論行程只需要收到格子編號就能讀取畫面，
+    不必把整張 ndarray pickle 後經由佇列傳送。
+
+    Args:
+        slots: 畫面格數
+        shape: 每格畫面的形狀 (height, width, 3)
+        name: 既有共享記憶體的名稱，None 表示建立新的
+    """
+
+    def __init__(self, slots, shape, name=None):
+        self.slots = slots
+        self.shape = tuple(shape)
+        size = slots * int(np.prod(self.shape))
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            # 子行程與建立者共用 resource_tracker，只由建立者負責 unlink
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def spec(self):
+        """傳給其他行程重新連接用的 (name, slots, shape)"""
+        return self.name, self.slots, self.shape
+
+    def close(self):
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def _inference_worker(worker_id, task_queue, result_queue, buffer_specs, max_num_hands):
+    """推論行程：每個行程擁有自己的 MediaPipe Hands 實例"""
+    import mediapipe as mp
+
+    hands = mp.solutions.hands.Hands(
+        static_image_mode=False,
+        max_num_hands=max_num_hands,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+    buffers = {camera: SharedFrameBuffer(slots, shape, name) for camera, (name, slots, shape) in buffer_specs.items()}
+    result_queue.put(("ready", worker_id))
+
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            camera, slot, seq, capture_time = task
+            frame = buffers[camera].frames[slot]
+            # cvtColor 會產生新的陣列，推論時不再讀取共享格；
+            # 共享格在主行程收到這一幀的結果後才交還給擷取端（見 _result_loop）
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            inference_start = time.time()
+            result = hands.process(frame_rgb)
+            inference_end = time.time()
+
+            angles = None
+            if result.multi_hand_landmarks:
+                points = landmarks_to_array(result.multi_hand_landmarks)
+                angles = compute_finger_angles(points, image_size=(frame.shape[1], frame.shape[0]))
+            result_queue.put(("result", camera, slot, seq, capture_time, inference_start, inference_end, angles))
+    finally:
+        hands.close()
+        for buffer in buffers.values():
+            buffer.close()
+
+class MultiCameraTracker:
+    """同時追蹤多個攝像頭，以行程池進行 MediaPipe 推論
+
+    每個攝像頭由一個擷取執行緒讀取最新畫面並寫入共享記憶體，再把格子編號交給
+    推論行程。MediaPipe Hands 會利用前一幀做追蹤，因此同一個攝像頭固定交給同一個
+    推論行程；攝像頭數量不少於 CPU 核心數時，吞吐量會隨核心數增加。
+    結果與單攝像頭模式相同，以 payload_format 發送到 hand_tracking，每隻手的
+    hand_id 為 攝像頭編號 * max_num_hands + 畫面中的順序；JSON 格式另附 camera 名稱。
+
+    Args:
+        sources: 攝像頭來源列表（URL、影片路徑或本機攝像頭編號）
+        names: 各攝像頭名稱，用於日誌與 JSON 的 camera 欄位，預設為 camera0、camera1...
+        workers: 推論行程數量，預設為 CPU 核心數（不超過攝像頭數量）
+        publish_interval: 每個攝像頭最短的發送間隔（秒），0 表示每幀都發送
+        max_num_hands: 每個畫面最多追蹤的手數
+        payload_format: MQTT 數據格式，見 hand_protocol.PAYLOAD_FORMATS
+    """
+
+    def __init__(self, sources, names=None, workers=None, publish_interval=0.0, max_num_hands=2,
+                 payload_format="json"):
+        if payload_format not in PAYLOAD_FORMATS:
+            raise ValueError(f"不支援的數據格式: {payload_format}")
+        if not sources:
+            raise ValueError("至少需要一個攝像頭來源")
+        self.sources = list(sources)
+        self.names = list(names) if names else [f"camera{i}" for i in range(len(self.sources))]
+        self.workers = workers or min(os.cpu_count() or 1, len(self.sources))
+        self.publish_interval = publish_interval
+        self.max_num_hands = max_num_hands
+        self.payload_format = payload_format
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._running = threading.Event()
+        self._captures = []
+        self._buffers = []
+        self._free_slots = []
+        self._processes = []
+        self._task_queues = []
+        self._result_queue = None
+        self._threads = []
+        self._last_publish = [0.0] * len(self.sources)
+        # 所有攝像頭共用同一個主題，因此共用發送序號，接收端才能偵測遺失
+        self._publish_seq = 0
+        self._delta_encoder = DeltaEncoder() if payload_format == "delta" else None
+
+        # 統計資訊
+        self._stats_lock = threading.Lock()
+        self.processed = [0] * len(self.sources)
+        self.dropped = [0] * len(self.sources)
+        self.inference_time = [0.0] * len(self.sources)
+
+    def _open_source(self, source):
+        """開啟攝像頭並啟動背景擷取，HTTP 串流以 MjpegCapture 縮小解析度解碼"""
+        if str(source).startswith("http"):
+            try:
+                return MjpegCapture(source, target_size=(FRAME_WIDTH, FRAME_HEIGHT)).start()
+            except OSError as e:
+                raise RuntimeError(f"無法開啟攝像頭: {source} ({e})") from e
+        cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+        if not cap.isOpened():
+            raise RuntimeError(f"無法開啟攝像頭: {source}")
+        return LatestFrameCapture(cap).start()
+
+    def start(self):
+        shape = (FRAME_HEIGHT, FRAME_WIDTH, 3)
+        for _ in self.sources:
+            buffer = SharedFrameBuffer(SLOTS_PER_CAMERA, shape)
+            free_slots = queue.Queue()
+            for slot in range(SLOTS_PER_CAMERA):
+                free_slots.put(slot)
+            self._buffers.append(buffer)
+            self._free_slots.append(free_slots)
+
+        # 先啟動推論行程並等待模型載入完成
+        self._result_queue = self._ctx.Queue()
+        specs = {camera: buffer.spec() for camera, buffer in enumerate(self._buffers)}
+        for worker_id in range(self.workers):
+            task_queue = self._ctx.Queue()
+            process = self._ctx.Process(
+                target=_inference_worker,
+                args=(worker_id, task_queue, self._result_queue, specs, self.max_num_hands),
+                daemon=True,
+            )
+            process.start()
+            self._task_queues.append(task_queue)
+            self._processes.append(process)
+        for _ in range(self.workers):
+            self._result_queue.get()
+        logger.info(f"已啟動 {self.workers} 個推論行程")
+
+        self._running.set()
+        for camera, source in enumerate(self.sources):
+            capture = self._open_source(source)
+            self._captures.append(capture)
+            logger.info(f"✅ 已連接攝像頭 {self.names[camera]} ({source})")
+            thread = threading.Thread(target=self._feed_loop, args=(camera,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        thread = threading.Thread(target=self._result_loop, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def _feed_loop(self, camera):
+        capture = self._captures[camera]
+        buffer = self._buffers[camera]
+        task_queue = self._task_queues[camera % self.workers]
+        while self._running.is_set() and capture.isOpened():
+            frame, seq, capture_time = capture.read_latest()
+            if frame is None:
+                continue
+            try:
+                slot = self._free_slots[camera].get_nowait()
+            except queue.Empty:
+                # 推論行程忙碌中，丟棄這一幀
+                with self._stats_lock:
+                    self.dropped[camera] += 1
+                continue
+            target = buffer.frames[slot]
+            if frame.shape == target.shape:
+                np.copyto(target, frame)
+            else:
+                cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT), dst=target)
+            task_queue.put((camera, slot, seq, capture_time))
+
+    def _result_loop(self):
+        publisher = get_publisher()
+        if self._delta_encoder is not None:
+            encoder = self._delta_encoder
+            publisher.subscribe(f"{topic_hand}/{RESYNC_SUBTOPIC}",
+                                lambda payload: encoder.request_keyframe(parse_resync_request(payload)))
+        while self._running.is_set():
+            try:
+                message = self._result_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            _, camera, slot, seq, capture_time, inference_start, inference_end, angles = message
+            self._free_slots[camera].put(slot)
+            with self._stats_lock:
+                self.processed[camera] += 1
+                self.inference_time[camera] += inference_end - inference_start
+
+            now = time.time()
+            if angles is None or now - self._last_publish[camera] < self.publish_interval:
+                continue
+            trace = {
+                "capture_time": capture_time,
+                "inference_start": inference_start,
+                "inference_end": inference_end,
+            }
+            for index, hand_angles in enumerate(angles):
+                hand_id = camera * self.max_num_hands + index
+                payload = encode_hand_payload(self.payload_format, hand_angles, self._publish_seq, now, hand_id,
+                                              trace, self._delta_encoder, extra={"camera": self.names[camera]})
+                publisher.publish(payload)
+                self._publish_seq += 1
+            self._last_publish[camera] = now
+
+    def stats(self, reset=False):
+        """各攝像頭已處理與丟棄的畫面數、平均推論時間"""
+        with self._stats_lock:
+            data = {
+                name: {
+                    "processed": self.processed[i],
+                    "dropped": self.dropped[i],
+                    "avg_inference_ms": self.inference_time[i] / self.processed[i] * 1000 if self.processed[i] else 0.0,
+                }
+                for i, name in enumerate(self.names)
+            }
+            if reset:
+                self.processed = [0] * len(self.sources)
+                self.dropped = [0] * len(self.sources)
+                self.inference_time = [0.0] * len(self.sources)
+        return data
+
+    def is_running(self):
+        return self._running.is_set() and any(capture.isOpened() for capture in self._captures)
+
+    def stop(self):
+        self._running.clear()
+        for capture in self._captures:
+            capture.release()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        for task_queue in self._task_queues:
+            task_queue.put(None)
+        for process in self._processes:
+            process.join(timeout=5.0)
+            if process.is_alive():
+                process.terminate()
+        for buffer in self._buffers:
+            buffer.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="多攝像頭手部追蹤")
+    parser.add_argument("sources", nargs="+", help="攝像頭來源（URL、影片路徑或本機攝像頭編號）")
+    parser.add_argument("--names", nargs="+", help="各攝像頭名稱，用於日誌與 JSON 的 camera 欄位")
+    parser.add_argument("--workers", type=int, default=None, help="推論行程數量，預設為 CPU 核心數")
+    parser.add_argument("--publish-interval", type=float, default=0.0, help="每個攝像頭最短的發送間隔（秒）")
+    parser.add_argument("--payload-format", choices=PAYLOAD_FORMATS, default="json", help="MQTT 數據格式")
+    args = parser.parse_args()
+
+    tracker = MultiCameraTracker(args.sources, args.names, args.workers, args.publish_interval,
+                                 payload_format=args.payload_format)
+    tracker.start()
+    try:
+        while tracker.is_running():
+            time.sleep(STATS_INTERVAL)
+            for name, stats in tracker.stats(reset=True).items():
+                logger.info(f"{name}: {stats['processed'] / STATS_INTERVAL:.1f} FPS, "
+                            f"丟棄 {stats['dropped']}, 推論 {stats['avg_inference_ms']:.1f}ms")
+    except KeyboardInterrupt:
+        print("\n程式結束")
+    finally:
+        tracker.stop()
+        get_publisher().stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+
+import cv2
+import numpy as np
+from PIL import ImageFont, ImageDraw, Image
+
+# 支援中文的字型，依序尋找第一個存在的檔案，都找不到時使用 PIL 預設字型
+FONT_CANDIDATES = [
+    "C:/Windows/Fonts/msjh.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+]
+FONT_SIZE = 14
+
+# ASCII 文字使用 OpenCV 內建字型直接繪製
+CV_FONT = cv2.FONT_HERSHEY_SIMPLEX
+CV_FONT_SCALE = 0.45
+CV_FONT_THICKNESS = 1
+
+def load_font(size=FONT_SIZE):
+    """載入第一個可用的中文字型"""
+    for path in FONT_CANDIDATES:
+        if os.path.exists(path):
+            return ImageFont.truetype(path, size)
+    return ImageFont.load_default()
+
+class GlyphAtlas:
+    """中文等非 ASCII 文字的字形快取
+
+    每段文字只用 PIL 算繪一次成灰階遮罩，之後直接在 BGR 畫面上以遮罩著色，
+    不需要每一幀都把整張畫面轉成 PIL Image 再轉回來。
+    """
+
+    def __init__(self, font=None):
+        self.font = font or load_font()
+        self._cache = {}
+
+    def get(self, text):
+        """取得文字的遮罩 (bool 陣列)"""
+        mask = self._cache.get(text)
+        if mask is None:
+            left, top, right, bottom = self.font.getbbox(text)
+            width, height = max(right, 1), max(bottom, 1)
+            image = Image.new("L", (width, height), 0)
+            ImageDraw.Draw(image).text((0, 0), text, font=self.font, fill=255)
+            mask = np.array(image) > 127
+            self._cache[text] = mask
+        return mask
+
+def _split_runs(text):
+    """把文字切成連續的 ASCII 與非 ASCII 片段"""
+    runs = []
+    start = 0
+    for i in range(1, len(text) + 1):
+        if i == len(text) or text[i].isascii() != text[start].isascii():
+            runs.append(text[start:i])
+            start = i
+    return runs
+
+def draw_text(frame, position, text, atlas, color=(0, 255, 255)):
+    """直接在 BGR 畫面上繪製文字
+
+    Args:
+        frame: BGR 畫面（原地修改）
+        position: 文字左上角 (x, y)
+        text: 要繪製的文字
+        atlas: GlyphAtlas，用於非 ASCII 文字
+        color: BGR 顏色
+    """
+    x, y = position
+    frame_height, frame_width = frame.shape[:2]
+    for run in _split_runs(text):
+        if run.isascii():
+            (width, height), _ = cv2.getTextSize(run, CV_FONT, CV_FONT_SCALE, CV_FONT_THICKNESS)
+            cv2.putText(frame, run, (x, y + height), CV_FONT, CV_FONT_SCALE, color,
+                        CV_FONT_THICKNESS, cv2.LINE_AA)
+            x += width
+            continue
+
+        mask = atlas.get(run)
+        height, width = mask.shape
+        # 裁切超出畫面的部分
+        h = min(height, frame_height - y)
+        w = min(width, frame_width - x)
+        if h > 0 and w > 0:
+            frame[y:y + h, x:x + w][mask[:h, :w]] = color
+        x += width
+    return frame
@@ -0,0 +1,237 @@
+import threading
+import queue
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 通知下游階段結束的標記
+_STOP = object()
+
+class StageMetrics:
+    """單一階段的計時統計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.dropped = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed):
+        with self._lock:
+            self.processed += 1
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+
+    def record_drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            avg = self.total_time / self.processed if self.processed else 0.0
+            data = {
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "avg_ms": avg * 1000,
+                "max_ms": self.max_time * 1000,
+            }
+            if reset:
+                self.processed = 0
+                self.dropped = 0
+                self.total_time = 0.0
+                self.max_time = 0.0
+            return data
+
+class BoundedQueue:
+    """有界佇列，滿時可選擇丟棄最舊的項目或阻塞上游（背壓）"""
+
+    def __init__(self, maxsize=2, drop_oldest=True, metrics=None):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.drop_oldest = drop_oldest
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def put(self, item):
+        if not self.drop_oldest:
+            self._queue.put(item)
+            return
+        with self._lock:
+            # 結束標記不能被擠掉，否則下游階段永遠不會結束；
+            # 標記之後的項目（例如結束後才 emit 的結果）不會被處理，直接丟棄
+            if item is _STOP:
+                self._stopping = True
+            elif self._stopping:
+                if self.metrics is not None:
+                    self.metrics.record_drop()
+                return
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                    except queue.Empty:
+                        continue
+                    if self.metrics is not None:
+                        self.metrics.record_drop()
+
+    def get(self, timeout=None):
+        return self._queue.get(timeout=timeout)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+class Stage:
+    """管線中的一個階段，在自己的執行緒上處理輸入佇列的項目
+
+    Args:
+        name: 階段名稱（用於統計）
+        func: 處理函數，接收一個項目並回傳要送往下一階段的項目，回傳 None 表示丟棄
+            （或稍後由其他執行緒以 emit() 送出，例如非同步推論的回呼）
+        maxsize: 輸入佇列長度
+        drop_oldest: 輸入佇列滿時是否丟棄最舊的項目（否則阻塞上游）
+    """
+
+    def __init__(self, name, func, maxsize=2, drop_oldest=True):
+        self.name = name
+        self.func = func
+        self.metrics = StageMetrics()
+        self.input = BoundedQueue(maxsize, drop_oldest, self.metrics)
+        self.output = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"stage-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self.input.get()
+            if item is _STOP:
+                break
+            start = time.perf_counter()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                logger.error(f"階段 {self.name} 處理時發生錯誤: {str(e)}")
+                result = None
+            self.metrics.record(time.perf_counter() - start)
+            if result is not None:
+                self.output.put(result)
+        self.output.put(_STOP)
+
+    def emit(self, item):
+        """從其他執行緒把項目送往下一階段"""
+        self.output.put(item)
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+class Pipeline:
+    """由來源與多個階段組成的管線，各階段之間以有界佇列連接
+
+    來源函數在自己的執行緒上反覆呼叫，回傳 None 表示來源結束。
+    最後一個階段的輸出放在 output 佇列，由呼叫端（通常是主執行緒）以 get_output() 取得。
+
+    Args:
+        source: 產生項目的函數
+        source_name: 來源階段名稱
+        output_maxsize: 輸出佇列長度
+    """
+
+    def __init__(self, source, source_name="source", output_maxsize=2):
+        self.source = source
+        self.source_name = source_name
+        self.source_metrics = StageMetrics()
+        self.stages = []
+        self.output = BoundedQueue(output_maxsize, True)
+        self._running = threading.Event()
+        self._finished = threading.Event()
+        self._source_thread = None
+
+    def add_stage(self, name, func, maxsize=2, drop_oldest=True):
+        """在管線尾端加入一個階段"""
+        self.stages.append(Stage(name, func, maxsize, drop_oldest))
+        return self
+
+    def start(self):
+        # 串接各階段的佇列
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.output = next_stage.input
+        if self.stages:
+            self.stages[-1].output = self.output
+        for stage in self.stages:
+            stage.start()
+        self._running.set()
+        self._source_thread = threading.Thread(target=self._run_source, name=f"stage-{self.source_name}", daemon=True)
+        self._source_thread.start()
+        return self
+
+    def _run_source(self):
+        first = self.stages[0].input if self.stages else self.output
+        while self._running.is_set():
+            start = time.perf_counter()
+            try:
+                item = self.source()
+            except Exception as e:
+                logger.error(f"來源 {self.source_name} 發生錯誤: {str(e)}")
+                item = None
+            if item is None:
+                break
+            self.source_metrics.record(time.perf_counter() - start)
+            first.put(item)
+        first.put(_STOP)
+
+    def get_output(self, timeout=None):
+        """取得最後一個階段的輸出，逾時回傳 None，管線結束後 is_running() 會變為 False"""
+        try:
+            item = self.output.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if item is _STOP:
+            self._finished.set()
+            return None
+        return item
+
+    def is_running(self):
+        return not self._finished.is_set()
+
+    def stop(self, timeout=2.0):
+        """停止來源並等待各階段處理完佇列中的項目"""
+        self._running.clear()
+        if self._source_thread is not None:
+            self._source_thread.join(timeout)
+        for stage in self.stages:
+            stage.join(timeout)
+        self._finished.set()
+
+    def metrics(self, reset=False):
+        """回傳各階段的計時統計與佇列深度"""
+        data = {self.source_name: self.source_metrics.snapshot(reset)}
+        for stage in self.stages:
+            stats = stage.metrics.snapshot(reset)
+            stats["queue_depth"] = stage.input.qsize()
+            data[stage.name] = stats
+        data["output"] = {"queue_depth": self.output.qsize()}
+        return data
+
+    @staticmethod
+    def format_metrics(metrics):
+        """把統計資訊轉換為單行文字，方便寫入日誌"""
+        parts = []
+        for name, stats in metrics.items():
+            if "avg_ms" in stats:
+                part = f"{name}: {stats['processed']} 筆 {stats['avg_ms']:.1f}ms (max {stats['max_ms']:.1f}ms)"
+                if stats.get("dropped"):
+                    part += f" 丟棄 {stats['dropped']}"
+                if "queue_depth" in stats:
+                    part += f" 佇列 {stats['queue_depth']}"
+            else:
+                part = f"{name}: 佇列 {stats['queue_depth']}"
+            parts.append(part)
+        return " | ".join(parts)
@@ -1,93 +1,228 @@
-import paho.mqtt.client as mqtt
-import json
+import argparse
+import asyncio
+import os
+import sys
+import threading
 import time
 from datetime import datetime
 
+# hand_protocol.py 可放在本資料夾，或直接使用專案根目錄的版本
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from async_mqtt import AsyncMqttClient
+from hand_protocol import DeltaDecoder
+from latency_stats import LatencyTracker, format_latency
+
 # MQTT 設定
 BROKER = "localhost"  # 改為發送端的 IP 地址
 PORT = 1883
 TOPIC = "hand_tracking"  # 與發送端相同的主題
 
-class HandDataReceiver:
+# 顯示更新頻率（每秒）：接收端只保留每隻手最新的一筆數據，畫面以固定頻率更新，
+# 發送頻率再高也不會讓接收被 print 拖慢
+RENDER_RATE = 5.0
+
+class HandState:
+    """一隻手最新的數據"""
+    __slots__ = ("data", "receive_time", "latencies", "version")
+
+    def __init__(self, data, receive_time, latencies, version):
+        self.data = data
+        self.receive_time = receive_time
+        self.latencies = latencies
+        self.version = version
+
+class HandStateStore:
+    """保存每隻手最新的數據，新數據直接覆蓋舊數據，記憶體用量固定
+
+    MQTT 接收執行緒只呼叫 update()；顯示、伺服馬達控制等下游程式以 latest()
+    取得最新狀態，或以 changed_since() / wait() 取得上次讀取後有更新的手。
+    """
+
     def __init__(self):
-        # 設置 MQTT 客戶端
-        self.client = mqtt.Client("RaspberryPi_Receiver")
-        self.client.on_connect = self.on_connect
-        self.client.on_message = self.on_message
+        self._condition = threading.Condition()
+        self._states = {}  # hand_id -> HandState
+        self._last_hand = None
+        self.version = 0  # 每次更新加 1
+        self.received = 0
+
+    def update(self, data, receive_time, latencies=None):
+        hand_id = data.get("hand_id", 0)
+        with self._condition:
+            self.version += 1
+            self.received += 1
+            self._states[hand_id] = HandState(data, receive_time, latencies, self.version)
+            self._last_hand = hand_id
+            self._condition.notify_all()
+
+    def latest(self, hand_id=None):
+        """回傳指定手的 HandState；hand_id 為 None 時回傳最近更新的手"""
+        with self._condition:
+            return self._states.get(self._last_hand if hand_id is None else hand_id)
+
+    def changed_since(self, version):
+        """回傳 (目前版本, {hand_id: HandState})，只包含 version 之後更新的手"""
+        with self._condition:
+            changed = {hand_id: state for hand_id, state in self._states.items() if state.version > version}
+            return self.version, changed
+
+    def wait(self, version, timeout=None):
+        """等待到有比 version 更新的數據，回傳是否有新數據"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.version > version, timeout)
+
+class HandDataReceiver:
+    def __init__(self, render_rate=RENDER_RATE, store=None):
+        # 設置 MQTT 客戶端（asyncio），接收、顯示與伺服馬達控制共用同一個事件迴圈
+        self.client = AsyncMqttClient(BROKER, PORT, client_id="RaspberryPi_Receiver")
         
-        # 連接狀態
-        self.connected = False
+        # 每隻手最新的數據，供顯示與其他下游程式使用
+        self.state = HandStateStore()
+        self.render_rate = render_rate
+        self.invalid = 0
         
-        # 最後接收的數據
-        self.last_data = None
+        # 差量格式需要保存每隻手目前的角度，其他格式直接解碼
+        self.decoder = DeltaDecoder()
         
-    def on_connect(self, client, userdata, flags, rc):
-        if rc == 0:
-            print("✅ 已連接到 MQTT broker")
-            self.client.subscribe(TOPIC)
-            print(f"✅ 已訂閱主題: {TOPIC}")
-            self.connected = True
-        else:
-            print(f"❌ 連接失敗 (錯誤碼: {rc})")
+        # angle_store.AngleStore，提供時把每筆數據附加到時間序列紀錄
+        self.store = store
+        
+        # 延遲統計，定期發送到 hand_tracking/stats/latency/raspberry_pi
+        self.latency = LatencyTracker("raspberry_pi")
+    
+    @property
+    def last_data(self):
+        """最後接收的數據"""
+        state = self.state.latest()
+        return state.data if state else None
     
     def on_message(self, client, userdata, msg):
+        # 只解碼並保存最新狀態，顯示交給 render_loop()
+        receive_time = time.time()
         try:
-            # 解析接收到的數據
-            data = json.loads(msg.payload.decode())
-            
-            # 格式化時間戳
-            timestamp = datetime.fromtimestamp(data['timestamp'])
-            time_str = timestamp.strftime("%H:%M:%S")
-            
-            print("\n" + "="*50)
-            print(f"📩 接收時間: {time_str}")
-            print("-"*50)
-            
-            # 顯示每個手指的角度數據
-            for finger in data['fingers']:
-                name = finger['name']
-                pip = finger['pip_angle']
-                dip = finger['dip_angle']
-                total = finger['total_angle']
-                
-                # 計算彎曲程度（越接近180度越伸直）
-                bend_percent = (180 - (360-total)) / 180 * 100
-                bend_status = "伸直" if bend_percent > 80 else "彎曲" if bend_percent < 40 else "半彎曲"
-                
-                print(f"【{name}】")
-                print(f"  ├─ PIP: {pip:.1f}°")
-                print(f"  ├─ DIP: {dip:.1f}°")
-                print(f"  ├─ 總角度: {total:.1f}°")
-                print(f"  └─ 狀態: {bend_status} ({bend_percent:.1f}%)")
+            # 解析接收到的數據（支援 JSON、二進位與差量格式）
+            data = self.decoder.decode_payload(msg.payload, msg.topic)
+        except ValueError:
+            self.invalid += 1
+            return
+        # 差量格式遺失訊息或尚未收到關鍵幀時要求發送端送出關鍵幀
+        for topic, request in self.decoder.resync_requests(receive_time):
+            client.publish(topic, request)
+        if data is None:
+            return
+        if (not isinstance(data, dict) or not isinstance(data.get("fingers"), list)
+                or "timestamp" not in data):
+            # 例如 123 或 [1, 2] 這類合法但不是手部數據的 JSON，顯示與紀錄都需要這些欄位
+            self.invalid += 1
+            return
+        latencies = self.latency.record(data, receive_time)
+        self.latency.maybe_publish(client)
+        self.state.update(data, receive_time, latencies)
+        if self.store is not None:
+            try:
+                self.store.append_payload(data, receive_time)
+            except (KeyError, TypeError, ValueError):
+                self.invalid += 1
+    
+    async def receive_loop(self, messages):
+        async for msg in messages:
+            self.on_message(self.client.client, None, msg)
+    
+    def render(self, hand_id, state):
+        """顯示一隻手的最新數據"""
+        data = state.data
+        
+        # 格式化時間戳
+        timestamp = datetime.fromtimestamp(data['timestamp'])
+        time_str = timestamp.strftime("%H:%M:%S")
+        
+        print("\n" + "="*50)
+        print(f"📩 接收時間: {time_str} (手: {hand_id})")
+        if state.latencies:
+            print(f"⏱️ 延遲: {format_latency(state.latencies)}")
+        print("-"*50)
+        
+        # 顯示每個手指的角度數據
+        for finger in data['fingers']:
+            name = finger['name']
+            pip = finger['pip_angle']
+            dip = finger['dip_angle']
+            total = finger['total_angle']
             
-            print("="*50)
+            # 計算彎曲程度（0 伸直 ~ 100 完全彎曲，與 fusion_hub.camera_bend 相同）
+            bend_percent = min(max(total / 180 * 100, 0.0), 100.0)
+            bend_status = "彎曲" if bend_percent > 60 else "伸直" if bend_percent < 20 else "半彎曲"
             
-            # 保存最後接收的數據
-            self.last_data = data
+            print(f"【{name}】")
+            print(f"  ├─ PIP: {pip:.1f}°")
+            print(f"  ├─ DIP: {dip:.1f}°")
+            print(f"  ├─ 總角度: {total:.1f}°")
+            print(f"  └─ 狀態: {bend_status} ({bend_percent:.1f}%)")
+        
+        print("="*50)
+    
+    async def render_loop(self):
+        """以固定頻率顯示有更新的手，兩次顯示之間收到的舊數據直接略過"""
+        interval = 1.0 / self.render_rate
+        version = 0
+        received = 0
+        next_time = time.perf_counter()
+        while True:
+            version, changed = self.state.changed_since(version)
+            for hand_id, state in sorted(changed.items()):
+                try:
+                    self.render(hand_id, state)
+                except Exception as e:
+                    print(f"❌ 處理錯誤: {str(e)}")
+            if changed:
+                total = self.state.received
+                print(f"📊 接收 {total - received} 筆，顯示 {len(changed)} 筆，無效 {self.invalid} 筆")
+                received = total
             
-        except json.JSONDecodeError:
-            print("❌ 無效的 JSON 格式")
-        except Exception as e:
-            print(f"❌ 處理錯誤: {str(e)}")
+            next_time += interval
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                next_time = time.perf_counter()
     
-    def start(self):
+    async def run(self, *tasks):
+        """連接 MQTT 並同時執行接收、顯示與其他協程（例如伺服馬達控制）
+        
+        Args:
+            tasks: 要在同一個事件迴圈中一起執行的協程
+        """
         print(f"🔄 正在連接到 MQTT broker ({BROKER})...")
+        async with self.client:
+            print("✅ 已連接到 MQTT broker")
+            messages = self.client.messages(TOPIC)
+            await self.client.subscribe(TOPIC)
+            print(f"✅ 已訂閱主題: {TOPIC}")
+            try:
+                await asyncio.gather(self.receive_loop(messages), self.render_loop(), *tasks)
+            finally:
+                print("👋 已斷開連接")
+    
+    def start(self, *tasks):
         try:
-            self.client.connect(BROKER, PORT, 60)
-            self.client.loop_forever()
+            asyncio.run(self.run(*tasks))
         except KeyboardInterrupt:
             print("\n🛑 程式結束")
         except Exception as e:
             print(f"❌ 連接錯誤: {str(e)}")
         finally:
-            self.stop()
-    
-    def stop(self):
-        if self.connected:
-            self.client.disconnect()
-            print("👋 已斷開連接")
+            decoder = self.decoder
+            if decoder.keyframes or decoder.waiting:
+                print(f"🔄 差量格式: 關鍵幀 {decoder.keyframes} 筆，差量 {decoder.deltas} 筆，"
+                      f"遺失 {decoder.gaps} 筆，等待關鍵幀 {decoder.waiting} 筆")
+            if self.store is not None:
+                self.store.close()
+                print(f"💾 已記錄 {self.store.count} 筆數據到 {self.store.path}")
 
 def main():
+    parser = argparse.ArgumentParser(description="樹莓派手部追蹤數據接收器")
+    parser.add_argument("--store", metavar="DIR", help="把接收到的角度附加到時間序列紀錄資料夾")
+    args = parser.parse_args()
+    
     print("🤖 樹莓派手部追蹤數據接收器")
     print("="*50)
     print("📝 使用說明:")
@@ -96,7 +231,13 @@ def main():
     print("3. 按 Ctrl+C 可以結束程式")
     print("="*50)
     
-    receiver = HandDataReceiver()
+    store = None
+    if args.store:
+        from angle_store import AngleStore
+        store = AngleStore(args.store)
+        print(f"💾 記錄數據到 {args.store}")
+    
+    receiver = HandDataReceiver(store=store)
     receiver.start()
 
 if __name__ == "__main__":
@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import collections
+import time
+
+import numpy as np
+
+from receiver import HandDataReceiver
+
+# 伺服馬達控制：以固定頻率（預設 50 Hz）由最新收到的手指角度計算目標位置，
+# 在兩筆數據之間內插、超過最後一筆時短暫外插，並限制每根手指的轉動速度，
+# 讓馬達動作不受網路延遲抖動與發送頻率影響。
+
+CONTROL_RATE = 50.0  # 控制頻率（Hz）
+MAX_VELOCITY = 360.0  # 伺服馬達最大轉速（度/秒）
+MAX_EXTRAPOLATION = 0.1  # 最後一筆數據之後最多外插的時間（秒），之後維持不動
+MAX_SAMPLE_GAP = 0.5  # 兩筆數據間隔超過此值（秒）時不估計速度，只內插不外插
+SERVO_PINS = (2, 4, 5, 12, 13)  # 拇指、食指、中指、無名指、小指（BCM 編號）
+
+def servo_angles(fingers):
+    """把各手指總計角度轉換為伺服馬達角度（0-180），與發送端相同以 0 度為伸直"""
+    totals = np.array([finger["total_angle"] for finger in fingers], dtype=np.float64)
+    return np.clip(totals, 0, 180)
+
+# ========== 輸出 ========== #
+class MockServoDriver:
+    """不連接硬體的輸出，保存最近的指令，用於測試與在電腦上試跑
+
+    Args:
+        channels: 伺服馬達數量
+        history: 保存的指令筆數
+    """
+
+    def __init__(self, channels=5, history=1000):
+        self.channels = channels
+        self.commands = collections.deque(maxlen=history)  # (時間, 角度陣列)
+
+    def write(self, angles):
+        self.commands.append((time.time(), np.array(angles)))
+
+    def close(self):
+        pass
+
+class GpioServoDriver:
+    """以 gpiozero 直接控制接在 GPIO 上的伺服馬達
+
+    Args:
+        pins: 各手指伺服馬達的 GPIO 腳位（BCM 編號）
+    """
+
+    def __init__(self, pins=SERVO_PINS):
+        try:
+            from gpiozero import AngularServo
+        except ImportError as e:
+            raise ImportError("GpioServoDriver 需要 gpiozero 套件：pip install gpiozero") from e
+        self.channels = len(pins)
+        self.servos = [AngularServo(pin, min_angle=0, max_angle=180) for pin in pins]
+
+    def write(self, angles):
+        for servo, angle in zip(self.servos, angles):
+            servo.angle = float(angle)
+
+    def close(self):
+        for servo in self.servos:
+            servo.close()
+
+DRIVERS = {
+    "mock": MockServoDriver,
+    "gpio": GpioServoDriver,
+}
+
+# ========== 控制迴圈 ========== #
+class ServoController:
+    """以固定頻率把最新的手指角度寫入伺服馬達
+
+    每次收到新數據時記錄 (接收時間, 角度)，控制迴圈在 now - delay 的時間點於
+    最近兩筆數據之間內插；超過最後一筆時依兩筆數據的速度外插最多
+    max_extrapolation 秒。每個週期的輸出變化量限制在 max_velocity / rate 以內。
+
+    Args:
+        state: receiver.HandStateStore
+        driver: 輸出，需有 write(angles) 與 close()
+        hand_id: 要跟隨的手編號
+        rate: 控制頻率（Hz）
+        max_velocity: 最大轉速（度/秒）
+        delay: 播放延遲（秒）；大於數據間隔時只內插不外插，動作更平順但延遲增加
+        max_extrapolation: 最多外插的時間（秒）
+        max_sample_gap: 兩筆數據間隔超過此值時視為靜止
+    """
+
+    def __init__(self, state, driver, hand_id=0, rate=CONTROL_RATE, max_velocity=MAX_VELOCITY, delay=0.0,
+                 max_extrapolation=MAX_EXTRAPOLATION, max_sample_gap=MAX_SAMPLE_GAP):
+        self.state = state
+        self.driver = driver
+        self.hand_id = hand_id
+        self.rate = rate
+        self.max_velocity = max_velocity
+        self.delay = delay
+        self.max_extrapolation = max_extrapolation
+        self.max_sample_gap = max_sample_gap
+
+        self.position = None  # 目前輸出的角度
+        self._samples = collections.deque(maxlen=2)  # 最近兩筆 (接收時間, 角度)
+        self._version = 0
+
+        # 統計資訊
+        self.ticks = 0
+        self.overruns = 0
+
+    def _update_samples(self):
+        state = self.state.latest(self.hand_id)
+        if state is None or state.version == self._version:
+            return
+        self._version = state.version
+        self._samples.append((state.receive_time, servo_angles(state.data["fingers"])))
+
+    def target(self, now):
+        """時間 now 的目標角度，沒有數據時回傳 None"""
+        if not self._samples:
+            return None
+        last_time, last = self._samples[-1]
+        if len(self._samples) < 2:
+            return last
+        prev_time, prev = self._samples[0]
+        gap = last_time - prev_time
+        if gap <= 0 or gap > self.max_sample_gap:
+            return last
+
+        t = now - self.delay
+        if t <= last_time:
+            # 內插
+            alpha = max((t - prev_time) / gap, 0.0)
+            return prev + (last - prev) * alpha
+        # 外插
+        velocity = (last - prev) / gap
+        return np.clip(last + velocity * min(t - last_time, self.max_extrapolation), 0, 180)
+
+    def step(self, now, dt):
+        """計算並輸出一個控制週期，回傳輸出的角度"""
+        self._update_samples()
+        target = self.target(now)
+        if target is None:
+            return None
+        if self.position is None:
+            self.position = target.copy()
+        else:
+            max_step = self.max_velocity * dt
+            self.position = self.position + np.clip(target - self.position, -max_step, max_step)
+        self.driver.write(self.position)
+        self.ticks += 1
+        return self.position
+
+    async def run(self):
+        """控制迴圈，與 MQTT 接收在同一個事件迴圈中執行"""
+        interval = 1.0 / self.rate
+        next_time = time.perf_counter()
+        try:
+            while True:
+                self.step(time.time(), interval)
+                next_time += interval
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    # 落後時不補跑錯過的週期
+                    self.overruns += 1
+                    next_time = time.perf_counter()
+        finally:
+            self.driver.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="接收手部追蹤數據並以固定頻率控制伺服馬達")
+    parser.add_argument("--driver", choices=DRIVERS, default="gpio", help="伺服馬達輸出（mock 不連接硬體）")
+    parser.add_argument("--hand-id", type=int, default=0, help="要跟隨的手編號")
+    parser.add_argument("--rate", type=float, default=CONTROL_RATE, help="控制頻率（Hz）")
+    parser.add_argument("--max-velocity", type=float, default=MAX_VELOCITY, help="最大轉速（度/秒）")
+    parser.add_argument("--delay", type=float, default=0.0, help="播放延遲（秒）")
+    args = parser.parse_args()
+
+    receiver = HandDataReceiver()
+    controller = ServoController(receiver.state, DRIVERS[args.driver](), args.hand_id, args.rate,
+                                 args.max_velocity, args.delay)
+    receiver.start(controller.run())
+    print(f"🦾 控制週期: {controller.ticks}，落後: {controller.overruns}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+class RoiResult:
+    """ROI 推論結果，屬性與 hands.process() 的回傳值相同"""
+
+    def __init__(self, multi_hand_landmarks, multi_handedness, roi):
+        self.multi_hand_landmarks = multi_hand_landmarks
+        self.multi_handedness = multi_handedness
+        self.roi = roi  # (x0, y0, x1, y1) 像素座標，全畫面偵測時為 None
+
+class RoiHandTracker:
+    """利用上一幀的關鍵點裁切手部區域後再進行推論
+
+    以上一幀所有手的關鍵點計算外框並加上邊距，只把這個區域（必要時縮小）
+    交給 MediaPipe，再把回傳的關鍵點換算回全畫面座標。追蹤失敗（區域內沒有
+    偵測到手，或偵測到的手比上一幀少）時，改用全畫面偵測。
+
+    Args:
+        hands: MediaPipe Hands 實例
+        padding: 外框向外擴張的比例（相對於外框邊長）
+        max_roi_size: 裁切區域的最長邊超過此值時縮小到此大小（像素），None 表示不縮小
+        min_roi_size: 裁切區域的最小邊長（像素）
+        redetect_interval: 每隔幾幀強制全畫面偵測一次，以找到新出現的手，0 表示不強制
+    """
+
+    def __init__(self, hands, padding=0.25, max_roi_size=256, min_roi_size=96, redetect_interval=30):
+        self.hands = hands
+        self.padding = padding
+        self.max_roi_size = max_roi_size
+        self.min_roi_size = min_roi_size
+        self.redetect_interval = redetect_interval
+
+        self._roi = None
+        self._hand_count = 0
+        self._frames_since_detect = 0
+
+        # 統計資訊
+        self.roi_frames = 0
+        self.full_frames = 0
+
+    def reset(self):
+        """下一幀改用全畫面偵測"""
+        self._roi = None
+        self._hand_count = 0
+
+    def _compute_roi(self, points, width, height):
+        """由正規化關鍵點 (hands, 21, 3) 計算加上邊距的正方形外框"""
+        xs = points[..., 0] * width
+        ys = points[..., 1] * height
+        x0, x1 = float(xs.min()), float(xs.max())
+        y0, y1 = float(ys.min()), float(ys.max())
+        size = max(x1 - x0, y1 - y0) * (1 + 2 * self.padding)
+        size = max(size, self.min_roi_size)
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        left = int(max(cx - size / 2, 0))
+        top = int(max(cy - size / 2, 0))
+        right = int(min(cx + size / 2, width))
+        bottom = int(min(cy + size / 2, height))
+        if right - left < 2 or bottom - top < 2:
+            return None
+        return left, top, right, bottom
+
+    def _process_full(self, frame_rgb):
+        self.full_frames += 1
+        self._frames_since_detect = 0
+        result = self.hands.process(frame_rgb)
+        return RoiResult(result.multi_hand_landmarks, result.multi_handedness, None)
+
+    def _process_roi(self, frame_rgb, roi):
+        left, top, right, bottom = roi
+        crop = frame_rgb[top:bottom, left:right]
+        crop_width, crop_height = right - left, bottom - top
+        longest = max(crop_width, crop_height)
+        if self.max_roi_size and longest > self.max_roi_size:
+            scale = self.max_roi_size / longest
+            crop = cv2.resize(crop, (max(int(crop_width * scale), 1), max(int(crop_height * scale), 1)),
+                              interpolation=cv2.INTER_AREA)
+        result = self.hands.process(np.ascontiguousarray(crop))
+        if not result.multi_hand_landmarks:
+            return None
+
+        # 把裁切區域內的正規化座標換算回全畫面的正規化座標
+        height, width = frame_rgb.shape[:2]
+        sx, sy = crop_width / width, crop_height / height
+        ox, oy = left / width, top / height
+        remapped = []
+        for hand in result.multi_hand_landmarks:
+            remapped.append(landmark_pb2.NormalizedLandmarkList(landmark=[
+                landmark_pb2.NormalizedLandmark(x=ox + lm.x * sx, y=oy + lm.y * sy, z=lm.z * sx)
+                for lm in hand.landmark
+            ]))
+        self.roi_frames += 1
+        self._frames_since_detect += 1
+        return RoiResult(remapped, result.multi_handedness, roi)
+
+    def process(self, frame_rgb):
+        """對 RGB 畫面進行推論，回傳與 hands.process() 相容的結果"""
+        height, width = frame_rgb.shape[:2]
+        redetect = self.redetect_interval and self._frames_since_detect >= self.redetect_interval
+
+        result = None
+        if self._roi is not None and not redetect:
+            result = self._process_roi(frame_rgb, self._roi)
+            # 追蹤失敗或有手離開區域時改用全畫面偵測
+            if result is None or len(result.multi_hand_landmarks) < self._hand_count:
+                result = None
+        if result is None:
+            result = self._process_full(frame_rgb)
+
+        if result.multi_hand_landmarks:
+            points = np.array([[(lm.x, lm.y, lm.z) for lm in hand.landmark]
+                               for hand in result.multi_hand_landmarks], dtype=np.float32)
+            self._roi = self._compute_roi(points, width, height)
+            self._hand_count = len(result.multi_hand_landmarks)
+        else:
+            self.reset()
+        return result
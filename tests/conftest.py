@@ -0,0 +1,8 @@
+import os
+import sys
+
+# 測試直接匯入專案根目錄與 raspberry_pi/ 的模組（兩者都不是套件）
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "raspberry_pi")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
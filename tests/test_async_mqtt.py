@@ -0,0 +1,57 @@
+import asyncio
+
+from async_mqtt import AsyncMqttClient
+
+class FakeInfo:
+    def __init__(self, mid):
+        self.rc = 0
+        self.mid = mid
+
+class FakePahoClient:
+    """回傳指定 mid 的 paho Client 替身，sync_publish 時在 publish() 內就呼叫 on_publish"""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.next_mid = 1
+        self.sync_publish = False
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        mid = self.next_mid
+        if self.sync_publish:
+            self.owner._on_publish(self, None, mid)
+        return FakeInfo(mid)
+
+async def connected_client():
+    client = AsyncMqttClient("localhost")
+    client.client = FakePahoClient(client)
+    client._loop = asyncio.get_running_loop()
+    client._connected = asyncio.Event()
+    client._connected.set()
+    client._inflight = asyncio.Semaphore(client.max_inflight)
+    return client
+
+def test_direct_publish_does_not_complete_reused_mid():
+    async def scenario():
+        client = await connected_client()
+        # 直接以 client.client.publish 發送（例如關鍵幀請求），之後才收到完成通知
+        client.client.publish("hand_tracking/resync", "{}")
+        client._on_publish(client.client, None, 1)
+
+        # mid 循環使用後，QoS 1 的 publish() 必須等到真正的 PUBACK
+        task = asyncio.ensure_future(client.publish("hand_tracking", "data", qos=1))
+        await asyncio.sleep(0.01)
+        assert not task.done()
+        client._on_publish(client.client, None, 1)
+        assert await asyncio.wait_for(task, 1) == 1
+
+    asyncio.run(scenario())
+
+def test_publish_completed_during_call_returns_immediately():
+    async def scenario():
+        client = await connected_client()
+        client.client.sync_publish = True
+        assert await asyncio.wait_for(client.publish("hand_tracking", "data"), 1) == 1
+        assert client._completed_publish is None
+        assert not client._pending_publish
+
+    asyncio.run(scenario())
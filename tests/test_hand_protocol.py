@@ -0,0 +1,57 @@
+import threading
+
+import numpy as np
+
+from hand_angles import ANGLE_DTYPE
+from hand_protocol import FLAG_KEYFRAME, DeltaDecoder, DeltaEncoder
+
+def hand(total):
+    angles = np.zeros(5, dtype=ANGLE_DTYPE)
+    angles["total"] = total
+    return angles
+
+def is_keyframe(frame):
+    return bool(frame[1] & FLAG_KEYFRAME)
+
+def test_request_keyframe_from_other_thread():
+    """request_keyframe 在網路執行緒上呼叫時，encode 同時新增手也不會出錯"""
+    encoder = DeltaEncoder(keyframe_interval=60)
+    errors = []
+    done = threading.Event()
+
+    def requester():
+        try:
+            while not done.is_set():
+                encoder.request_keyframe(None)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=requester)
+    thread.start()
+    try:
+        for seq in range(5000):
+            encoder.encode(hand(seq % 90), seq, seq / 100, hand_id=seq % 256)
+    finally:
+        done.set()
+        thread.join()
+    assert not errors
+
+def test_requested_hand_gets_keyframe():
+    encoder = DeltaEncoder(keyframe_interval=60)
+    assert is_keyframe(encoder.encode(hand(0), 0, 0.0))
+    assert not is_keyframe(encoder.encode(hand(10), 1, 0.1))
+    encoder.request_keyframe([0])
+    assert is_keyframe(encoder.encode(hand(20), 2, 0.2))
+    assert not is_keyframe(encoder.encode(hand(30), 3, 0.3))
+
+def test_decoder_resyncs_after_publisher_restart():
+    decoder = DeltaDecoder()
+    encoder = DeltaEncoder()
+    for seq in range(3000):
+        assert decoder.decode_payload(encoder.encode(hand(seq % 90), seq, seq / 30), "hand_tracking")
+    # 發送端重新啟動，序號從 0 開始
+    encoder = DeltaEncoder()
+    frames = [decoder.decode_payload(encoder.encode(hand(seq % 90), seq, 200 + seq / 30), "hand_tracking")
+              for seq in range(100)]
+    assert all(frames)
+    assert decoder.restarts == 1
@@ -0,0 +1,47 @@
+import time
+
+import numpy as np
+import pytest
+
+live_stream_hands = pytest.importorskip("live_stream_hands")
+
+class SilentLandmarker:
+    """收下畫面但永遠不回呼的 HandLandmarker 替身（模擬 MediaPipe 略過畫面）"""
+
+    def __init__(self):
+        self.timestamps = []
+
+    def detect_async(self, image, timestamp_ms):
+        self.timestamps.append(timestamp_ms)
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def hands(monkeypatch):
+    landmarker = SilentLandmarker()
+    monkeypatch.setattr(live_stream_hands.vision.HandLandmarker, "create_from_options",
+                        lambda options: landmarker)
+    hands = live_stream_hands.LiveStreamHands("unused.task", max_pending=1, pending_timeout=0.05)
+    yield hands
+    hands.close()
+
+def frame():
+    return np.zeros((4, 4, 3), dtype=np.uint8)
+
+def test_missing_callback_expires(hands):
+    assert hands.submit(frame(), 1.0)
+    assert hands.busy()
+    assert not hands.submit(frame(), 1.01)
+
+    time.sleep(0.1)
+    assert not hands.busy()
+    assert hands.submit(frame(), 1.2)
+    assert hands.skipped == 1
+    assert hands.landmarker.timestamps == [1000, 1200]
+
+def test_warmup_timeout_clears_pending(hands):
+    hands.pending_timeout = 60.0
+    assert not hands.warmup(frame(), timeout=0.01)
+    assert not hands.busy()
+    assert hands.submit(frame(), time.time())
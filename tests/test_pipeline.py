@@ -0,0 +1,53 @@
+import threading
+import time
+
+from pipeline import _STOP, BoundedQueue, Pipeline
+
+def test_late_put_does_not_evict_stop():
+    q = BoundedQueue(maxsize=1)
+    q.put(_STOP)
+    q.put("late")
+    assert q.get(timeout=1) is _STOP
+
+def test_stop_sentinel_evicts_data_when_full():
+    q = BoundedQueue(maxsize=1)
+    q.put("item")
+    q.put(_STOP)
+    assert q.get(timeout=1) is _STOP
+
+def test_stop_full_pipeline_with_late_emit():
+    """結束標記已在滿的佇列中時，上游再 emit（例如非同步推論的回呼）也不能讓下游停不下來"""
+    entered = threading.Event()
+    release = threading.Event()
+    items = iter([0])
+
+    def source():
+        item = next(items, None)
+        if item is None:
+            # 下游正在處理第一個項目時才結束來源
+            entered.wait(5)
+        return item
+
+    def blocked(item):
+        entered.set()
+        release.wait(5)
+        return item
+
+    pipeline = Pipeline(source, output_maxsize=1)
+    pipeline.add_stage("async", lambda item: item, maxsize=1)
+    pipeline.add_stage("blocked", blocked, maxsize=1)
+    upstream, downstream = pipeline.stages
+    pipeline.start()
+
+    # 來源結束後，結束標記經過第一個階段進入已滿的下游佇列
+    upstream.join(5)
+    assert downstream.input.qsize() == 1
+    upstream.emit("late")
+    release.set()
+
+    deadline = time.time() + 5
+    while pipeline.is_running():
+        pipeline.get_output(timeout=0.1)
+        assert time.time() < deadline, "管線沒有結束"
+    pipeline.stop(timeout=1)
+    assert not downstream._thread.is_alive()
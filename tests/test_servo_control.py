@@ -0,0 +1,18 @@
+import numpy as np
+
+from servo_control import servo_angles
+
+def fingers(*totals):
+    return [{"total_angle": total} for total in totals]
+
+def test_straight_finger_is_zero():
+    assert np.all(servo_angles(fingers(0.0, 0.0, 0.0, 0.0, 0.0)) == 0)
+
+def test_bent_finger_moves_servo():
+    straight = servo_angles(fingers(0.0, 0.0, 0.0, 0.0, 0.0))
+    bent = servo_angles(fingers(150.0, 150.0, 150.0, 150.0, 150.0))
+    assert np.all(bent > straight)
+    assert np.allclose(bent, 150.0)
+
+def test_angles_are_clipped():
+    assert np.allclose(servo_angles(fingers(-5.0, 45.0, 90.0, 180.0, 200.0)), [0, 45, 90, 180, 180])